@@ -1 +1,11 @@
-from app import app
\ No newline at end of file
+"""
+Vercel serverless entry point.
+
+Vercel imports this module on every cold start and serves `app`. Keep it
+(and what it imports) light: `flask importtime` profiles exactly this
+import.
+"""
+
+from app import create_app
+
+app = create_app()
@@ -1,196 +1,154 @@
-from .extensions import db, login_manager
-from flask import Flask
-from flask import jsonify, make_response, render_template, send_from_directory, redirect, request, url_for
-from flask_login import current_user
-from .models import Item, User
+"""
+Ember app package.
+
+`create_app()` builds the Flask app. Production entry points (e.g.
+api/index.py on Vercel) call it once per process. Existing
+`from app import app` imports keep working: the module-level `app` is
+created by the factory on first access.
+
+Cold starts only load what serving a request needs. NumPy, the search
+indexes and the Dedalus SDK are imported by the first request that
+uses them, and Alembic only under the `flask` CLI.
+`flask importtime` reports where import time goes.
+"""
+
 from dotenv import load_dotenv
-import os
+
+load_dotenv()  # Load .env once, before any module reads its config from the environment
+
 import mimetypes
+import os
+
+from flask import Flask
+from flask import render_template, send_from_directory, redirect, url_for
+from flask_login import current_user
 
-load_dotenv()  # Load .env before anything reads DEDALUS_API_KEY
+from .extensions import db, login_manager, init_migrate
+from .logs import configure_logging
+from .embedding_queue import embedding_worker
+from .sql_budget import sql_counter
+from .db_pool import engine_options, pool_monitor
+from .metrics import metrics
+from .profiling import profiler
 
-app = Flask(__name__)
 base_dir = os.path.abspath(os.path.dirname(__file__))
 
-# --- DATABASE & SECURITY CONFIG ---
 
-# Use environment variable for Secret Key in production, fallback to 'BoilerUp!' for local dev
-app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'BoilerUp!')
+def create_app():
+    app = Flask(__name__)
+
+    # --- DATABASE & SECURITY CONFIG ---
 
-# Get the Neon DATABASE_URL from Vercel environment variables
-database_url = os.environ.get('DATABASE_URL')
+    # Use environment variable for Secret Key in production, fallback to 'BoilerUp!' for local dev
+    app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'BoilerUp!')
 
-# FIX: SQLAlchemy 1.4+ requires "postgresql://" but Neon/Vercel provides "postgres://"
-if database_url and database_url.startswith("postgres://"):
-    database_url = database_url.replace("postgres://", "postgresql://", 1)
+    # Get the Neon DATABASE_URL from Vercel environment variables
+    database_url = os.environ.get('DATABASE_URL')
 
-# If DATABASE_URL exists, use it (Neon). Otherwise, use local SQLite.
-app.config['SQLALCHEMY_DATABASE_URI'] = database_url or 'sqlite:///' + os.path.join(base_dir, 'site.db')
+    # FIX: SQLAlchemy 1.4+ requires "postgresql://" but Neon/Vercel provides "postgres://"
+    if database_url and database_url.startswith("postgres://"):
+        database_url = database_url.replace("postgres://", "postgresql://", 1)
 
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['UPLOAD_FOLDER'] = os.path.join(base_dir, 'static', 'uploads')
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+    # If DATABASE_URL exists, use it (Neon). Otherwise, use local SQLite.
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_url or 'sqlite:///' + os.path.join(base_dir, 'site.db')
 
-# --- INITIALIZE EXTENSIONS ---
-db.init_app(app)
-login_manager.init_app(app)
+    # Pool size / recycling / NullPool and statement timeouts come from DB_* env vars (see app/db_pool.py)
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
 
-# Add pmtiles support
-mimetypes.add_type('application/vnd.pmtiles', '.pmtiles')
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['UPLOAD_FOLDER'] = os.path.join(base_dir, 'static', 'uploads')
+    app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+
+    # --- INITIALIZE EXTENSIONS ---
+    configure_logging(app)  # first, so request ids are set before other hooks run
+    db.init_app(app)
+    pool_monitor.init_app(app)
+    login_manager.init_app(app)
+    if os.environ.get('FLASK_RUN_FROM_CLI') == 'true':
+        init_migrate(app)  # `flask db ...`
+    embedding_worker.init_app(app)
+    sql_counter.init_app(app)
+    metrics.init_app(app)
+    profiler.init_app(app)  # no-op unless PROFILE_* is set
+
+    from .util.import_items import import_items_command
+    from .util.importtime import importtime_command
+    from .util.profiles import profiles_command
+    app.cli.add_command(import_items_command)
+    app.cli.add_command(importtime_command)
+    app.cli.add_command(profiles_command)
+
+    # Add pmtiles support
+    mimetypes.add_type('application/vnd.pmtiles', '.pmtiles')
+
+    # --- REGISTER BLUEPRINTS ---
+    from .routes import users, health, items, locations, search, tiles
+
+    app.register_blueprint(users.bp)
+    app.register_blueprint(health.bp)
+    app.register_blueprint(items.bp)
+    app.register_blueprint(locations.bp)
+    app.register_blueprint(search.bp)
+    app.register_blueprint(tiles.bp)
+
+    _register_pages(app)
+    return app
 
 
 @login_manager.user_loader
 def load_user(user_id):
+    from .models import User
     return User.query.get(int(user_id))
 
 
-# --- REGISTER BLUEPRINTS ---
-from .routes import users, health, items, locations, search
+def _register_pages(app):
+    # --- ROUTES ---
+
+    @app.route('/')
+    def main():
+        return render_template('homepage.html')
+
+    @app.route('/create-listing')
+    def create_listing():
+        if not current_user.is_authenticated:
+            return redirect(url_for("users.login"))
+        return render_template('create_new_listing.html')
+
+    @app.route('/edit-listing/<int:item_id>')
+    def edit_listing(item_id):
+        return render_template('edit_item.html', item_id=item_id)
+
+    @app.route('/account-info')
+    def account_info():
+        return render_template('account_info.html')
+
+    # --- STATIC FILE SERVING ---
+
+    @app.route('/sw.js')
+    def serve_sw():
+        response = send_from_directory(os.path.join(app.root_path, 'static/js'), 'sw.js')
+        response.headers['Service-Worker-Allowed'] = '/'
+
+        return response
 
-app.register_blueprint(users.bp)
-app.register_blueprint(health.bp)
-app.register_blueprint(items.bp)
-app.register_blueprint(locations.bp)
-app.register_blueprint(search.bp)
+    @app.route('/manifest.json')
+    def serve_manifest():
+        return send_from_directory(os.path.join(app.root_path, 'static'), 'manifest.json')
 
+    @app.route('/uploads/<filename>')
+    def serve_upload(filename):
+        from .uploads import send_upload
+        return send_upload(filename)
 
-# --- ROUTES ---
 
-@app.route('/')
-def main():
-    return render_template('homepage.html')
-
-
-@app.route('/create-listing')
-def create_listing():
-    if not current_user.is_authenticated:
-        return redirect(url_for("users.login"))
-    return render_template('create_new_listing.html')
-
-
-@app.route('/edit-listing/<int:item_id>')
-def edit_listing(item_id):
-    return render_template('edit_item.html', item_id=item_id)
-
-
-@app.route('/account-info')
-def account_info():
-    return render_template('account_info.html')
-
-
-@app.route('/api/items', methods=['GET'])
-def get_items():
-    # Load items and 'eagerly' join their related location and category
-    items = Item.query.options(
-        joinedload(Item.location),
-        joinedload(Item.category),
-        joinedload(Item.owner)
-    ).filter_by(is_available=True).all()
-
-    return jsonify([item.to_dict() for item in items])
-
-
-# --- STATIC FILE SERVING ---
-
-@app.route('/sw.js')
-def serve_sw():
-    response = send_from_directory(os.path.join(app.root_path, 'static/js'), 'sw.js')
-    response.headers['Service-Worker-Allowed'] = '/'
-
-    return response
-
-
-@app.route('/manifest.json')
-def serve_manifest():
-    return send_from_directory(os.path.join(app.root_path, 'static'), 'manifest.json')
-
-
-@app.route('/uploads/<filename>')
-def serve_upload(filename):
-    return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
-
-
-# @app.route('/static/maps/<path:filename>')
-# def serve_pmtiles(filename):
-#     file_path = os.path.join(app.root_path, 'static', 'maps', filename)
-#     file_size = os.path.getsize(file_path)
-    
-#     range_header = request.headers.get('Range', None)
-    
-#     # If no range is requested (e.g., initial download), send the whole file
-#     if not range_header:
-#         response = make_response(send_from_directory(os.path.join(app.root_path, 'static/maps'), filename))
-#         response.headers['Content-Length'] = str(file_size)
-#         response.headers['Accept-Ranges'] = 'bytes'
-#         return response
-
-#     # Handle Range Request (The "Slicing" logic)
-#     try:
-#         # Parse 'bytes=0-1024'
-#         byte_range = range_header.replace('bytes=', '').split('-')
-#         start = int(byte_range[0])
-#         end = int(byte_range[1]) if byte_range[1] else file_size - 1
-        
-#         # Calculate the actual length of the slice
-#         length = end - start + 1
-
-#         with open(file_path, 'rb') as f:
-#             f.seek(start)
-#             data = f.read(length)
-
-#         rv = Response(data, 206, mimetype='application/octet-stream', direct_passthrough=True)
-#         rv.headers.add('Content-Range', f'bytes {start}-{end}/{file_size}')
-#         rv.headers.add('Accept-Ranges', 'bytes')
-#         # CRITICAL: Length must be the size of 'data', not 'file_size'
-#         rv.headers.add('Content-Length', str(length)) 
-#         print(str(length))
-#         return rv
-#     except Exception as e:
-#         return str(e), 500
-# @app.route('/static/maps/<path:filename>')
-# def serve_pmtiles(filename):
-#     path = os.path.join(app.root_path, 'static', 'maps', filename)
-#     size = os.path.getsize(path)
-    
-#     response = make_response(send_from_directory(os.path.join(app.root_path, 'static/maps'), filename, conditional=True))
-    
-#     # Force these headers to satisfy Mac/Unix byte-serving
-#     response.headers['Cache-Control'] = 'public, max-age=31536000'
-#     response.headers['Content-Length'] = str(size)
-#     response.headers['Accept-Ranges'] = 'bytes'
-#     response.headers['Content-Type'] = 'application/octet-stream'
-    
-#     return response
-    # 'conditional=True' tells Flask to support HTTP Range Requests
-    # response = send_from_directory(os.path.join(app.root_path, 'static/maps'), filename, conditional=True)
-    # response.headers['Cache-Control'] = 'public, max-age=31536000'
-    # response.headers['Accept-Ranges'] = 'bytes'
-    # response.headers['Content-Type'] = 'application/octet-stream'
-
-    # return response
-
-# @app.route('/static/maps/<path:filename>')
-# def serve_pmtiles(filename):
-#     range_header = request.headers.get('Range', None)
-#     file_path = os.path.join(app.root_path, 'static', 'maps', filename)
-#     file_size = os.path.getsize(file_path)
-#     if range_header:
-#         byte_range = range_header.replace('bytes=', '').split('-')
-#         start = int (byte_range[0])
-#         end = int (byte_range[1]) if byte_range[1] else file_size - 1
-#         print(end - start + 1)
-#     else:
-#         print(file_size)
-#     return send_from_directory(os.path.join(app.root_path, 'static', 'maps'), filename, conditional=True)
-
-@app.route('/static/maps/<path:filename>')
-def serve_pmtiles(filename):
-    # This URL is the one you copied from the Vercel Dashboard
-    blob_url = "https://ypuczzdtz97dm7t1.public.blob.vercel-storage.com/pittsburgh-pa.pmtiles"
-
-    # This tells the browser: "The file isn't here, go get it from Vercel Blob"
-    return redirect(blob_url)
+def __getattr__(name):
+    # Lazily build the shared `app` for `from app import app` callers
+    # (scripts in app/util, the flask CLI). Cached as a real global after.
+    if name == 'app':
+        globals()['app'] = application = create_app()
+        return application
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 if __name__ == '__main__':
-    app.run()
\ No newline at end of file
+    create_app().run()
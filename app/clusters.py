@@ -0,0 +1,158 @@
+"""
+Server-side grid clustering of item pins for low map zoom levels.
+
+Each slippy-map tile at the requested zoom is split into a
+CLUSTER_GRID x CLUSTER_GRID grid; available items are bucketed into cells
+and returned as one centroid per cell with a count and a per-category
+breakdown. Results are cached per (zoom, tile). Each entry records the
+inventory version it was computed at (app/inventory.py) and is recomputed
+once the version moves on, so writes from any worker process, not just
+this one, invalidate it.
+"""
+
+import math
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from .geo import tile_bbox
+from .inventory import current_version
+
+CLUSTER_GRID_BITS = 3  # 8x8 cells per tile, ~32px on a 256px tile
+MAX_CLUSTER_ZOOM = 20
+MAX_CLUSTER_TILES = 64  # refuse viewports that would need more tiles than this
+CLUSTER_CACHE_SIZE = 4096  # cached (zoom, x, y) tiles
+
+
+def _tile_coords(lat, lng, zoom):
+    """Fractional Web Mercator tile coordinates for arrays of points."""
+    n = 2 ** zoom
+    lat_rad = np.radians(np.clip(lat, -85.05112878, 85.05112878))
+    x = (np.asarray(lng, dtype=np.float64) + 180.0) / 360.0 * n
+    y = (1.0 - np.arcsinh(np.tan(lat_rad)) / math.pi) / 2.0 * n
+    return np.clip(x, 0, n - 1e-9), np.clip(y, 0, n - 1e-9)
+
+
+def tiles_for_bbox(zoom, bbox, max_tiles=MAX_CLUSTER_TILES):
+    """List the (x, y) tiles at `zoom` covering bbox=(min_lng, min_lat, max_lng, max_lat).
+    Raises ValueError, before building the list, if there are more than `max_tiles`."""
+    min_lng, min_lat, max_lng, max_lat = bbox
+    xs, ys = _tile_coords(np.array([max_lat, min_lat]), np.array([min_lng, max_lng]), zoom)
+    x0, x1 = int(xs[0]), int(xs[1])
+    y0, y1 = int(ys[0]), int(ys[1])
+    if (x1 - x0 + 1) * (y1 - y0 + 1) > max_tiles:
+        raise ValueError('bbox is too large for this zoom level')
+    return [(x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1)]
+
+
+def _compute_tiles(zoom, tiles):
+    """Clusters for each (x, y) tile in `tiles`, from a single query over
+    their combined bounds. Returns {(x, y): [cluster, ...]}."""
+    from .extensions import db
+    from .models import Item, Category, Location
+
+    result = {tile: [] for tile in tiles}
+    bounds = [tile_bbox(zoom, x, y) for x, y in tiles]
+    rows = db.session.query(Location.latitude, Location.longitude, Category.name) \
+        .join(Item, Item.location_id == Location.id) \
+        .outerjoin(Category, Item.category_id == Category.id) \
+        .filter(Item.is_available == True,
+                Location.latitude.between(min(b[1] for b in bounds), max(b[3] for b in bounds)),
+                Location.longitude.between(min(b[0] for b in bounds), max(b[2] for b in bounds))) \
+        .all()
+    if not rows:
+        return result
+
+    lats = np.array([r[0] for r in rows], dtype=np.float64)
+    lngs = np.array([r[1] for r in rows], dtype=np.float64)
+
+    # Assign each point to exactly one cell (and so one tile) — points on a
+    # shared tile edge match the range filter of both neighbours.
+    fx, fy = _tile_coords(lats, lngs, zoom + CLUSTER_GRID_BITS)
+    cell_x = fx.astype(np.int64)
+    cell_y = fy.astype(np.int64)
+
+    cells = {}
+    for i in range(len(rows)):
+        tile = (int(cell_x[i] >> CLUSTER_GRID_BITS), int(cell_y[i] >> CLUSTER_GRID_BITS))
+        if tile not in result:
+            continue
+        key = (tile, cell_x[i], cell_y[i])
+        cell = cells.get(key)
+        if cell is None:
+            cell = cells[key] = {'lat': 0.0, 'lng': 0.0, 'count': 0, 'categories': {}}
+        cell['lat'] += lats[i]
+        cell['lng'] += lngs[i]
+        cell['count'] += 1
+        category = rows[i][2] or 'Uncategorized'
+        cell['categories'][category] = cell['categories'].get(category, 0) + 1
+
+    for (tile, _, _), c in cells.items():
+        result[tile].append({
+            'latitude': round(c['lat'] / c['count'], 6),
+            'longitude': round(c['lng'] / c['count'], 6),
+            'count': c['count'],
+            'categories': c['categories'],
+        })
+    return result
+
+
+class ClusterCache:
+    """LRU of computed clusters keyed by (zoom, tile_x, tile_y). Entries are
+    (inventory version, clusters) and only served at that version."""
+
+    def __init__(self, max_entries=CLUSTER_CACHE_SIZE):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+    def clusters(self, zoom, bbox):
+        """Clusters for every tile covering `bbox`. Raises ValueError when
+        the viewport spans more than MAX_CLUSTER_TILES tiles."""
+        tiles = tiles_for_bbox(zoom, bbox)
+        # Read before computing: a write that lands mid-computation leaves
+        # the new entries stamped with the older version, so they're redone
+        version = current_version()
+
+        cached, missing = {}, []
+        with self._lock:
+            for x, y in tiles:
+                key = (zoom, x, y)
+                entry = self._entries.get(key)
+                if entry is not None and entry[0] == version:
+                    self._entries.move_to_end(key)
+                    cached[(x, y)] = entry[1]
+                else:
+                    missing.append((x, y))
+            self.hits += len(tiles) - len(missing)
+            self.misses += len(missing)
+
+        if missing:
+            computed = _compute_tiles(zoom, missing)
+            cached.update(computed)
+            with self._lock:
+                for (x, y), tile_clusters in computed.items():
+                    self._entries[(zoom, x, y)] = (version, tile_clusters)
+                    self._entries.move_to_end((zoom, x, y))
+                while len(self._entries) > self._max_entries:
+                    self._entries.popitem(last=False)
+
+        result = []
+        for tile in tiles:
+            result.extend(cached[tile])
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'max_entries': self._max_entries,
+                    'hits': self.hits, 'misses': self.misses}
+
+
+cluster_cache = ClusterCache()
@@ -0,0 +1,164 @@
+"""
+Engine / connection-pool configuration, selected per deployment.
+
+DB_POOL_MODE picks how connections to Postgres (Neon) are held:
+
+- queue      a QueuePool of DB_POOL_SIZE connections (+ DB_MAX_OVERFLOW
+             bursting), recycled after DB_POOL_RECYCLE seconds and
+             pinged before use, so connections Neon closed while idle are
+             replaced instead of failing mid-request. Default for
+             long-running servers.
+- null       NullPool: connect per checkout. Default on Vercel (VERCEL is
+             set), where workers are frozen between invocations and a
+             pooled socket is usually dead by the time it's reused.
+- pgbouncer  NullPool against a transaction-mode pooler such as Neon's
+             "-pooler" endpoint. Startup options aren't passed through
+             the pooler, so the statement timeout is applied per
+             transaction with SET LOCAL instead.
+
+DB_STATEMENT_TIMEOUT_MS (default 15000, 0 disables) caps every statement
+so one slow query can't pin a connection during a traffic spike;
+DB_CONNECT_TIMEOUT bounds connection setup. SQLite ignores all of this.
+
+`pool_monitor` counts connects, checkouts and invalidations and times
+connection setup; see `/api/db/pool-stats`.
+"""
+
+import logging
+import os
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.pool import NullPool
+
+POOL_MODES = ('queue', 'null', 'pgbouncer')
+DEFAULT_POOL_MODE = 'null' if os.environ.get('VERCEL') else 'queue'
+
+log = logging.getLogger(__name__)
+
+
+def _env_int(name, default):
+    return int(os.environ.get(name, default))
+
+
+def pool_mode():
+    mode = os.environ.get('DB_POOL_MODE', DEFAULT_POOL_MODE).lower()
+    if mode not in POOL_MODES:
+        raise ValueError(f"DB_POOL_MODE must be one of {', '.join(POOL_MODES)}, got {mode!r}")
+    return mode
+
+
+def statement_timeout_ms():
+    return _env_int('DB_STATEMENT_TIMEOUT_MS', 15000)
+
+
+def engine_options(database_url):
+    """SQLALCHEMY_ENGINE_OPTIONS for `database_url`, from the environment."""
+    if not database_url.startswith('postgresql'):
+        return {}
+
+    mode = pool_mode()
+    connect_args = {
+        'connect_timeout': _env_int('DB_CONNECT_TIMEOUT', 5),
+        'application_name': 'ember',
+        # Notice dead peers (e.g. after a Neon compute suspends) quickly
+        'keepalives': 1,
+        'keepalives_idle': 30,
+        'keepalives_interval': 10,
+        'keepalives_count': 3,
+    }
+    timeout = statement_timeout_ms()
+    if timeout and mode != 'pgbouncer':
+        connect_args['options'] = f'-c statement_timeout={timeout}'
+
+    if mode == 'queue':
+        return {
+            'pool_size': _env_int('DB_POOL_SIZE', 5),
+            'max_overflow': _env_int('DB_MAX_OVERFLOW', 10),
+            'pool_timeout': _env_int('DB_POOL_TIMEOUT', 10),
+            'pool_recycle': _env_int('DB_POOL_RECYCLE', 300),  # Neon suspends idle computes after 5 min
+            'pool_pre_ping': os.environ.get('DB_POOL_PRE_PING', '1') == '1',
+            'connect_args': connect_args,
+        }
+    return {'poolclass': NullPool, 'connect_args': connect_args}
+
+
+class PoolMonitor:
+    """Connection lifecycle counters for the app's engine."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._engine = None
+        self.mode = None
+        self.connects = 0
+        self.checkouts = 0
+        self.invalidations = 0
+        self.connect_seconds = 0.0
+        self.max_connect_seconds = 0.0
+
+    def init_app(self, app):
+        from .extensions import db
+
+        with app.app_context():
+            engine = db.engine
+        self._engine = engine
+        self.mode = pool_mode() if engine.dialect.name == 'postgresql' else engine.dialect.name
+
+        event.listen(engine, 'do_connect', self._on_do_connect)
+        event.listen(engine, 'connect', self._on_connect)
+        event.listen(engine.pool, 'checkout', self._on_checkout)
+        event.listen(engine.pool, 'invalidate', self._on_invalidate)
+
+        timeout = statement_timeout_ms()
+        if self.mode == 'pgbouncer' and timeout:
+            @event.listens_for(engine, 'begin')
+            def _set_statement_timeout(conn):
+                conn.exec_driver_sql(f'SET LOCAL statement_timeout = {int(timeout)}')
+
+        log.info("db pool mode=%s class=%s", self.mode, type(engine.pool).__name__)
+
+    def _on_do_connect(self, dialect, conn_rec, cargs, cparams):
+        self._local.started = time.perf_counter()
+        # returning None lets the dialect connect as usual
+
+    def _on_connect(self, dbapi_conn, conn_rec):
+        started = getattr(self._local, 'started', None)
+        elapsed = time.perf_counter() - started if started is not None else 0.0
+        self._local.started = None
+        with self._lock:
+            self.connects += 1
+            self.connect_seconds += elapsed
+            self.max_connect_seconds = max(self.max_connect_seconds, elapsed)
+
+    def _on_checkout(self, dbapi_conn, conn_rec, conn_proxy):
+        with self._lock:
+            self.checkouts += 1
+
+    def _on_invalidate(self, dbapi_conn, conn_rec, exception):
+        with self._lock:
+            self.invalidations += 1
+
+    def stats(self):
+        pool = self._engine.pool if self._engine is not None else None
+        with self._lock:
+            stats = {
+                'mode': self.mode,
+                'pool_class': type(pool).__name__ if pool is not None else None,
+                'connects': self.connects,
+                'checkouts': self.checkouts,
+                'invalidations': self.invalidations,
+                'reuse_ratio': round(1 - self.connects / self.checkouts, 4) if self.checkouts else 0.0,
+                'avg_connect_ms': round(self.connect_seconds / self.connects * 1000, 2) if self.connects else 0.0,
+                'max_connect_ms': round(self.max_connect_seconds * 1000, 2),
+            }
+        # QueuePool only; NullPool holds nothing
+        for name in ('size', 'checkedin', 'checkedout', 'overflow'):
+            method = getattr(pool, name, None)
+            if callable(method):
+                stats[name] = method()
+        return stats
+
+
+pool_monitor = PoolMonitor()
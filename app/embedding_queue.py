@@ -0,0 +1,249 @@
+"""
+Background embedding pipeline.
+
+Item writes enqueue an `EmbeddingJob` row in the same transaction as the
+item, so the request never waits on the Dedalus API. Pending jobs are
+drained in batches (one multi-input `embeddings.create` call per batch):
+
+- in-process by a daemon worker thread, woken after each item write and
+  on a poll interval (EMBEDDING_WORKER=thread, the default), or
+- by `flask embed-pending`, e.g. from cron on serverless deployments
+  where background threads don't survive the request (EMBEDDING_WORKER=off).
+
+Jobs are durable: if the provider is down or the process dies they stay
+queued and are retried on the next pass. When a batch call fails, its
+items are retried one at a time so a single bad input can't hold back the
+rest. A job that has failed EMBED_MAX_ATTEMPTS times is skipped from then
+on; it keeps its `last_error`, and editing the item or running
+`flask embed-pending --retry-failed` queues it again.
+"""
+
+import logging
+import os
+import threading
+from datetime import datetime
+
+import click
+from flask.cli import with_appcontext
+
+from .embeddings import EMBEDDING_MODEL, embed_texts, item_text, needs_embedding, text_hash
+
+EMBED_BATCH_SIZE = 64  # Dedalus supports up to 2048 inputs per request
+POLL_INTERVAL = 30  # seconds between passes when nothing wakes the worker
+MAX_ATTEMPTS = int(os.environ.get('EMBED_MAX_ATTEMPTS', 5))
+
+log = logging.getLogger(__name__)
+
+
+def enqueue(item):
+    """Queue `item` for (re-)embedding if its embedded text changed.
+    Call before committing the item. Returns True if a job was queued."""
+    from .extensions import db
+    from .models import EmbeddingJob
+
+    if not needs_embedding(item):
+        return False
+
+    job = db.session.get(EmbeddingJob, item.id)
+    if job is None:
+        db.session.add(EmbeddingJob(item_id=item.id, enqueued_at=datetime.utcnow()))
+    else:
+        job.enqueued_at = datetime.utcnow()
+        job.attempts = 0
+        job.last_error = None
+    return True
+
+
+def pending_count():
+    from .models import EmbeddingJob
+    return EmbeddingJob.query.filter(EmbeddingJob.attempts < MAX_ATTEMPTS).count()
+
+
+def failed_count():
+    """Jobs skipped after MAX_ATTEMPTS failures."""
+    from .models import EmbeddingJob
+    return EmbeddingJob.query.filter(EmbeddingJob.attempts >= MAX_ATTEMPTS).count()
+
+
+def requeue_failed():
+    """Give every skipped job a fresh set of attempts. Returns how many."""
+    from .extensions import db
+    from .models import EmbeddingJob
+
+    count = EmbeddingJob.query.filter(EmbeddingJob.attempts >= MAX_ATTEMPTS) \
+        .update({'attempts': 0}, synchronize_session=False)
+    db.session.commit()
+    return count
+
+
+def _embed_one_by_one(client, items, texts):
+    """Embed each item on its own after its batch failed. Returns the
+    (item, text, vector) triples that worked and {item_id: error} for the
+    rest. Gives up early if the first two calls fail: then the provider is
+    down, and trying every item would only slow the pass."""
+    done, failed = [], {}
+    for item, text in zip(items, texts):
+        try:
+            vec, = embed_texts(client, [text])
+        except Exception as e:
+            failed[item.id] = e
+            if not done and len(failed) >= 2:
+                break
+            continue
+        done.append((item, text, vec))
+    return done, failed
+
+
+def process_pending(client, batch_size=EMBED_BATCH_SIZE, max_batches=None):
+    """Embed queued items in batches. Returns the number of items embedded.
+    Must run inside an app context."""
+    from sqlalchemy import and_, or_
+    from sqlalchemy.orm import joinedload
+    from .extensions import db
+    from .models import EmbeddingJob, Item
+    from .search_index import embedding_index
+
+    embedded = 0
+    batches = 0
+    last = None
+    while max_batches is None or batches < max_batches:
+        # Keyset pagination on (enqueued_at, item_id); a job re-enqueued
+        # mid-pass gets a newer timestamp and is picked up again.
+        query = EmbeddingJob.query.filter(EmbeddingJob.attempts < MAX_ATTEMPTS) \
+            .order_by(EmbeddingJob.enqueued_at, EmbeddingJob.item_id)
+        if last is not None:
+            query = query.filter(or_(
+                EmbeddingJob.enqueued_at > last[0],
+                and_(EmbeddingJob.enqueued_at == last[0], EmbeddingJob.item_id > last[1]),
+            ))
+        jobs = query.limit(batch_size).all()
+        if not jobs:
+            break
+        batches += 1
+        last = (jobs[-1].enqueued_at, jobs[-1].item_id)
+
+        items = Item.query.options(joinedload(Item.category)) \
+            .filter(Item.id.in_([job.item_id for job in jobs])).all()
+        items_by_id = {item.id: item for item in items}
+
+        # Jobs whose item was deleted in the meantime
+        for job in jobs:
+            if job.item_id not in items_by_id:
+                db.session.delete(job)
+
+        # Text may have been reverted (or already embedded) since enqueueing
+        stale = [item for item in items if needs_embedding(item)]
+        texts = [item_text(item) for item in stale]
+
+        done, failed = [], {}
+        if stale:
+            try:
+                done = list(zip(stale, texts, embed_texts(client, texts)))
+            except Exception as e:
+                log.exception("embedding batch failed", extra={'batch_size': len(stale)})
+                if len(stale) > 1:
+                    done, failed = _embed_one_by_one(client, stale, texts)
+                else:
+                    failed = {stale[0].id: e}
+
+            for item, text, vec in done:
+                item.set_embedding(vec, EMBEDDING_MODEL, text_hash(text))
+
+        # Untried items (the provider went down mid-batch) keep their jobs as they are
+        settled = {item.id for item, _, _ in done} | (items_by_id.keys() - {item.id for item in stale})
+        for job in jobs:
+            if job.item_id in failed:
+                job.attempts += 1
+                job.last_error = str(failed[job.item_id])[:500]
+                if job.attempts >= MAX_ATTEMPTS:
+                    log.error("giving up on embedding item %s after %s attempts", job.item_id,
+                              job.attempts, extra={'item_id': job.item_id})
+
+        # Only clear jobs that weren't re-enqueued while we were embedding
+        for job in jobs:
+            if job.item_id in settled:
+                EmbeddingJob.query.filter(
+                    EmbeddingJob.item_id == job.item_id,
+                    EmbeddingJob.enqueued_at <= job.enqueued_at,
+                ).delete(synchronize_session=False)
+
+        db.session.commit()
+        for item, _, _ in done:
+            embedding_index.upsert(item)
+        embedded += len(done)
+        if failed and not done:
+            break  # provider trouble — leave the rest queued for the next pass
+
+    return embedded
+
+
+class EmbeddingWorker:
+    """Single daemon thread that drains the embedding queue."""
+
+    def __init__(self):
+        self._app = None
+        self._wake = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self._app = app
+        app.cli.add_command(embed_pending_command)
+
+    @property
+    def enabled(self):
+        return self._app is not None and os.environ.get('EMBEDDING_WORKER', 'thread') == 'thread'
+
+    def notify(self):
+        """Wake the worker (starting it on first use)."""
+        if not self.enabled:
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='embedding-worker', daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def _run(self):
+        from .extensions import db, get_dedalus_client
+
+        while True:
+            self._wake.wait(POLL_INTERVAL)
+            self._wake.clear()
+            client = get_dedalus_client()
+            if client is None:
+                continue
+            with self._app.app_context():
+                try:
+                    process_pending(client)
+                except Exception:
+                    log.exception("embedding worker pass failed")
+                    db.session.rollback()
+                finally:
+                    db.session.remove()
+
+
+embedding_worker = EmbeddingWorker()
+
+
+@click.command('embed-pending')
+@click.option('--batch-size', default=EMBED_BATCH_SIZE, show_default=True)
+@click.option('--retry-failed', is_flag=True,
+              help=f'Also retry items that failed {MAX_ATTEMPTS} times.')
+@with_appcontext
+def embed_pending_command(batch_size, retry_failed):
+    """Embed every item waiting in the embedding queue."""
+    from .extensions import get_dedalus_client
+
+    client = get_dedalus_client()
+    if client is None:
+        click.echo("ERROR: DEDALUS_API_KEY not configured. Set it in .env and try again.")
+        raise SystemExit(1)
+
+    if retry_failed:
+        requeue_failed()
+    click.echo(f"{pending_count()} items queued")
+    embedded = process_pending(client, batch_size=batch_size)
+    failed = failed_count()
+    click.echo(f"Embedded {embedded} items, {pending_count()} still queued"
+               + (f", {failed} failed (see embedding_job.last_error)" if failed else ""))
@@ -0,0 +1,107 @@
+"""
+Item embedding helpers: the text we embed, the Dedalus call, and compact
+binary storage for the resulting vectors.
+
+Vectors are stored as raw little-endian bytes in `Item.embedding` instead
+of JSON text. A 1536-dim vector takes ~30KB as JSON, 6KB as float32, 3KB
+as float16 and ~1.5KB as int8. The storage dtype is chosen with the
+EMBEDDING_DTYPE environment variable (float32 by default).
+
+int8 blobs are prefixed with a float32 scale factor so the original
+magnitudes can be recovered; cosine similarity doesn't need it, but it
+keeps `unpack_vector` lossless up to quantization error.
+
+NumPy is imported inside the pack/unpack helpers: this module is on every
+write path, and most cold starts never touch a vector.
+"""
+
+import hashlib
+import os
+
+EMBEDDING_MODEL = "openai/text-embedding-3-small"
+
+SUPPORTED_DTYPES = ('float32', 'float16', 'int8')
+DEFAULT_DTYPE = os.environ.get('EMBEDDING_DTYPE', 'float32')
+
+if DEFAULT_DTYPE not in SUPPORTED_DTYPES:
+    DEFAULT_DTYPE = 'float32'
+
+_SCALE_BYTES = 4  # float32 scale prefix on int8 blobs
+
+
+def item_text(item):
+    """Build the text string that gets embedded for an item."""
+    parts = [item.item_name or ""]
+    if item.category:
+        parts.append(item.category.name)
+    if item.item_desc:
+        parts.append(item.item_desc)
+    return " — ".join(parts)
+
+
+def text_hash(text):
+    """Content hash of an embedded text, stored next to the vector."""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def needs_embedding(item):
+    """True unless the item's stored vector was computed from its current
+    text with the current model. Fields outside `item_text` (quantity,
+    availability, picture, location) never trigger a re-embed."""
+    if not item.embedding and not item.embedding_json:
+        return True
+    if item.embedding_model not in (None, EMBEDDING_MODEL):
+        return True
+    return item.embedding_text_hash != text_hash(item_text(item))
+
+
+def embed_texts(client, texts):
+    """Call Dedalus embeddings API for a batch of texts. Returns list of vectors."""
+    from .metrics import metrics
+
+    with metrics.provider_call('embed_batch'):
+        response = client.embeddings.create(
+            input=texts,
+            model=EMBEDDING_MODEL,
+        )
+    # Sort by index to preserve order
+    sorted_data = sorted(response.data, key=lambda d: d.index)
+    return [d.embedding for d in sorted_data]
+
+
+def pack_vector(vec, dtype=None):
+    """Encode a sequence of floats as bytes. Returns (blob, dim, dtype)."""
+    import numpy as np
+
+    dtype = dtype or DEFAULT_DTYPE
+    arr = np.asarray(vec, dtype=np.float32).ravel()
+
+    if dtype == 'int8':
+        peak = float(np.max(np.abs(arr))) if arr.size else 0.0
+        scale = peak / 127.0 if peak > 0 else 1.0
+        quantized = np.clip(np.rint(arr / scale), -127, 127).astype('<i1')
+        blob = np.float32(scale).astype('<f4').tobytes() + quantized.tobytes()
+    elif dtype == 'float16':
+        blob = arr.astype('<f2').tobytes()
+    elif dtype == 'float32':
+        blob = arr.astype('<f4').tobytes()
+    else:
+        raise ValueError(f"Unsupported embedding dtype: {dtype}")
+
+    return blob, int(arr.size), dtype
+
+
+def unpack_vector(blob, dtype='float32'):
+    """Decode bytes written by `pack_vector` into a float32 NumPy array."""
+    if not blob:
+        return None
+    import numpy as np
+
+    blob = bytes(blob)  # psycopg2 hands back memoryview for bytea
+
+    if dtype == 'int8':
+        scale = np.frombuffer(blob[:_SCALE_BYTES], dtype='<f4')[0]
+        return np.frombuffer(blob[_SCALE_BYTES:], dtype='<i1').astype(np.float32) * scale
+    if dtype == 'float16':
+        return np.frombuffer(blob, dtype='<f2').astype(np.float32)
+    return np.frombuffer(blob, dtype='<f4').astype(np.float32)
@@ -1,16 +1,30 @@
+import logging
 import os
-from dotenv import load_dotenv
 from flask_login import LoginManager
 from flask_sqlalchemy import SQLAlchemy
 
-# Load .env at import time so DEDALUS_API_KEY is always available
-load_dotenv()
-
 
 # Initialize the database instance here to avoid circular imports
 db = SQLAlchemy()
 login_manager = LoginManager()
 
+log = logging.getLogger(__name__)
+
+
+def init_migrate(app):
+    """Register Flask-Migrate (`flask db ...`) on `app`.
+
+    Alembic takes longer to import than the rest of the app combined, so
+    this only runs under the flask CLI and in scripts that need it.
+    Schema changes ship as revisions in migrations/; batch mode lets them
+    ALTER constraints on SQLite.
+    """
+    from flask_migrate import Migrate
+
+    directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'migrations')
+    return Migrate(app, db, directory=directory, render_as_batch=True)
+
+
 # --- Dedalus Labs SDK ---
 # Lazily initialized; None when the API key is not set (offline / local dev)
 _dedalus_client = None
@@ -30,7 +44,7 @@ def get_dedalus_client():
     try:
         from dedalus_labs import Dedalus
         _dedalus_client = Dedalus(api_key=api_key)
-        print("here")
         return _dedalus_client
     except Exception:
+        log.warning("could not create the Dedalus client", exc_info=True)
         return None
@@ -0,0 +1,73 @@
+"""
+Geographic helpers shared by the search and map endpoints.
+"""
+
+import math
+
+EARTH_RADIUS_MILES = 3958.8
+MILES_PER_DEGREE_LAT = 69.0
+
+
+def haversine_miles(lat1, lng1, lat2, lng2):
+    """Haversine distance in miles. Accepts scalars or NumPy arrays."""
+    import numpy as np
+
+    lat1, lng1, lat2, lng2 = (np.radians(np.asarray(v, dtype=np.float64))
+                              for v in (lat1, lng1, lat2, lng2))
+    d_lat = lat2 - lat1
+    d_lng = lng2 - lng1
+    a = (np.sin(d_lat / 2) ** 2 +
+         np.cos(lat1) * np.cos(lat2) * np.sin(d_lng / 2) ** 2)
+    return EARTH_RADIUS_MILES * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+
+def bounding_box(lat, lng, radius_miles):
+    """Return (min_lat, min_lng, max_lat, max_lng) enclosing a circle.
+
+    The box is a conservative superset of the circle, so it's safe to use
+    as a SQL prefilter before an exact haversine check. Longitude bounds are
+    None when the circle reaches a pole or wraps the whole globe.
+    """
+    d_lat = radius_miles / MILES_PER_DEGREE_LAT
+    min_lat = max(lat - d_lat, -90.0)
+    max_lat = min(lat + d_lat, 90.0)
+
+    # Widest longitude span of the circle is at the latitude furthest from the equator
+    cos_lat = min(math.cos(math.radians(min_lat)), math.cos(math.radians(max_lat)))
+    if cos_lat <= 1e-9:
+        return min_lat, None, max_lat, None
+    d_lng = radius_miles / (MILES_PER_DEGREE_LAT * cos_lat)
+    if d_lng >= 180.0 or lng - d_lng < -180.0 or lng + d_lng > 180.0:
+        # Don't bother splitting boxes that cross the antimeridian
+        return min_lat, None, max_lat, None
+    return min_lat, lng - d_lng, max_lat, lng + d_lng
+
+
+def parse_bbox(value):
+    """Parse 'minLng,minLat,maxLng,maxLat' into a 4-tuple of floats.
+
+    Raises ValueError for malformed or out-of-range boxes.
+    """
+    parts = [float(p) for p in value.split(',')]
+    if len(parts) != 4:
+        raise ValueError('bbox must be minLng,minLat,maxLng,maxLat')
+    min_lng, min_lat, max_lng, max_lat = parts
+    if not (-180 <= min_lng <= max_lng <= 180 and -90 <= min_lat <= max_lat <= 90):
+        raise ValueError('bbox is out of range or inverted')
+    return min_lng, min_lat, max_lng, max_lat
+
+
+def tile_bbox(z, x, y):
+    """Bounds of slippy-map (Web Mercator) tile z/x/y as
+    (min_lng, min_lat, max_lng, max_lat)."""
+    # Check z before 2 ** z so a huge zoom can't build a huge integer
+    if not 0 <= z <= 30:
+        raise ValueError('tile coordinates out of range')
+    n = 2 ** z
+    if not (0 <= x < n and 0 <= y < n):
+        raise ValueError('tile coordinates out of range')
+
+    def lat_at(row):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * row / n))))
+
+    return x / n * 360.0 - 180.0, lat_at(y + 1), (x + 1) / n * 360.0 - 180.0, lat_at(y)
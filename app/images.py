@@ -0,0 +1,177 @@
+"""
+Background processing of uploaded item pictures.
+
+Uploads are saved as-is by the item routes (content-addressed, see
+app/uploads.py) and then handed to a small worker pool, which writes
+bounded-size renditions next to them in UPLOAD_FOLDER:
+
+    thumb   160px   list / sidebar thumbnails
+    medium  640px   listing detail
+    large   1280px  full view; becomes `Item.picture`
+
+(longest edge, never upscaled). Renditions are WebP by default
+(IMAGE_FORMAT=jpeg for JPEG). EXIF orientation is applied first, then
+all metadata — EXIF including GPS, ICC, comments — is dropped. The
+rendition names are recorded on `Item.picture_renditions` and the
+item's reference to the original is released.
+
+IMAGE_PIPELINE picks where the work runs: `thread` (default) on a pool of
+IMAGE_WORKERS threads, `inline` in the request (for serverless hosts
+where background threads are frozen after the response), or `off`.
+Pillow is an optional dependency; without it uploads are served raw.
+"""
+
+import io
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+
+from . import uploads
+
+RENDITIONS = {'large': 1280, 'medium': 640, 'thumb': 160}  # name -> max edge (px)
+IMAGE_FORMAT = os.environ.get('IMAGE_FORMAT', 'webp').lower()
+IMAGE_QUALITY = 80
+PIPELINE = os.environ.get('IMAGE_PIPELINE', 'thread')
+WORKERS = int(os.environ.get('IMAGE_WORKERS', 2))
+MAX_IMAGE_PIXELS = 60_000_000  # refuse decompression bombs well below Pillow's default
+
+_EXTENSIONS = {'webp': 'webp', 'jpeg': 'jpg'}
+
+log = logging.getLogger(__name__)
+
+
+def _pillow():
+    try:
+        from PIL import Image, ImageOps
+        Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS
+        return Image, ImageOps
+    except ImportError:
+        return None
+
+
+def is_upload(picture):
+    """Category icon placeholders ('icon-tools', ...) aren't files."""
+    return bool(picture) and not picture.startswith('icon-')
+
+
+def picture_files(item):
+    """Every file in UPLOAD_FOLDER that belongs to `item`'s picture."""
+    names = set(item.renditions.values())
+    if is_upload(item.picture):
+        names.add(item.picture)
+    return names
+
+
+def render(source_path, upload_folder):
+    """Write every rendition of `source_path` under its content name.
+    Returns {name: filename}."""
+    Image, ImageOps = _pillow()
+    ext = _EXTENSIONS.get(IMAGE_FORMAT, 'webp')
+    largest = max(RENDITIONS.values())
+
+    with Image.open(source_path) as source:
+        # JPEG: let the decoder downscale by up to 8x for free
+        source.draft('RGB', (largest, largest))
+        img = ImageOps.exif_transpose(source)
+        has_alpha = img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info)
+        img = img.convert('RGBA' if has_alpha and ext == 'webp' else 'RGB')
+        img.info = {}  # strip EXIF / ICC / comments
+
+        names = {}
+        # Largest first, shrinking the same image in place each step
+        for name, edge in sorted(RENDITIONS.items(), key=lambda pair: -pair[1]):
+            img.thumbnail((edge, edge), Image.LANCZOS)
+            encoded = io.BytesIO()
+            if ext == 'webp':
+                img.save(encoded, 'WEBP', quality=IMAGE_QUALITY, method=4)
+            else:
+                img.save(encoded, 'JPEG', quality=IMAGE_QUALITY, optimize=True, progressive=True)
+            names[name] = uploads.store_bytes(encoded.getvalue(), ext, upload_folder)
+    return names
+
+
+def process_item_picture(item_id, source):
+    """Render `source` for the item and swap it in. Runs in an app context."""
+    from . import inventory
+    from .extensions import db
+    from .models import Item
+
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    source_path = os.path.join(upload_folder, source)
+
+    item = db.session.get(Item, item_id)
+    if item is None or item.picture != source or not os.path.exists(source_path):
+        return  # deleted or replaced before we got to it
+
+    try:
+        names = render(source_path, upload_folder)
+    except Exception as e:
+        # Not an image Pillow can read — keep serving the original
+        log.warning("could not process %s: %s", source, e, extra={'item_id': item_id})
+        return
+
+    # The item may have changed while we were rendering
+    db.session.refresh(item)
+    if item.picture != source:
+        uploads.purge(names.values(), upload_folder)  # unless another item shares them
+        return
+
+    uploads.acquire(*names.values(), upload_folder=upload_folder)
+    released = uploads.release(source)
+    item.picture = names['large']
+    item.picture_renditions = json.dumps(names, sort_keys=True)
+    inventory.mark_changed(item)
+    db.session.commit()
+    uploads.purge(released, upload_folder)
+    item = Item.query_with_relations().filter(Item.id == item_id).one()
+    inventory.item_saved(item)
+    log.info("item %s: %s -> %d renditions", item_id, source, len(names), extra={'item_id': item_id})
+
+
+class ImagePipeline:
+    """Runs `process_item_picture` off the request path."""
+
+    def __init__(self, workers=WORKERS):
+        self._lock = threading.Lock()
+        self._executor = None
+        self._workers = workers
+        self._warned = False
+
+    def schedule(self, item_id, source):
+        """Queue renditions for a freshly saved upload. Call after commit."""
+        if PIPELINE == 'off' or not is_upload(source):
+            return
+        if _pillow() is None:
+            if not self._warned:
+                log.warning("Pillow is not installed; serving uploads unprocessed")
+                self._warned = True
+            return
+
+        if PIPELINE == 'inline':
+            process_item_picture(item_id, source)
+            return
+
+        app = current_app._get_current_object()
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self._workers,
+                                                    thread_name_prefix='images')
+        self._executor.submit(self._run, app, item_id, source)
+
+    @staticmethod
+    def _run(app, item_id, source):
+        from .extensions import db
+
+        with app.app_context():
+            try:
+                process_item_picture(item_id, source)
+            except Exception:
+                log.exception("processing item %s's picture failed", item_id, extra={'item_id': item_id})
+                db.session.rollback()
+
+
+image_pipeline = ImagePipeline()
@@ -0,0 +1,124 @@
+"""
+Write hooks for the item inventory.
+
+Routes call these after committing a change so every in-process derived
+structure (search indexes, map cluster cache, payload cache, ...) stays in sync from one
+place instead of each route knowing about each cache.
+
+Before committing, routes also record the write against the global
+inventory version (`mark_changed` / `mark_deleted`, in the same
+transaction). The version drives the /api/items ETag and `?since=` delta
+sync; deletions leave tombstones so syncing clients can drop them.
+
+The search indexes and the cluster cache pull in NumPy, so they're only
+updated if something in this process has already imported them — a
+module that was never loaded holds no state to keep in sync.
+"""
+
+import sys
+
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+
+from .embedding_queue import embedding_worker
+from .payload_cache import payload_cache
+
+
+def _loaded(module, name):
+    """Singleton `name` from app.<module>, or None if it isn't imported yet."""
+    mod = sys.modules.get(f'{__package__}.{module}')
+    return getattr(mod, name, None)
+
+
+def _indexes():
+    return [index for index in (_loaded('search_index', 'embedding_index'),
+                                _loaded('lexical_index', 'lexical_index')) if index is not None]
+
+
+def item_saved(item):
+    """An item was created or updated. (The cluster cache needs no hook:
+    its entries are stamped with the inventory version.)"""
+    for index in _indexes():
+        index.upsert(item)
+    payload_cache.invalidate(item.id)
+    embedding_worker.notify()  # pick up the item's queued embedding job
+
+
+def item_deleted(item_id):
+    """A single item was deleted."""
+    for index in _indexes():
+        index.remove(item_id)
+    payload_cache.invalidate(item_id)
+
+
+def inventory_changed():
+    """Many items changed at once (cascading deletes, bulk imports)."""
+    for index in _indexes():
+        index.invalidate()
+    payload_cache.clear()
+
+    cluster_cache = _loaded('clusters', 'cluster_cache')
+    if cluster_cache is not None:
+        cluster_cache.clear()
+
+
+# --- inventory versioning (call before commit) ---
+
+def current_version():
+    """The global inventory version; 0 before the first write."""
+    from .extensions import db
+    from .models import InventoryState
+
+    version = db.session.execute(
+        select(InventoryState.version).where(InventoryState.id == 1)
+    ).scalar()
+    return version or 0
+
+
+def next_version():
+    """Bump the inventory version and return it. Bulk writers stamp their
+    rows with the result themselves; `mark_changed` does it for ORM items."""
+    from .extensions import db
+    from .models import InventoryState
+
+    def bump():
+        # Atomic increment; the row lock also serialises concurrent writers
+        return db.session.execute(
+            update(InventoryState).where(InventoryState.id == 1)
+            .values(version=InventoryState.version + 1)
+        ).rowcount
+
+    if bump():
+        return current_version()
+    try:
+        with db.session.begin_nested():
+            db.session.add(InventoryState(id=1, version=1))
+        return 1
+    except IntegrityError:
+        # Another first writer created the row; increment it instead
+        bump()
+        return current_version()
+
+
+def mark_changed(*items):
+    """Stamp created/updated items with a new inventory version."""
+    if not items:
+        return
+    version = next_version()
+    for item in items:
+        item.version = version
+        if not item.created_version:
+            item.created_version = version
+
+
+def mark_deleted(item_ids):
+    """Leave tombstones for items about to be deleted."""
+    from .extensions import db
+    from .models import ItemTombstone
+
+    item_ids = list(item_ids)
+    if not item_ids:
+        return
+    version = next_version()
+    for item_id in item_ids:
+        db.session.merge(ItemTombstone(item_id=item_id, version=version))
@@ -0,0 +1,167 @@
+"""
+In-memory BM25 index over item name, category and description.
+
+Serves /api/search when the embedding provider is unreachable (or the
+query can't be embedded), and acts as the lexical half of hybrid ranking
+when vectors are available. Built lazily from the database and updated
+incrementally by the item write hooks in app/inventory.py.
+"""
+
+import math
+import re
+import threading
+import time
+from collections import defaultdict
+
+from .search_index import MAX_AGE
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+NAME_WEIGHT = 2  # name terms count twice — they're the strongest signal
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_STOPWORDS = {
+    'a', 'an', 'and', 'are', 'for', 'i', 'in', 'is', 'it', 'me', 'my', 'need',
+    'of', 'on', 'or', 'some', 'the', 'to', 'with', 'any', 'looking',
+}
+
+
+def tokenize(text):
+    """Lowercase word tokens with stopwords dropped and plurals folded."""
+    tokens = []
+    for token in _TOKEN_RE.findall((text or '').lower()):
+        if token in _STOPWORDS:
+            continue
+        if len(token) > 3 and token.endswith('s') and not token.endswith('ss'):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+def _item_terms(name, category, description):
+    terms = defaultdict(int)
+    for token in tokenize(name):
+        terms[token] += NAME_WEIGHT
+    for token in tokenize(category) + tokenize(description):
+        terms[token] += 1
+    return terms
+
+
+class LexicalIndex:
+    """Inverted index (term -> {item_id: tf}) with BM25 scoring.
+
+    Like the embedding index it only holds available items.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._built = False
+        self._built_at = 0.0
+        self._postings = defaultdict(dict)
+        self._doc_terms = {}  # item_id -> {term: tf}, for removal
+        self._doc_len = {}
+        self._categories = {}
+        self._total_len = 0
+
+    def __len__(self):
+        return len(self._doc_len)
+
+    def build(self):
+        """(Re)load every available item from the database."""
+        from .extensions import db
+        from .models import Item, Category
+
+        rows = db.session.query(Item.id, Item.item_name, Category.name, Item.item_desc) \
+            .outerjoin(Category, Item.category_id == Category.id) \
+            .filter(Item.is_available == True) \
+            .all()
+
+        with self._lock:
+            self._postings = defaultdict(dict)
+            self._doc_terms = {}
+            self._doc_len = {}
+            self._categories = {}
+            self._total_len = 0
+            for item_id, name, category, description in rows:
+                self._add_locked(item_id, name, category, description)
+            self._built = True
+            self._built_at = time.monotonic()
+
+    def ensure_built(self):
+        if not self._built or time.monotonic() - self._built_at > MAX_AGE:
+            self.build()
+
+    def invalidate(self):
+        with self._lock:
+            self._built = False
+
+    def upsert(self, item):
+        if not self._built:
+            return
+        with self._lock:
+            self._remove_locked(item.id)
+            if item.is_available:
+                category = item.category.name if item.category else None
+                self._add_locked(item.id, item.item_name, category, item.item_desc)
+
+    def remove(self, item_id):
+        if not self._built:
+            return
+        with self._lock:
+            self._remove_locked(item_id)
+
+    def _add_locked(self, item_id, name, category, description):
+        terms = _item_terms(name, category, description)
+        for term, tf in terms.items():
+            self._postings[term][item_id] = tf
+        length = sum(terms.values())
+        self._doc_terms[item_id] = terms
+        self._doc_len[item_id] = length
+        self._categories[item_id] = category or ''
+        self._total_len += length
+
+    def _remove_locked(self, item_id):
+        terms = self._doc_terms.pop(item_id, None)
+        if terms is None:
+            return
+        for term in terms:
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(item_id, None)
+                if not postings:
+                    del self._postings[term]
+        self._total_len -= self._doc_len.pop(item_id)
+        self._categories.pop(item_id, None)
+
+    def search(self, query, k=50, categories=None, item_ids=None):
+        """Return up to k (item_id, bm25_score) pairs, best first."""
+        terms = set(tokenize(query))
+        if not terms or k <= 0:
+            return []
+        allowed = set(int(i) for i in item_ids) if item_ids is not None else None
+        categories = set(categories) if categories else None
+
+        scores = defaultdict(float)
+        with self._lock:
+            n_docs = len(self._doc_len)
+            if n_docs == 0:
+                return []
+            avg_len = self._total_len / n_docs
+            for term in terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+                for item_id, tf in postings.items():
+                    if allowed is not None and item_id not in allowed:
+                        continue
+                    if categories is not None and self._categories.get(item_id) not in categories:
+                        continue
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * self._doc_len[item_id] / avg_len)
+                    scores[item_id] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+
+        ranked = sorted(scores.items(), key=lambda pair: pair[1], reverse=True)
+        return ranked[:k]
+
+
+lexical_index = LexicalIndex()
@@ -0,0 +1,156 @@
+"""
+Structured, non-blocking logging for the `app` package.
+
+Modules log through `logging.getLogger(__name__)`. `configure_logging`
+routes the `app` logger (which is also Flask's `app.logger`) through a
+bounded in-memory queue. A single listener thread formats and writes the
+records, so request threads never block on stdout. If the queue is full,
+records are dropped and counted instead of stalling a request. The
+listener is flushed at exit.
+
+- LOG_LEVEL   DEBUG, INFO (default), WARNING, ...
+- LOG_FORMAT  `json` (default): one object per line with ts, level,
+              logger, msg, request_id and any `extra={...}` fields.
+              `text` is for reading locally.
+- LOG_QUEUE_SIZE  records buffered before dropping (default 10000)
+
+Every request gets an id from an incoming `X-Request-ID` header (or a new
+one). It is attached to each record logged while handling the request and
+echoed back in the response.
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import re
+import sys
+import uuid
+from datetime import datetime, timezone
+
+from flask import g, has_request_context, request
+
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'json').lower()
+LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', 10000))
+REQUEST_ID_HEADER = 'X-Request-ID'
+
+_VALID_REQUEST_ID = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+# Attributes every LogRecord has; anything else came in through `extra`
+_RECORD_FIELDS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'request_id'}
+
+
+def current_request_id():
+    return g.get('request_id') if has_request_context() else None
+
+
+class RequestIdFilter(logging.Filter):
+    """Stamp records with the request id. Handler filters run in the
+    thread that logged, where the request context is still available."""
+
+    def filter(self, record):
+        record.request_id = current_request_id()
+        return True
+
+
+class JSONFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        if getattr(record, 'request_id', None):
+            entry['request_id'] = record.request_id
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_FIELDS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)-7s %(name)s: %(message)s')
+
+    def format(self, record):
+        line = super().format(record)
+        extra = {k: v for k, v in record.__dict__.items()
+                 if k not in _RECORD_FIELDS and not k.startswith('_')}
+        if getattr(record, 'request_id', None):
+            extra['request_id'] = record.request_id
+        return line + (' ' + json.dumps(extra, default=str) if extra else '')
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that never blocks. When the queue is full the record
+    is dropped and counted."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Render the message and traceback here, where args are still valid,
+        # but keep `extra` fields as they are for the JSON formatter
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_listener = None
+_queue_handler = None
+
+
+def configure_logging(app):
+    """Install the queue handler on the `app` logger (once per process)
+    and request-id hooks on `app`."""
+    global _listener, _queue_handler
+
+    logger = logging.getLogger('app')
+    if _listener is None:
+        stream = logging.StreamHandler(sys.stdout)
+        stream.setFormatter(TextFormatter() if LOG_FORMAT == 'text' else JSONFormatter())
+
+        _queue_handler = DroppingQueueHandler(queue.Queue(maxsize=LOG_QUEUE_SIZE))
+        _queue_handler.addFilter(RequestIdFilter())
+        _listener = logging.handlers.QueueListener(_queue_handler.queue, stream)
+        _listener.start()
+        atexit.register(_listener.stop)
+
+        logger.addHandler(_queue_handler)
+        logger.setLevel(LOG_LEVEL)
+        logger.propagate = False
+
+    app.before_request(_assign_request_id)
+    app.after_request(_echo_request_id)
+
+
+def dropped_records():
+    return _queue_handler.dropped if _queue_handler is not None else 0
+
+
+def _assign_request_id():
+    supplied = request.headers.get(REQUEST_ID_HEADER, '')
+    g.request_id = supplied if _VALID_REQUEST_ID.match(supplied) else uuid.uuid4().hex
+
+
+def _echo_request_id(response):
+    request_id = current_request_id()
+    if request_id:
+        response.headers[REQUEST_ID_HEADER] = request_id
+    return response
@@ -0,0 +1,230 @@
+"""
+In-process request, SQL, provider and cache metrics for `/metrics`.
+
+- Every request is timed between `before_request` and `after_request` and
+  recorded per route pattern (`/api/items/<int:item_id>`, never the raw
+  path) and method, with a status-code counter next to it. Streamed bodies
+  are timed until the response starts.
+- SQL statements are timed through engine events. The per-request
+  statement count comes from `sql_counter` (app/sql_budget.py).
+- `provider_call(operation)` wraps calls to the Dedalus API (embeddings,
+  transcription) and records their latency and failures.
+- Cache, pool and tile-archive counters are read from the existing
+  `stats()` methods when `/metrics` is scraped. Modules that aren't
+  imported yet are skipped rather than loaded.
+
+Values live in process memory. Each gunicorn worker reports its own, so
+scrape them per worker or aggregate in Prometheus. Set METRICS_TOKEN to
+require `Authorization: Bearer <token>` on `/metrics`.
+"""
+
+import bisect
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PROVIDER_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+STATEMENT_BUCKETS = (1, 2, 5, 10, 25, 50, 100)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values):
+    if not names:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + '}'
+
+
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name, self.help, self.label_names = name, help_text, labels
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{_labels(self.label_names, labels)} {value}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.label_names = name, help_text, labels
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._values = {}  # labels -> [bucket counts..., +Inf count, sum]
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(labels)
+            if series is None:
+                series = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        names = self.label_names + ('le',)
+        with self._lock:
+            for labels, series in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + ('+Inf',), series[:-1]):
+                    cumulative += count
+                    lines.append(f'{self.name}_bucket{_labels(names, labels + (bound,))} {cumulative}')
+                lines.append(f'{self.name}_sum{_labels(self.label_names, labels)} {series[-1]:.6f}')
+                lines.append(f'{self.name}_count{_labels(self.label_names, labels)} {cumulative}')
+        return lines
+
+
+def _series(name, help_text, kind, label_name, values):
+    """A counter or gauge read from somebody else's stats()."""
+    lines = [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}']
+    for label, value in sorted(values.items()):
+        lines.append(f'{name}{_labels((label_name,), (label,))} {value}')
+    return lines
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._metrics_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, '_metrics_started', None)
+    if started is not None and has_request_context():
+        g._sql_seconds = g.get('_sql_seconds', 0.0) + (time.perf_counter() - started)
+
+
+class Metrics:
+    def __init__(self):
+        self._listening = False
+        self.request_duration = Histogram(
+            'ember_http_request_duration_seconds', 'Time to produce a response.',
+            ('method', 'route'))
+        self.requests = Counter(
+            'ember_http_requests_total', 'Responses by route and status.',
+            ('method', 'route', 'status'))
+        self.request_statements = Histogram(
+            'ember_sql_statements_per_request', 'SQL statements executed per request.',
+            ('route',), buckets=STATEMENT_BUCKETS)
+        self.sql_seconds = Counter(
+            'ember_sql_seconds_total', 'Time spent executing SQL inside requests.', ('route',))
+        self.provider_duration = Histogram(
+            'ember_provider_call_duration_seconds', 'Dedalus API call latency.',
+            ('operation',), buckets=PROVIDER_BUCKETS)
+        self.provider_calls = Counter(
+            'ember_provider_calls_total', 'Dedalus API calls by outcome.', ('operation', 'outcome'))
+
+    def init_app(self, app):
+        if not self._listening:
+            event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+            self._listening = True
+        app.before_request(self._start_timer)
+        app.after_request(self._record_request)
+
+    @staticmethod
+    def _start_timer():
+        g._metrics_started = time.perf_counter()
+
+    def _record_request(self, response):
+        started = g.get('_metrics_started')
+        if started is None:
+            return response
+        from .sql_budget import sql_counter
+
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        self.request_duration.observe(time.perf_counter() - started, request.method, route)
+        self.requests.inc(request.method, route, response.status_code)
+        self.request_statements.observe(sql_counter.count(), route)
+        sql_seconds = g.get('_sql_seconds')
+        if sql_seconds:
+            self.sql_seconds.inc(route, amount=sql_seconds)
+        return response
+
+    @contextmanager
+    def provider_call(self, operation):
+        """Time a provider call; exceptions are counted and re-raised."""
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.provider_calls.inc(operation, 'error')
+            raise
+        finally:
+            self.provider_duration.observe(time.perf_counter() - started, operation)
+        self.provider_calls.inc(operation, 'ok')
+
+    @staticmethod
+    def _cache_stats():
+        """{cache name: stats dict} for every cache that's been loaded."""
+        from .payload_cache import payload_cache
+
+        caches = {'item_payload': payload_cache.stats()}
+        if 'app.query_cache' in sys.modules:
+            caches['query_embedding'] = sys.modules['app.query_cache'].query_cache.stats()
+        if 'app.clusters' in sys.modules:
+            caches['clusters'] = sys.modules['app.clusters'].cluster_cache.stats()
+        if 'app.pmtiles' in sys.modules:
+            for name, stats in sys.modules['app.pmtiles'].archive_store.stats().items():
+                caches[f'pmtiles:{name}'] = {'hits': stats['directory_hits'],
+                                             'misses': stats['directory_misses'],
+                                             'entries': stats['directories_cached']}
+        return caches
+
+    def render(self):
+        """Everything in Prometheus text exposition format."""
+        from .db_pool import pool_monitor
+
+        lines = []
+        for metric in (self.request_duration, self.requests, self.request_statements,
+                       self.sql_seconds, self.provider_duration, self.provider_calls):
+            lines.extend(metric.render())
+
+        caches = self._cache_stats()
+        for field, name, kind, help_text in (
+            ('hits', 'ember_cache_hits_total', 'counter', 'Cache lookups served from memory.'),
+            ('misses', 'ember_cache_misses_total', 'counter', 'Cache lookups that had to compute or load.'),
+            ('entries', 'ember_cache_entries', 'gauge', 'Entries currently cached.'),
+        ):
+            values = {cache: stats[field] for cache, stats in caches.items() if field in stats}
+            lines.extend(_series(name, help_text, kind, 'cache', values))
+        ratios = {}
+        for cache, stats in caches.items():
+            lookups = stats.get('hits', 0) + stats.get('db_hits', 0) + stats.get('misses', 0)
+            if lookups:
+                ratios[cache] = round((stats.get('hits', 0) + stats.get('db_hits', 0)) / lookups, 4)
+        lines.extend(_series('ember_cache_hit_ratio', 'Hits / lookups since start.', 'gauge', 'cache', ratios))
+
+        pool = pool_monitor.stats()
+        numeric = {key: value for key, value in pool.items()
+                   if isinstance(value, (int, float)) and not isinstance(value, bool)}
+        lines.extend(_series('ember_db_pool', 'Connection pool counters (see /api/db/pool-stats).',
+                             'gauge', 'stat', numeric))
+
+        from .logs import dropped_records
+        lines += ['# HELP ember_log_records_dropped_total Log records dropped because the log queue was full.',
+                  '# TYPE ember_log_records_dropped_total counter',
+                  f'ember_log_records_dropped_total {dropped_records()}']
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
@@ -1,6 +1,10 @@
+import json
 from datetime import datetime
+from .embeddings import pack_vector, unpack_vector
 from .extensions import db
 from flask_login import UserMixin
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload
 from werkzeug.security import generate_password_hash, check_password_hash
 
 
@@ -68,7 +72,7 @@ class User(UserMixin, db.Model):
 
 class Item(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
     
     # Core Details
     item_name = db.Column(db.String(100), nullable=False)
@@ -84,14 +88,69 @@ class Item(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     # Geography
-    location_id = db.Column(db.Integer, db.ForeignKey('location.id'), nullable=False)
+    location_id = db.Column(db.Integer, db.ForeignKey('location.id'), nullable=False, index=True)
     pickup_instructions = db.Column(db.Text) # e.g. "On the porch"
     
     # picture
     picture = db.Column(db.String(100)) # Path to image file
+    picture_renditions = db.Column(db.Text)  # JSON {size: filename}, see app/images.py
+
+    # Inventory versions (see app/inventory.py) for ETags and delta sync
+    version = db.Column(db.Integer, default=0, nullable=False, index=True)  # last write
+    created_version = db.Column(db.Integer, default=0, nullable=False)
+
+    # Dedalus semantic search embedding (packed bytes, see app/embeddings.py)
+    embedding = db.Column('embedding_vec', db.LargeBinary, nullable=True)
+    embedding_dim = db.Column(db.Integer)
+    embedding_dtype = db.Column(db.String(8))  # float32 / float16 / int8
+    embedding_model = db.Column(db.String(100))
+    embedding_text_hash = db.Column(db.String(64))  # sha256 of the embedded text
+
+    # Legacy JSON-text vector; converted in bulk by `embed_items --migrate`
+    embedding_json = db.Column('embedding', db.Text, nullable=True)
+
+    # The map feed and search only ever look at available items, so the
+    # location index is partial: unavailable rows don't bloat it.
+    __table_args__ = (
+        db.Index('ix_item_available_location', 'location_id', 'category_id',
+                 postgresql_where=db.text('is_available'),
+                 sqlite_where=db.text('is_available = 1')),
+    )
+
+    @classmethod
+    def query_with_relations(cls):
+        """Item query that eager-loads everything `to_dict()` touches, so
+        serializing N items costs one statement instead of 3N + 1."""
+        return cls.query.options(
+            joinedload(cls.location),
+            joinedload(cls.category),
+            joinedload(cls.owner),
+        )
 
-    # Dedalus semantic search embedding (stored as JSON list of floats)
-    embedding = db.Column(db.Text, nullable=True)  # JSON-encoded vector
+    def set_embedding(self, vector, model, text_hash=None, dtype=None):
+        """Pack and store an embedding vector for this item, along with the
+        hash of the text it was computed from."""
+        self.embedding, self.embedding_dim, self.embedding_dtype = pack_vector(vector, dtype)
+        self.embedding_model = model
+        self.embedding_text_hash = text_hash
+        self.embedding_json = None
+
+    def get_embedding(self):
+        """Return the stored embedding as a float32 array, or None."""
+        if self.embedding:
+            return unpack_vector(self.embedding, self.embedding_dtype)
+        if self.embedding_json:
+            import numpy as np
+            try:
+                return np.asarray(json.loads(self.embedding_json), dtype=np.float32)
+            except (ValueError, TypeError):
+                return None
+        return None
+
+    @property
+    def renditions(self):
+        """Resized picture files by size name ('thumb', 'medium', 'large')."""
+        return json.loads(self.picture_renditions) if self.picture_renditions else {}
 
     def to_dict(self):
         return {
@@ -111,10 +170,67 @@ class Item(db.Model):
             'owner_name': self.owner.username,
             'owner_phone': self.owner.phone_number,
             'picture': self.picture,
+            'renditions': self.renditions,
             'pickup_instructions': self.pickup_instructions
         }
 
 
+class InventoryState(db.Model):
+    """Single-row global inventory version, bumped on every item write."""
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, default=0, nullable=False)
+
+
+class ItemTombstone(db.Model):
+    """Records a deleted item so delta-syncing clients can drop it."""
+    item_id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, index=True)
+    deleted_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+
+class EmbeddingJob(db.Model):
+    """Pending (re-)embedding for an item, drained by the embedding worker.
+    One row per item; re-enqueueing just bumps `enqueued_at`. Deliberately
+    not a foreign key so item deletes never have to touch the queue — the
+    worker drops jobs whose item is gone."""
+    item_id = db.Column(db.Integer, primary_key=True)
+    enqueued_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    last_error = db.Column(db.Text)
+
+
+class QueryEmbedding(db.Model):
+    """Persistent tier of the search-query embedding cache (app/query_cache.py)."""
+    key = db.Column(db.String(64), primary_key=True)  # sha256(model + normalized query)
+    query_text = db.Column(db.String(500), nullable=False)
+    model = db.Column(db.String(100), nullable=False)
+    embedding = db.Column(db.LargeBinary, nullable=False)
+    embedding_dtype = db.Column(db.String(8), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+
+class StoredFile(db.Model):
+    """A content-addressed file in UPLOAD_FOLDER and how many item pictures
+    reference it (app/uploads.py). The file is removed when this reaches 0."""
+    name = db.Column(db.String(64), primary_key=True)  # <sha256 prefix>.<ext>
+    size = db.Column(db.Integer, nullable=False)
+    refcount = db.Column(db.Integer, default=0, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+
+class ImportProgress(db.Model):
+    """How far a bulk import (app/util/import_items.py) has got through one
+    input file, keyed by the file's content hash. Updated in the same
+    transaction as each chunk of rows, so a rerun resumes exactly there."""
+    source = db.Column(db.String(64), primary_key=True)  # sha256 of the input file
+    filename = db.Column(db.String(255), nullable=False)
+    rows_done = db.Column(db.Integer, default=0, nullable=False)  # includes skipped rows
+    items_created = db.Column(db.Integer, default=0, nullable=False)
+    started_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    finished_at = db.Column(db.DateTime)
+
+
 class Category(db.Model): # Optional: If you want a strict list
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(50), unique=True)
@@ -131,6 +247,28 @@ class Location(db.Model):
 
     items = db.relationship('Item', backref='location', lazy=True, cascade='all, delete-orphan')
 
+    # One row per coordinate pair: create/update_item and
+    # delete_saved_location look locations up by exact (latitude, longitude).
+    # The constraint's index also serves viewport / radius range scans.
+    __table_args__ = (
+        db.UniqueConstraint('latitude', 'longitude', name='uq_location_lat_lng'),
+    )
+
+    @classmethod
+    def get_or_create(cls, latitude, longitude, address, name=None):
+        """Return the Location at (latitude, longitude), creating it if needed.
+        Safe against a concurrent insert of the same point."""
+        location = cls.query.filter_by(latitude=latitude, longitude=longitude).first()
+        if location:
+            return location
+        try:
+            with db.session.begin_nested():
+                location = cls(name=name, address=address, latitude=latitude, longitude=longitude)
+                db.session.add(location)
+            return location
+        except IntegrityError:
+            return cls.query.filter_by(latitude=latitude, longitude=longitude).one()
+
 
 class SavedLocation(db.Model):
     """User's saved locations for quick selection when creating listings"""
@@ -144,6 +282,11 @@ class SavedLocation(db.Model):
     longitude = db.Column(db.Float, nullable=False)
     
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    # add_saved_location() checks for an existing (user, point) pair
+    __table_args__ = (
+        db.Index('ix_saved_location_user_point', 'user_id', 'latitude', 'longitude'),
+    )
     
     def to_dict(self):
         return {
@@ -0,0 +1,103 @@
+"""
+Cache of pre-encoded item JSON payloads.
+
+`Item.to_dict()` walks the location, category and owner relationships and
+the result is re-encoded on every list request. Instead, each item's
+encoded JSON object is cached keyed by (item id, Item.version). Every
+write that changes a payload — the item itself, or its owner's name /
+phone — bumps the version (see app/inventory.py), so stale entries are
+never served, even across processes. List responses are assembled by
+joining the cached fragments; only misses touch the ORM.
+"""
+
+import json
+import os
+import threading
+from collections import OrderedDict
+
+CACHE_SIZE = int(os.environ.get('ITEM_PAYLOAD_CACHE_SIZE', 20000))
+LOAD_CHUNK_SIZE = 500  # ids per IN (...) when loading misses
+
+
+def encode(payload):
+    """Compact JSON bytes, matching Flask's non-debug jsonify output."""
+    return json.dumps(payload, separators=(',', ':'), sort_keys=True).encode('utf-8')
+
+
+def with_fields(fragment, **fields):
+    """Append extra keys (e.g. a search score) to an encoded JSON object."""
+    extra = encode(fields)
+    return fragment[:-1] + b',' + extra[1:]
+
+
+class ItemPayloadCache:
+    """LRU of item_id -> (version, encoded to_dict() bytes)."""
+
+    def __init__(self, max_entries=CACHE_SIZE):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+    def fragments(self, rows):
+        """Encoded payloads for [(item_id, version), ...], in the same order."""
+        out = [None] * len(rows)
+        missing = {}
+        with self._lock:
+            for i, (item_id, version) in enumerate(rows):
+                entry = self._entries.get(item_id)
+                if entry is not None and entry[0] == version:
+                    self._entries.move_to_end(item_id)
+                    out[i] = entry[1]
+                else:
+                    missing.setdefault(item_id, []).append(i)
+            self.hits += len(rows) - sum(len(v) for v in missing.values())
+            self.misses += sum(len(v) for v in missing.values())
+
+        if missing:
+            loaded = self._load(list(missing))
+            for item_id, positions in missing.items():
+                entry = loaded.get(item_id)
+                for i in positions:
+                    out[i] = entry[1] if entry else None
+
+        return [fragment for fragment in out if fragment is not None]
+
+    def render_list(self, rows):
+        """A complete JSON array body for [(item_id, version), ...]."""
+        return b'[' + b','.join(self.fragments(rows)) + b']'
+
+    def _load(self, item_ids):
+        from .models import Item
+
+        loaded = {}
+        for start in range(0, len(item_ids), LOAD_CHUNK_SIZE):
+            chunk = item_ids[start:start + LOAD_CHUNK_SIZE]
+            items = Item.query_with_relations().filter(Item.id.in_(chunk)).all()
+            for item in items:
+                loaded[item.id] = (item.version, encode(item.to_dict()))
+
+        with self._lock:
+            for item_id, entry in loaded.items():
+                self._entries[item_id] = entry
+                self._entries.move_to_end(item_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return loaded
+
+    def invalidate(self, item_id):
+        with self._lock:
+            self._entries.pop(item_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'max_entries': self.max_entries,
+                    'hits': self.hits, 'misses': self.misses}
+
+
+payload_cache = ItemPayloadCache()
@@ -0,0 +1,258 @@
+"""
+Read-only access to local PMTiles (v3) archives.
+
+The map loads `/static/maps/<name>.pmtiles` with HTTP Range requests, so
+serving it locally only needs byte ranges. The archive is mapped into
+memory once per process (`mmap`, shared through the page cache by every
+worker) and ranges are sliced straight out of it. Whole-file downloads go
+through `send_file`, which uses `wsgi.file_wrapper` (sendfile under
+gunicorn).
+
+For clients that want plain `/tiles/{z}/{x}/{y}` URLs, `Archive.tile`
+walks the archive's directories itself. Directories are decoded once and
+kept in a small LRU (`PMTILES_DIR_CACHE` entries, default 256). A lookup
+then costs a binary search plus the tile's own bytes.
+
+Archives are reopened when the file on disk changes. Only uncompressed and
+gzip-compressed directories are supported, which covers what
+`pmtiles convert` and planetiler write by default.
+"""
+
+import bisect
+import gzip
+import mmap
+import os
+import struct
+import threading
+from collections import OrderedDict
+
+DIR_CACHE_SIZE = int(os.environ.get('PMTILES_DIR_CACHE', 256))
+MAX_DIRECTORY_DEPTH = 4  # root + up to 3 levels of leaves, per the spec
+
+HEADER_LENGTH = 127
+_HEADER = struct.Struct('<7sB11QBBBBBBiiiiBii')
+
+COMPRESSION_NONE, COMPRESSION_GZIP = 1, 2
+TILE_TYPES = {
+    1: 'application/vnd.mapbox-vector-tile',
+    2: 'image/png',
+    3: 'image/jpeg',
+    4: 'image/webp',
+    5: 'image/avif',
+}
+
+
+class InvalidArchive(ValueError):
+    pass
+
+
+def zxy_to_tile_id(z, x, y):
+    """Position of (z, x, y) on the archive's Hilbert ordering."""
+    if z > 31:
+        raise ValueError('zoom must be <= 31')
+    n = 1 << z
+    if not (0 <= x < n and 0 <= y < n):
+        raise ValueError('tile is outside the zoom level')
+    tile_id = ((1 << (2 * z)) - 1) // 3  # tiles at all lower zooms
+    s = n >> 1
+    while s:
+        rx = 1 if x & s else 0
+        ry = 1 if y & s else 0
+        tile_id += s * s * ((3 * rx) ^ ry)
+        if ry == 0:
+            if rx == 1:
+                x, y = s - 1 - x, s - 1 - y
+            x, y = y, x
+        s >>= 1
+    return tile_id
+
+
+def _varints(buf, pos):
+    """Generator of unsigned LEB128 varints from `buf` starting at `pos`."""
+    while True:
+        value = shift = 0
+        while True:
+            byte = buf[pos]
+            pos += 1
+            value |= (byte & 0x7F) << shift
+            if byte < 0x80:
+                break
+            shift += 7
+        yield value
+
+
+def decode_directory(data):
+    """Decode a (decompressed) directory into parallel lists
+    (tile_ids, run_lengths, lengths, offsets)."""
+    values = _varints(data, 0)
+    count = next(values)
+
+    tile_ids, last = [], 0
+    for _ in range(count):
+        last += next(values)
+        tile_ids.append(last)
+    run_lengths = [next(values) for _ in range(count)]
+    lengths = [next(values) for _ in range(count)]
+    offsets = []
+    for i in range(count):
+        value = next(values)
+        if value == 0 and i > 0:
+            offsets.append(offsets[i - 1] + lengths[i - 1])  # contiguous with the previous entry
+        else:
+            offsets.append(value - 1)
+    return tile_ids, run_lengths, lengths, offsets
+
+
+class Header:
+    FIELDS = (
+        'magic', 'version',
+        'root_offset', 'root_length', 'metadata_offset', 'metadata_length',
+        'leaf_offset', 'leaf_length', 'tile_data_offset', 'tile_data_length',
+        'addressed_tiles', 'tile_entries', 'tile_contents',
+        'clustered', 'internal_compression', 'tile_compression', 'tile_type',
+        'min_zoom', 'max_zoom',
+        'min_lon_e7', 'min_lat_e7', 'max_lon_e7', 'max_lat_e7',
+        'center_zoom', 'center_lon_e7', 'center_lat_e7',
+    )
+
+    def __init__(self, data):
+        if len(data) < HEADER_LENGTH:
+            raise InvalidArchive('file is too short to be a PMTiles archive')
+        for name, value in zip(self.FIELDS, _HEADER.unpack_from(data)):
+            setattr(self, name, value)
+        if self.magic != b'PMTiles' or self.version != 3:
+            raise InvalidArchive('not a PMTiles v3 archive')
+
+    @property
+    def mimetype(self):
+        return TILE_TYPES.get(self.tile_type, 'application/octet-stream')
+
+
+class Archive:
+    """One mapped archive plus an LRU of its decoded directories."""
+
+    def __init__(self, path, dir_cache_size=DIR_CACHE_SIZE):
+        self.path = path
+        stat = os.stat(path)
+        self.size = stat.st_size
+        self.mtime_ns = stat.st_mtime_ns
+        self.etag = f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if self.size else b''
+        try:
+            self.header = Header(self._map[:HEADER_LENGTH])
+        except InvalidArchive:
+            self.close()
+            raise
+
+        self._lock = threading.Lock()
+        self._directories = OrderedDict()  # (offset, length) -> decoded directory
+        self._dir_cache_size = dir_cache_size
+        self.hits = 0
+        self.misses = 0
+
+    def close(self):
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+
+    def is_current(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return False
+        return stat.st_mtime_ns == self.mtime_ns and stat.st_size == self.size
+
+    def read(self, start, stop, chunk_size=256 * 1024):
+        """Yield bytes [start, stop) of the file in chunks."""
+        for offset in range(start, stop, chunk_size):
+            yield self._map[offset:min(offset + chunk_size, stop)]
+
+    def _directory(self, offset, length):
+        key = (offset, length)
+        with self._lock:
+            directory = self._directories.get(key)
+            if directory is not None:
+                self._directories.move_to_end(key)
+                self.hits += 1
+                return directory
+            self.misses += 1
+
+        data = self._map[offset:offset + length]
+        compression = self.header.internal_compression
+        if compression == COMPRESSION_GZIP:
+            data = gzip.decompress(data)
+        elif compression != COMPRESSION_NONE:
+            raise InvalidArchive(f'unsupported directory compression {compression}')
+        directory = decode_directory(data)
+
+        with self._lock:
+            self._directories[key] = directory
+            while len(self._directories) > self._dir_cache_size:
+                self._directories.popitem(last=False)
+        return directory
+
+    def tile(self, z, x, y):
+        """Raw (possibly compressed, see `header.tile_compression`) bytes of
+        tile z/x/y, or None if the archive doesn't have it."""
+        header = self.header
+        if not header.min_zoom <= z <= header.max_zoom:
+            return None
+        tile_id = zxy_to_tile_id(z, x, y)
+
+        offset, length = header.root_offset, header.root_length
+        for _ in range(MAX_DIRECTORY_DEPTH):
+            tile_ids, run_lengths, lengths, offsets = self._directory(offset, length)
+            i = bisect.bisect_right(tile_ids, tile_id) - 1
+            if i < 0:
+                return None
+            if run_lengths[i] == 0:
+                # Leaf directory covering tile_ids[i] onwards
+                offset, length = header.leaf_offset + offsets[i], lengths[i]
+                continue
+            if tile_id - tile_ids[i] >= run_lengths[i]:
+                return None
+            start = header.tile_data_offset + offsets[i]
+            return self._map[start:start + lengths[i]]
+        return None
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': self.size,
+                'directories_cached': len(self._directories),
+                'directory_hits': self.hits,
+                'directory_misses': self.misses,
+            }
+
+
+class ArchiveStore:
+    """Open archives by file name, reopening any that changed on disk."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._archives = {}
+
+    def get(self, path):
+        """The Archive at `path`, or None if it's missing or not a PMTiles
+        archive (e.g. a git-lfs pointer that was never pulled)."""
+        with self._lock:
+            archive = self._archives.get(path)
+            if archive is not None and archive.is_current():
+                return archive
+            if archive is not None:
+                # Responses may still be streaming from the old map; let GC close it
+                del self._archives[path]
+            try:
+                archive = Archive(path)
+            except (OSError, InvalidArchive):
+                return None
+            self._archives[path] = archive
+            return archive
+
+    def stats(self):
+        with self._lock:
+            return {os.path.basename(path): archive.stats() for path, archive in self._archives.items()}
+
+
+archive_store = ArchiveStore()
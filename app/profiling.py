@@ -0,0 +1,221 @@
+"""
+Opt-in request profiling.
+
+Three ways to capture a profile, all off by default:
+
+- PROFILE_TOKEN      requests sent with `X-Ember-Profile: <token>` run
+                     under cProfile.
+- PROFILE_ALL=1      every request matching PROFILE_ROUTES runs under
+                     cProfile (staging only; this roughly doubles CPU time).
+- PROFILE_SLOW_MS    requests matching PROFILE_ROUTES are sampled by a
+                     background thread every PROFILE_SAMPLE_MS (default 5)
+                     milliseconds. The stacks are kept only if the request
+                     took longer than the threshold. This costs little
+                     enough to leave on in production.
+
+PROFILE_ROUTES is a comma-separated list of path prefixes (default
+`/api/`). Profiles go to PROFILE_DIR (default `<tmp>/ember-profiles`) as
+`<timestamp>-<method>-<route>-<ms>ms.json`, holding the route, arguments, timing
+and sampled stacks, plus a `.prof` pstats file for cProfile runs. Only
+the newest PROFILE_KEEP (default 50) are kept. The file name is returned
+in an `X-Ember-Profile-Id` header. `flask profiles` summarizes them
+(app/util/profiles.py).
+
+When none of the variables are set, `init_app` registers no hooks at all.
+"""
+
+import hmac
+import json
+import logging
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from flask import g, request
+
+PROFILE_TOKEN = os.environ.get('PROFILE_TOKEN')
+PROFILE_ALL = os.environ.get('PROFILE_ALL') == '1'
+PROFILE_SLOW_MS = float(os.environ.get('PROFILE_SLOW_MS', 0))
+PROFILE_SAMPLE_MS = float(os.environ.get('PROFILE_SAMPLE_MS', 5))
+PROFILE_ROUTES = tuple(p for p in os.environ.get('PROFILE_ROUTES', '/api/').split(',') if p)
+PROFILE_DIR = os.environ.get('PROFILE_DIR') or os.path.join(tempfile.gettempdir(), 'ember-profiles')
+PROFILE_KEEP = int(os.environ.get('PROFILE_KEEP', 50))
+PROFILE_HEADER = 'X-Ember-Profile'
+MAX_STACK_DEPTH = 80
+
+log = logging.getLogger(__name__)
+
+
+def _frame_label(code):
+    path = code.co_filename
+    for marker in ('site-packages' + os.sep, os.sep + 'app' + os.sep):
+        if marker in path:
+            path = path.split(marker, 1)[1]
+            break
+    return f"{code.co_name} ({path}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """One daemon thread sampling the stacks of the request threads that
+    are currently being tracked. It sleeps while none are."""
+
+    def __init__(self, interval):
+        self._interval = interval
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._tracked = {}  # thread ident -> {collapsed stack: samples}
+        self._thread = None
+
+    def start(self, ident):
+        with self._lock:
+            self._tracked[ident] = samples = {}
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+                self._thread.start()
+        self._wake.set()
+        return samples
+
+    def stop(self, ident):
+        with self._lock:
+            return self._tracked.pop(ident, None)
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            time.sleep(self._interval)
+            frames = sys._current_frames()
+            with self._lock:
+                if not self._tracked:
+                    self._wake.clear()  # start() sets it again after adding
+                    continue
+                for ident, samples in self._tracked.items():
+                    frame = frames.get(ident)
+                    stack = []
+                    while frame is not None and len(stack) < MAX_STACK_DEPTH:
+                        stack.append(_frame_label(frame.f_code))
+                        frame = frame.f_back
+                    if stack:
+                        key = ';'.join(reversed(stack))  # outermost first, as flamegraph.pl wants
+                        samples[key] = samples.get(key, 0) + 1
+
+
+def _slug(rule):
+    return re.sub(r'[^A-Za-z0-9]+', '-', rule).strip('-')[:60] or 'root'
+
+
+class RequestProfiler:
+    def __init__(self):
+        self._sampler = None
+        self.directory = PROFILE_DIR
+
+    @property
+    def enabled(self):
+        return bool(PROFILE_TOKEN or PROFILE_ALL or PROFILE_SLOW_MS)
+
+    def init_app(self, app):
+        if not self.enabled:
+            return
+        if PROFILE_SLOW_MS:
+            self._sampler = StackSampler(PROFILE_SAMPLE_MS / 1000)
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        app.teardown_request(self._teardown)
+        log.info("request profiling enabled: token=%s all=%s slow_ms=%s dir=%s",
+                 'yes' if PROFILE_TOKEN else 'no', PROFILE_ALL, PROFILE_SLOW_MS or 'off', self.directory)
+
+    def _requested(self):
+        supplied = request.headers.get(PROFILE_HEADER)
+        return bool(PROFILE_TOKEN and supplied and hmac.compare_digest(supplied, PROFILE_TOKEN))
+
+    def _start(self):
+        explicit = self._requested()
+        matched = request.path.startswith(PROFILE_ROUTES)
+        if not explicit and not matched:
+            return
+
+        if explicit or PROFILE_ALL:
+            import cProfile
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:
+                return  # another profiler is already active in this thread
+            g._profile = ('cprofile', profile)
+        elif self._sampler is not None:
+            g._profile = ('sampled', self._sampler.start(threading.get_ident()))
+        else:
+            return
+        g._profile_started = time.perf_counter()
+
+    def _finish(self, response):
+        profile = g.pop('_profile', None)
+        if profile is None:
+            return response
+        elapsed_ms = (time.perf_counter() - g._profile_started) * 1000
+        kind, data = profile
+        if kind == 'cprofile':
+            data.disable()
+        else:
+            data = self._sampler.stop(threading.get_ident())
+            if elapsed_ms < PROFILE_SLOW_MS or not data:
+                return response
+
+        try:
+            name = self._write(kind, data, elapsed_ms, response.status_code)
+            response.headers['X-Ember-Profile-Id'] = name
+        except OSError as e:
+            log.warning("could not save profile: %s", e)
+        return response
+
+    def _teardown(self, exc):
+        # after_request doesn't run when the request died with an exception
+        profile = g.pop('_profile', None)
+        if profile is None:
+            return
+        if profile[0] == 'cprofile':
+            profile[1].disable()
+        else:
+            self._sampler.stop(threading.get_ident())
+
+    def _write(self, kind, data, elapsed_ms, status):
+        os.makedirs(self.directory, exist_ok=True)
+        rule = request.url_rule.rule if request.url_rule is not None else request.path
+        stem = f"{datetime.utcnow():%Y%m%dT%H%M%S%f}-{request.method}-{_slug(rule)}-{elapsed_ms:.0f}ms"
+
+        meta = {
+            'kind': kind,
+            'method': request.method,
+            'route': rule,
+            'path': request.path,
+            'args': request.args.to_dict(flat=False),
+            'view_args': {k: str(v) for k, v in (request.view_args or {}).items()},
+            'status': status,
+            'duration_ms': round(elapsed_ms, 2),
+            'captured_at': datetime.utcnow().isoformat() + 'Z',
+        }
+        if kind == 'cprofile':
+            data.dump_stats(os.path.join(self.directory, stem + '.prof'))
+        else:
+            meta['sample_interval_ms'] = PROFILE_SAMPLE_MS
+            meta['samples'] = data
+        with open(os.path.join(self.directory, stem + '.json'), 'w') as f:
+            json.dump(meta, f)
+
+        self._rotate()
+        return stem
+
+    def _rotate(self):
+        stems = sorted({os.path.splitext(n)[0] for n in os.listdir(self.directory)
+                        if n.endswith(('.json', '.prof'))})
+        for stem in stems[:-PROFILE_KEEP] if PROFILE_KEEP > 0 else []:
+            for ext in ('.json', '.prof'):
+                path = os.path.join(self.directory, stem + ext)
+                if os.path.exists(path):
+                    os.remove(path)
+
+
+profiler = RequestProfiler()
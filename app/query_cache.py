@@ -0,0 +1,151 @@
+"""
+Cache of search-query embeddings.
+
+People search for the same handful of things ("water", "generator",
+"insulin") over and over, and each miss costs an embeddings API call.
+Vectors are cached by normalized query text + EMBEDDING_MODEL in two tiers:
+
+- an in-process LRU with a TTL (QUERY_CACHE_SIZE entries, QUERY_CACHE_TTL
+  seconds), and
+- optionally the `query_embedding` table (QUERY_CACHE_PERSIST=1, the
+  default), so hits survive restarts and are shared across workers.
+
+Because lookups happen before the provider is contacted, cached queries
+keep working while the embedding API is unreachable.
+"""
+
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from .embeddings import EMBEDDING_MODEL, pack_vector, unpack_vector
+
+log = logging.getLogger(__name__)
+
+CACHE_SIZE = int(os.environ.get('QUERY_CACHE_SIZE', 512))
+CACHE_TTL = float(os.environ.get('QUERY_CACHE_TTL', 24 * 60 * 60))
+PERSIST = os.environ.get('QUERY_CACHE_PERSIST', '1') == '1'
+
+
+def normalize_query(text):
+    """Lowercase and collapse whitespace so trivially different queries share an entry."""
+    return ' '.join(text.lower().split())
+
+
+def cache_key(text, model=EMBEDDING_MODEL):
+    return hashlib.sha256(f"{model}\0{normalize_query(text)}".encode('utf-8')).hexdigest()
+
+
+class QueryEmbeddingCache:
+    """Two-tier (memory LRU + database) cache of query vectors."""
+
+    def __init__(self, max_entries=CACHE_SIZE, ttl=CACHE_TTL, persist=PERSIST):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (expires_at, vector)
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.persist = persist
+        self.hits = 0
+        self.db_hits = 0
+        self.misses = 0
+
+    def get(self, text):
+        """Return the cached float32 vector for `text`, or None."""
+        key = cache_key(text)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, vector = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return vector
+                del self._entries[key]
+
+        vector = self._db_get(key) if self.persist else None
+        with self._lock:
+            if vector is None:
+                self.misses += 1
+                return None
+            self.db_hits += 1
+        self._remember(key, vector)
+        return vector
+
+    def put(self, text, vector):
+        key = cache_key(text)
+        vector = np.asarray(vector, dtype=np.float32)
+        self._remember(key, vector)
+        if self.persist:
+            self._db_put(key, normalize_query(text), vector)
+
+    def _remember(self, key, vector):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, vector)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.db_hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl,
+                'persistent': self.persist,
+                'hits': self.hits,
+                'db_hits': self.db_hits,
+                'misses': self.misses,
+                'hit_ratio': round((self.hits + self.db_hits) / lookups, 4) if lookups else 0.0,
+            }
+
+    # --- persistent tier ---
+    # Failures here (e.g. the table hasn't been created yet) only cost the
+    # cache hit; they never fail the search.
+
+    def _db_get(self, key):
+        from .extensions import db
+        from .models import QueryEmbedding
+
+        try:
+            row = db.session.get(QueryEmbedding, key)
+            if row is None:
+                return None
+            if row.created_at < datetime.utcnow() - timedelta(seconds=self.ttl):
+                db.session.delete(row)
+                db.session.commit()
+                return None
+            return unpack_vector(row.embedding, row.embedding_dtype)
+        except Exception as e:
+            log.warning("query cache lookup failed: %s", e)
+            db.session.rollback()
+            return None
+
+    def _db_put(self, key, normalized, vector):
+        from .extensions import db
+        from .models import QueryEmbedding
+
+        try:
+            blob, _, dtype = pack_vector(vector, 'float32')
+            db.session.merge(QueryEmbedding(
+                key=key, query_text=normalized[:500], model=EMBEDDING_MODEL,
+                embedding=blob, embedding_dtype=dtype, created_at=datetime.utcnow(),
+            ))
+            db.session.commit()
+        except Exception:
+            log.warning("query cache store failed", exc_info=True)
+            db.session.rollback()
+
+
+query_cache = QueryEmbeddingCache()
@@ -1,6 +1,73 @@
-from flask import Blueprint
+import hmac
+import logging
+import os
+import time
+
+from flask import Blueprint, Response, current_app, jsonify, request
+from sqlalchemy import text
+
+from ..db_pool import pool_monitor
+from ..extensions import db
+from ..metrics import METRICS_TOKEN, metrics
 
 bp = Blueprint('health', __name__)
+log = logging.getLogger(__name__)
 
 # Note: Main route and PWA routes remain in app/__init__.py for now
 # to maintain root-level access. Can be moved here if needed.
+
+
+@bp.route('/api/db/pool-stats', methods=['GET'])
+def db_pool_stats():
+    """Connection pool occupancy and connect/checkout counters."""
+    return jsonify(pool_monitor.stats()), 200
+
+
+@bp.route('/health', methods=['GET'])
+def health():
+    """Readiness: 200 when this worker can serve requests, 503 otherwise.
+
+    Only the database is required. Upload storage and the Dedalus key are
+    reported but don't fail the check, since the map and listings work
+    without them. The endpoint is public, so a database failure is only
+    logged; the response doesn't say what went wrong.
+    """
+    checks = {}
+
+    started = time.perf_counter()
+    try:
+        db.session.execute(text('SELECT 1'))
+        checks['database'] = {'ok': True,
+                              'latency_ms': round((time.perf_counter() - started) * 1000, 2)}
+    except Exception:
+        db.session.rollback()
+        log.exception("health check: database unavailable")
+        response = jsonify({'status': 'unavailable', 'database': 'error'})
+        response.status_code = 503
+        response.cache_control.no_store = True
+        return response
+
+    # Read-only hosts (Vercel) still serve everything but new pictures
+    upload_folder = current_app.config.get('UPLOAD_FOLDER') or ''
+    target = upload_folder if os.path.isdir(upload_folder) else os.path.dirname(upload_folder)
+    checks['uploads'] = {'ok': True, 'writable': bool(upload_folder) and os.access(target, os.W_OK)}
+
+    key = os.environ.get('DEDALUS_API_KEY')
+    checks['dedalus'] = {'ok': True, 'configured': bool(key) and key != 'your-api-key-here'}
+
+    pool = pool_monitor.stats()
+    checks['pool'] = {'ok': True, **{k: pool[k] for k in ('mode', 'checkedout', 'overflow') if k in pool}}
+
+    response = jsonify({'status': 'ok', 'checks': checks})
+    response.cache_control.no_store = True
+    return response
+
+
+@bp.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Prometheus text exposition of app/metrics.py."""
+    if METRICS_TOKEN:
+        supplied = request.headers.get('Authorization', '').removeprefix('Bearer ')
+        if not hmac.compare_digest(supplied, METRICS_TOKEN):
+            return jsonify({'error': 'Unauthorized'}), 401
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
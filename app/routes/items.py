@@ -1,16 +1,17 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, make_response
 from flask_login import login_required, current_user
-from werkzeug.utils import secure_filename
+from sqlalchemy import select
 from ..extensions import db
-from ..models import Item, Category, Location
-from .search import embed_item
-from sqlalchemy.orm import joinedload
-import os
+from ..geo import parse_bbox, tile_bbox
+from ..models import Item, Category, ItemTombstone, Location
+from ..payload_cache import payload_cache
+from .. import embedding_queue, inventory, streaming, uploads
+from ..images import image_pipeline, picture_files
+from ..sql_budget import query_budget
+import hashlib
 
 bp = Blueprint('items', __name__)
 
-# Note: GET /api/items route remains in app/__init__.py for now.
-
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
 
 # Category icon mapping
@@ -33,35 +34,161 @@ def get_category_icon(category_name):
 
 @bp.route('/api/my-items', methods=['GET'])
 @login_required
+@query_budget(10)
 def get_my_items():
     """Get all items belonging to the current user"""
-    items = Item.query.filter_by(user_id=current_user.id).all()
-    return jsonify([item.to_dict() for item in items]), 200
+    rows = db.session.query(Item.id, Item.version).filter(Item.user_id == current_user.id).all()
+    return _json_list(rows), 200
 
 
 @bp.route('/api/items/<int:item_id>', methods=['GET'])
+@query_budget(2)
 def get_item(item_id):
     """Get a single item by ID"""
-    item = Item.query.get_or_404(item_id)
+    item = Item.query_with_relations().filter(Item.id == item_id).first_or_404()
     return jsonify(item.to_dict()), 200
 
 
+def _requested_viewport():
+    """Bounding box from ?bbox=minLng,minLat,maxLng,maxLat or ?z=&x=&y=.
+    Returns None when neither is given; raises ValueError if malformed."""
+    bbox = request.args.get('bbox')
+    if bbox:
+        return parse_bbox(bbox)
+
+    z = request.args.get('z', type=int)
+    x = request.args.get('x', type=int)
+    y = request.args.get('y', type=int)
+    if z is None and x is None and y is None:
+        return None
+    if None in (z, x, y):
+        raise ValueError('z, x and y must be integers and given together')
+    return tile_bbox(z, x, y)
+
+
+def _items_etag(version, ndjson=False, encoding=None):
+    """Strong ETag for the items feed: inventory version + query string
+    (different viewports / delta bases are different representations),
+    plus the framing and content encoding of streamed feeds."""
+    args = hashlib.sha1(request.query_string).hexdigest()[:12]
+    etag = f"{version}-{args}"
+    if ndjson:
+        etag += '-nd'
+    if encoding:
+        etag += f'-{encoding}'
+    return etag
+
+
 @bp.route('/api/items', methods=['GET'])
 def get_items():
-    # Load items and 'eagerly' join their related location and category
-    items = Item.query.options(
-        joinedload(Item.location),
-        joinedload(Item.category),
-        joinedload(Item.owner)
-    ).filter_by(is_available=True).all()
-    
-    return jsonify([item.to_dict() for item in items])
+    """Available items, optionally limited to a map viewport
+    (?bbox=minLng,minLat,maxLng,maxLat or ?z=&x=&y= tile coordinates).
+
+    Responses carry an ETag derived from the inventory version and answer
+    If-None-Match with 304. ?since=<version> returns only the changes after
+    that version: { version, created, updated, deleted: [ids] }.
+
+    The full feed streams (see app/streaming.py): a JSON array by default,
+    NDJSON with Accept: application/x-ndjson or ?format=ndjson.
+    """
+    try:
+        viewport = _requested_viewport()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    since = request.args.get('since')
+    if since is not None:
+        if viewport:
+            return jsonify({'error': 'since cannot be combined with bbox or tile coordinates'}), 400
+        try:
+            since = int(since)
+        except ValueError:
+            return jsonify({'error': 'since must be an integer version'}), 400
+
+    ndjson = since is None and streaming.wants_ndjson()
+    encoding = streaming.negotiated_encoding() if since is None else None
+
+    # Answer revalidations before touching any item rows
+    version = inventory.current_version()
+    etag = _items_etag(version, ndjson, encoding)
+    if request.if_none_match.contains(etag):
+        response = make_response('', 304)
+    elif since is not None:
+        response = _items_delta(since, version)
+    else:
+        response = _items_feed(viewport, ndjson, encoding)
+    response.set_etag(etag)
+    response.vary.update(('Accept', 'Accept-Encoding'))
+    response.headers['Cache-Control'] = 'no-cache'  # always revalidate, usually for a 304
+    return response
+
+
+def _items_feed(viewport, ndjson, encoding):
+    # Only ids + versions here; payloads come from the cache, a batch at a time
+    query = select(Item.id, Item.version).where(Item.is_available == True)
+
+    if viewport:
+        # Range scan on the Location(latitude, longitude) index
+        min_lng, min_lat, max_lng, max_lat = viewport
+        query = query.join(Location, Item.location_id == Location.id).where(
+            Location.latitude.between(min_lat, max_lat),
+            Location.longitude.between(min_lng, max_lng),
+        )
+
+    batches = (payload_cache.fragments(rows) for rows in streaming.row_batches(query, db.session))
+    return streaming.stream_list(batches, ndjson=ndjson, encoding=encoding)
+
+
+def _json_list(rows):
+    """JSON array response assembled from cached item payloads."""
+    return Response(payload_cache.render_list(rows), mimetype='application/json')
+
+
+def _items_delta(since, version):
+    changed = Item.query_with_relations().filter(Item.version > since).all()
+
+    created, updated, deleted = [], [], []
+    for item in changed:
+        if not item.is_available:
+            # Dropped out of the feed — the same as a deletion for clients
+            deleted.append(item.id)
+        elif item.created_version > since:
+            created.append(item.to_dict())
+        else:
+            updated.append(item.to_dict())
+
+    deleted.extend(item_id for (item_id,) in db.session.query(ItemTombstone.item_id)
+                   .filter(ItemTombstone.version > since))
+
+    return jsonify({'version': version, 'created': created, 'updated': updated, 'deleted': deleted})
+
+
+@bp.route('/api/items/clusters', methods=['GET'])
+def get_item_clusters():
+    """Clustered item counts for low zoom levels.
+    Requires ?zoom= plus ?bbox=minLng,minLat,maxLng,maxLat (or z/x/y)."""
+    from ..clusters import cluster_cache, MAX_CLUSTER_ZOOM  # NumPy: loaded on first use
+
+    zoom = request.args.get('zoom', type=int)
+    if zoom is None or not 0 <= zoom <= MAX_CLUSTER_ZOOM:
+        return jsonify({'error': f'zoom must be an integer between 0 and {MAX_CLUSTER_ZOOM}'}), 400
+
+    try:
+        viewport = _requested_viewport()
+        if viewport is None:
+            return jsonify({'error': 'bbox is required'}), 400
+        clusters = cluster_cache.clusters(zoom, viewport)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify({'zoom': zoom, 'clusters': clusters}), 200
 
 
 @bp.route('/api/items', methods=['POST'])
 @login_required
 def create_item():
     """Create a new item listing"""
+    picture_filename = uploaded = None
     try:
         # Get form data
         item_name = request.form.get('item_name')
@@ -89,35 +216,13 @@ def create_item():
             db.session.flush()
         
         # Get or create location
-        location = Location.query.filter_by(
-            latitude=latitude,
-            longitude=longitude
-        ).first()
+        location = Location.get_or_create(latitude, longitude, address, name=location_name)
         
-        if not location:
-            location = Location(
-                name=location_name,
-                address=address,
-                latitude=latitude,
-                longitude=longitude
-            )
-            db.session.add(location)
-            db.session.flush()
-        
-        # Handle file upload
-        picture_filename = None
+        # Handle file upload (stored under its content hash, see app/uploads.py)
         if 'picture' in request.files:
             file = request.files['picture']
             if file and file.filename and allowed_file(file.filename):
-                filename = secure_filename(file.filename)
-                # Add user_id to filename to avoid conflicts
-                picture_filename = f"{current_user.id}_{filename}"
-                
-                from flask import current_app
-                upload_folder = current_app.config.get('UPLOAD_FOLDER')
-                if upload_folder:
-                    os.makedirs(upload_folder, exist_ok=True)
-                    file.save(os.path.join(upload_folder, picture_filename))
+                picture_filename = uploaded = uploads.save_upload(file)
         
         # If no file uploaded, use category icon
         if not picture_filename:
@@ -138,12 +243,18 @@ def create_item():
         )
         
         db.session.add(new_item)
-        db.session.flush()  # Ensure relationships are loaded for embedding
+        db.session.flush()  # Assigns new_item.id for the embedding job
+        inventory.mark_changed(new_item)
 
-        # Compute Dedalus embedding (non-blocking — silently skipped if unavailable)
-        embed_item(new_item)
+        # Embedding is computed in the background (see app/embedding_queue.py)
+        embedding_queue.enqueue(new_item)
 
         db.session.commit()
+        # Commit expired the instance; reload it with its relations in one go
+        new_item = Item.query_with_relations().filter(Item.id == new_item.id).one()
+        inventory.item_saved(new_item)
+        # Resized renditions replace the raw upload in the background
+        image_pipeline.schedule(new_item.id, new_item.picture)
         
         return jsonify({
             'message': 'Item created successfully',
@@ -152,6 +263,8 @@ def create_item():
         
     except Exception as e:
         db.session.rollback()
+        if uploaded:
+            uploads.purge([uploaded])  # our reference was rolled back
         return jsonify({'error': str(e)}), 500
 
 
@@ -159,13 +272,14 @@ def create_item():
 @login_required
 def update_item(item_id):
     """Update an existing item listing"""
+    new_picture, released = None, []
     try:
-        item = Item.query.get_or_404(item_id)
+        item = Item.query_with_relations().filter(Item.id == item_id).first_or_404()
         
         # Check ownership
         if item.user_id != current_user.id:
             return jsonify({'error': 'Unauthorized'}), 403
-        
+
         # Update fields if provided
         if 'item_name' in request.form:
             item.item_name = request.form.get('item_name')
@@ -193,7 +307,8 @@ def update_item(item_id):
                 category = Category(name=category_name)
                 db.session.add(category)
                 db.session.flush()
-            item.category_id = category.id
+            # Assign the relationship (not just the id) so item_text sees it
+            item.category = category
         
         # Update location if provided
         if 'latitude' in request.form and 'longitude' in request.form:
@@ -203,51 +318,31 @@ def update_item(item_id):
             location_name = request.form.get('location_name')
             
             if latitude is not None and longitude is not None and address:
-                location = Location.query.filter_by(
-                    latitude=latitude,
-                    longitude=longitude
-                ).first()
-                
-                if not location:
-                    location = Location(
-                        name=location_name,
-                        address=address,
-                        latitude=latitude,
-                        longitude=longitude
-                    )
-                    db.session.add(location)
-                    db.session.flush()
-                
+                location = Location.get_or_create(latitude, longitude, address, name=location_name)
                 item.location_id = location.id
         
         # Handle file upload
         if 'picture' in request.files:
             file = request.files['picture']
             if file and file.filename and allowed_file(file.filename):
-                # Delete old picture if exists
-                if item.picture:
-                    from flask import current_app
-                    upload_folder = current_app.config.get('UPLOAD_FOLDER')
-                    if upload_folder:
-                        old_path = os.path.join(upload_folder, item.picture)
-                        if os.path.exists(old_path):
-                            os.remove(old_path)
-                
-                # Save new picture
-                filename = secure_filename(file.filename)
-                picture_filename = f"{current_user.id}_{filename}"
-                
-                from flask import current_app
-                upload_folder = current_app.config.get('UPLOAD_FOLDER')
-                if upload_folder:
-                    os.makedirs(upload_folder, exist_ok=True)
-                    file.save(os.path.join(upload_folder, picture_filename))
-                    item.picture = picture_filename
-
-        # Re-compute Dedalus embedding if text fields changed
-        embed_item(item)
+                # Let go of the old picture (and its renditions); the files
+                # are removed after commit unless another item shares them
+                released = uploads.release(*picture_files(item))
+                item.picture_renditions = None
+                item.picture = new_picture = uploads.save_upload(file)
+
+        inventory.mark_changed(item)
+
+        # Re-compute Dedalus embedding in the background, only if the
+        # embedded text (name / category / description) changed
+        embedding_queue.enqueue(item)
 
         db.session.commit()
+        uploads.purge(released)
+        item = Item.query_with_relations().filter(Item.id == item.id).one()
+        inventory.item_saved(item)
+        if new_picture:
+            image_pipeline.schedule(item.id, new_picture)
         
         return jsonify({
             'message': 'Item updated successfully',
@@ -256,6 +351,8 @@ def update_item(item_id):
         
     except Exception as e:
         db.session.rollback()
+        if new_picture:
+            uploads.purge([new_picture])
         return jsonify({'error': str(e)}), 500
 
 
@@ -264,23 +361,20 @@ def update_item(item_id):
 def delete_item(item_id):
     """Delete an item listing"""
     try:
-        item = Item.query.get_or_404(item_id)
+        item = Item.query_with_relations().filter(Item.id == item_id).first_or_404()
         
         # Check ownership
         if item.user_id != current_user.id:
             return jsonify({'error': 'Unauthorized'}), 403
         
-        # Delete associated picture file if exists
-        if item.picture:
-            from flask import current_app
-            upload_folder = current_app.config.get('UPLOAD_FOLDER')
-            if upload_folder:
-                picture_path = os.path.join(upload_folder, item.picture)
-                if os.path.exists(picture_path):
-                    os.remove(picture_path)
+        # Release the picture files; unshared ones are deleted after commit
+        released = uploads.release(*picture_files(item))
         
+        inventory.mark_deleted([item.id])
         db.session.delete(item)
         db.session.commit()
+        uploads.purge(released)
+        inventory.item_deleted(item_id)
         
         return jsonify({'message': 'Item deleted successfully'}), 200
         
@@ -1,36 +1,51 @@
 from flask import Blueprint, request, jsonify
 from flask_login import login_required, current_user
 from ..extensions import db
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
 from ..models import Location, SavedLocation
+from ..payload_cache import encode
+from .. import inventory, streaming, uploads
+from ..images import picture_files
 
 bp = Blueprint('locations', __name__)
 
 
 @bp.route('/api/locations', methods=['GET'])
 def get_locations():
-    locations = Location.query.all()
-    return jsonify([{
+    """All locations, streamed as a JSON array (or NDJSON, see app/streaming.py)."""
+    query = select(Location.id, Location.name, Location.address, Location.latitude, Location.longitude)
+    batches = ([encode({
         'id': loc.id,
         'name': loc.name,
         'address': loc.address,
         'latitude': loc.latitude,
         'longitude': loc.longitude
-    } for loc in locations])
+    }) for loc in rows] for rows in streaming.row_batches(query, db.session))
+    return streaming.stream_list(batches, encoding=streaming.negotiated_encoding())
 
 
 @bp.route('/api/locations', methods=['POST'])
 @login_required
 def create_location():
+    """Create a Location. Locations are unique by coordinates, so a point
+    that already has one answers 409 with the existing id instead of
+    silently returning it under its old name and address."""
     data = request.get_json()
-
-    location = Location(
-        name=data.get('name'),
-        address=data['address'],
-        latitude=data['latitude'],
-        longitude=data['longitude']
-    )
-
-    db.session.add(location)
+    latitude, longitude = data['latitude'], data['longitude']
+
+    existing = Location.query.filter_by(latitude=latitude, longitude=longitude).first()
+    if existing is None:
+        try:
+            with db.session.begin_nested():
+                location = Location(name=data.get('name'), address=data['address'],
+                                    latitude=latitude, longitude=longitude)
+                db.session.add(location)
+        except IntegrityError:  # created concurrently
+            existing = Location.query.filter_by(latitude=latitude, longitude=longitude).one()
+    if existing is not None:
+        return jsonify({'error': 'A location already exists at these coordinates',
+                        'id': existing.id}), 409
     db.session.commit()
 
     return jsonify({
@@ -83,9 +98,16 @@ def delete_saved_location(location_id):
     db.session.delete(saved)
 
     # Also remove the matching Location record (cascade deletes its items)
+    released = []
     matching_location = Location.query.filter_by(latitude=lat, longitude=lng).first()
     if matching_location:
+        for item in matching_location.items:
+            released.extend(uploads.release(*picture_files(item)))
+        inventory.mark_deleted(item.id for item in matching_location.items)
         db.session.delete(matching_location)
 
     db.session.commit()
+    uploads.purge(released)
+    if matching_location:
+        inventory.inventory_changed()
     return jsonify({'message': 'Location deleted'}), 200
@@ -1,25 +1,34 @@
 """
 Search & Transcription routes powered by Dedalus Labs SDK.
 
-- POST /api/search      — semantic search over item embeddings
+- POST /api/search      — semantic search over item embeddings, with an
+                          in-memory BM25 engine for hybrid ranking and
+                          offline fallback
 - POST /api/transcribe   — voice-to-text via Dedalus audio transcription
+
+The search engines (and NumPy under them) are imported inside the views,
+so a cold start only pays for them on the first search.
 """
 
-import json
-import math
-import traceback
-from pathlib import Path
+import logging
+import os
 
-from flask import Blueprint, request, jsonify
-from sqlalchemy.orm import joinedload
+from flask import Blueprint, Response, request, jsonify
 
+from ..embeddings import EMBEDDING_MODEL
 from ..extensions import db, get_dedalus_client
-from ..models import Item
+from ..geo import bounding_box, haversine_miles
+from ..metrics import metrics
+from ..models import Item, Location
+from ..payload_cache import encode, payload_cache, with_fields
+from ..transcription import EmptyAudio, TranscriptionBusy, transcriber
 
 bp = Blueprint('search', __name__)
+log = logging.getLogger(__name__)
 
-EMBEDDING_MODEL = "openai/text-embedding-3-small"
-TRANSCRIPTION_MODEL = "groq/whisper-large-v3-turbo"
+SEARCH_LIMIT = 50  # max results returned by /api/search
+HYBRID_CANDIDATES = 200  # per-engine candidates considered before merging
+LEXICAL_WEIGHT = float(os.environ.get('SEARCH_LEXICAL_WEIGHT', 0.3))  # 0 = vector only
 
 # Allowed audio MIME types for transcription
 ALLOWED_AUDIO_TYPES = {
@@ -28,58 +37,100 @@ ALLOWED_AUDIO_TYPES = {
 }
 
 
-def _cosine_similarity(a, b):
-    """Compute cosine similarity between two vectors (lists of floats)."""
-    dot = sum(x * y for x, y in zip(a, b))
-    norm_a = math.sqrt(sum(x * x for x in a))
-    norm_b = math.sqrt(sum(x * x for x in b))
-    if norm_a == 0 or norm_b == 0:
-        return 0.0
-    return dot / (norm_a * norm_b)
-
-
 def _embed_query(client, text):
     """Embed a single query string. Returns a list of floats or None."""
     try:
-        response = client.embeddings.create(
-            input=text,
-            model=EMBEDDING_MODEL,
-        )
+        with metrics.provider_call('embed_query'):
+            response = client.embeddings.create(
+                input=text,
+                model=EMBEDDING_MODEL,
+            )
         return response.data[0].embedding
-    except Exception as e:
-        print(f"[search] _embed_query failed: {e}")
-        traceback.print_exc()
+    except Exception:
+        log.warning("query embedding failed", exc_info=True)
         return None
 
 
-def _item_text(item):
-    """Build the searchable text string for an item."""
-    parts = [item.item_name or ""]
-    if item.category:
-        parts.append(item.category.name)
-    if item.item_desc:
-        parts.append(item.item_desc)
-    return " — ".join(parts)
+def _query_vector(query):
+    """Query embedding from the cache or the provider; None if unavailable."""
+    from ..query_cache import query_cache
 
+    query_vec = query_cache.get(query)
+    if query_vec is not None:
+        return query_vec
 
-def embed_item(item):
-    """Compute and store an embedding for a single item.
-    Called from item create/update routes. Returns True on success."""
     client = get_dedalus_client()
     if client is None:
-        return False
+        return None
+    query_vec = _embed_query(client, query)
+    if query_vec is not None:
+        query_cache.put(query, query_vec)
+    return query_vec
+
+
+def _rank(query_vec, lexical, categories, candidate_ids):
+    """Combine vector similarity and BM25 into (item_id, score) pairs.
+
+    With no lexical hits this is plain cosine ranking. Otherwise each
+    candidate from either side scores
+    (1 - LEXICAL_WEIGHT) * cosine + LEXICAL_WEIGHT * bm25 / best_bm25,
+    so items still waiting for an embedding can rank on keywords alone.
+    """
+    from ..search_index import embedding_index
+
+    vector = embedding_index.search(query_vec, k=HYBRID_CANDIDATES, categories=categories,
+                                    item_ids=candidate_ids)
+    if LEXICAL_WEIGHT <= 0 or not lexical:
+        return vector[:SEARCH_LIMIT]
+
+    cosine = dict(vector)
+    missing = [item_id for item_id, _ in lexical if item_id not in cosine]
+    if missing:
+        cosine.update(embedding_index.search(query_vec, k=len(missing), item_ids=missing))
+
+    best_bm25 = lexical[0][1]
+    bm25 = {item_id: score / best_bm25 for item_id, score in lexical}
+    combined = {
+        item_id: (1 - LEXICAL_WEIGHT) * max(cosine.get(item_id, 0.0), 0.0) +
+                 LEXICAL_WEIGHT * bm25.get(item_id, 0.0)
+        for item_id in cosine.keys() | bm25.keys()
+    }
+    return sorted(combined.items(), key=lambda pair: pair[1], reverse=True)[:SEARCH_LIMIT]
+
+
+def _items_within_radius(lat, lng, radius):
+    """Ids of available items within `radius` miles of (lat, lng).
+
+    A bounding box on Location.latitude/longitude is pushed into SQL, then
+    the survivors get an exact vectorized haversine check. Returns None
+    when no usable geo filter was given (or it covers the whole globe).
+    """
+    import numpy as np
+
     try:
-        text = _item_text(item)
-        response = client.embeddings.create(
-            input=text,
-            model=EMBEDDING_MODEL,
-        )
-        item.embedding = json.dumps(response.data[0].embedding)
-        return True
-    except Exception as e:
-        print(f"[search] embed_item failed: {e}")
-        traceback.print_exc()
-        return False
+        lat, lng, radius = float(lat), float(lng), float(radius)
+    except (TypeError, ValueError):
+        return None
+    if radius <= 0 or not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        return None
+
+    min_lat, min_lng, max_lat, max_lng = bounding_box(lat, lng, radius)
+    if min_lat <= -90 and max_lat >= 90 and min_lng is None:
+        return None
+
+    query = db.session.query(Item.id, Location.latitude, Location.longitude) \
+        .join(Location, Item.location_id == Location.id) \
+        .filter(Item.is_available == True,
+                Location.latitude.between(min_lat, max_lat))
+    if min_lng is not None:
+        query = query.filter(Location.longitude.between(min_lng, max_lng))
+
+    rows = np.array(query.all(), dtype=np.float64).reshape(-1, 3)
+    if rows.size == 0:
+        return np.empty(0, dtype=np.int64)
+
+    distances = haversine_miles(lat, lng, rows[:, 1], rows[:, 2])
+    return rows[distances <= radius, 0].astype(np.int64)
 
 
 # ─── Semantic Search ────────────────────────────────────────────────
@@ -89,83 +140,76 @@ def semantic_search():
     """
     Accepts JSON: { "query": "...", "categories": [...], "radius": 5,
                     "lat": 40.44, "lng": -79.99 }
-    Returns ranked items with a similarity score.
-    Falls back to empty results if Dedalus is unavailable.
+    Returns ranked items with a 0..1 relevance score. When lat/lng/radius
+    (miles) are given, only items inside that radius are scored.
+    Ranking is hybrid (embedding similarity + BM25) when the query can be
+    embedded, and BM25 alone when Dedalus is unavailable; `engine` in the
+    response says which was used.
     """
+    from ..lexical_index import lexical_index
+    from ..search_index import embedding_index
+
     data = request.get_json(silent=True) or {}
     query = (data.get('query') or '').strip()
 
     if not query:
         return jsonify({'results': [], 'fallback': True}), 200
 
-    client = get_dedalus_client()
-    if client is None:
-        # SDK not available — tell the frontend to use client-side search
-        return jsonify({'results': [], 'fallback': True}), 200
-
-    # Embed the query
-    query_vec = _embed_query(client, query)
-    if query_vec is None:
-        return jsonify({'results': [], 'fallback': True}), 200
-
-    # Load all available items with their embeddings
-    items = Item.query.options(
-        joinedload(Item.location),
-        joinedload(Item.category),
-        joinedload(Item.owner),
-    ).filter_by(is_available=True).all()
+    # Restrict to items inside the search radius before scoring (and before
+    # spending an embedding call on a query with nothing nearby)
+    candidate_ids = _items_within_radius(data.get('lat'), data.get('lng'), data.get('radius'))
+    if candidate_ids is not None and len(candidate_ids) == 0:
+        return jsonify({'results': [], 'fallback': False}), 200
 
     # Optional filters from request
     categories = data.get('categories')  # list or None
+    if not categories or 'all' in categories:
+        categories = None
 
-    scored = []
-    print(f"[search] Query: '{query}', items: {len(items)}, categories: {categories}")
-    for item in items:
-        # Category filter (hard filter — user explicitly chose categories)
-        if categories and 'all' not in categories:
-            cat_name = item.category.name if item.category else ''
-            if cat_name not in categories:
-                continue
-
-        # Similarity — skip items without embeddings
-        if not item.embedding:
-            continue
-        try:
-            item_vec = json.loads(item.embedding)
-        except (json.JSONDecodeError, TypeError):
-            continue
-
-        sim = _cosine_similarity(query_vec, item_vec)
-        scored.append((sim, item))
-
-    print(f"[search] Scored {len(scored)} items after filtering (from {len(items)} total)")
-    if scored:
-        top = scored[0] if scored else None
-        scored_sorted = sorted(scored, key=lambda x: x[0], reverse=True)
-        print(f"[search] Top match: '{scored_sorted[0][1].item_name}' score={scored_sorted[0][0]:.4f}")
-
-    # Sort by similarity descending
-    scored.sort(key=lambda x: x[0], reverse=True)
-
-    # Return top 50
-    results = []
-    for sim, item in scored[:50]:
-        d = item.to_dict()
-        d['score'] = round(sim, 4)
-        results.append(d)
-
-    return jsonify({'results': results, 'fallback': False}), 200
-
-
-def _haversine_miles(lat1, lng1, lat2, lng2):
-    """Haversine distance in miles."""
-    R = 3958.8
-    d_lat = math.radians(lat2 - lat1)
-    d_lng = math.radians(lng2 - lng1)
-    a = (math.sin(d_lat / 2) ** 2 +
-         math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) *
-         math.sin(d_lng / 2) ** 2)
-    return R * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+    # Both indexes are in memory (built from the DB on first use)
+    lexical_index.ensure_built()
+    lexical = lexical_index.search(query, k=HYBRID_CANDIDATES, categories=categories,
+                                   item_ids=candidate_ids)
+
+    # Embed the query — cached vectors work even when the provider is unreachable
+    query_vec = _query_vector(query)
+    if query_vec is None:
+        if not lexical:
+            # Nothing matched whole words — let the frontend try its substring search
+            return jsonify({'results': [], 'fallback': True}), 200
+        # No vector: rank on BM25 alone, scaled to 0..1 like similarities
+        engine = 'lexical'
+        best = lexical[0][1]
+        scored = [(item_id, score / best) for item_id, score in lexical[:SEARCH_LIMIT]]
+    else:
+        embedding_index.ensure_built()
+        scored = _rank(query_vec, lexical, categories, candidate_ids)
+        engine = 'hybrid' if lexical and LEXICAL_WEIGHT > 0 else 'vector'
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug("search", extra={'query': query, 'engine': engine, 'matches': len(scored),
+                                   'categories': categories, 'top_match': scored[0] if scored else None})
+
+    # Hydrate only the top matches from the payload cache, preserving rank order
+    ids = [item_id for item_id, _ in scored]
+    rows = db.session.query(Item.id, Item.version) \
+        .filter(Item.id.in_(ids), Item.is_available == True).all() if ids else []
+    versions = dict(rows)
+
+    ranked = [(item_id, versions[item_id]) for item_id, _ in scored if item_id in versions]
+    scores = {item_id: round(sim, 4) for item_id, sim in scored}
+    results = [with_fields(fragment, score=scores[item_id])
+               for (item_id, _), fragment in zip(ranked, payload_cache.fragments(ranked))]
+
+    body = b'{"engine":' + encode(engine) + b',"fallback":false,"results":[' + b','.join(results) + b']}'
+    return Response(body, mimetype='application/json'), 200
+
+
+@bp.route('/api/search/cache-stats', methods=['GET'])
+def search_cache_stats():
+    """Hit/miss counters for the query-embedding cache."""
+    from ..query_cache import query_cache
+
+    return jsonify(query_cache.stats()), 200
 
 
 # ─── Voice Transcription ────────────────────────────────────────────
@@ -175,6 +219,11 @@ def transcribe_audio():
     """
     Accepts a multipart audio file upload.
     Returns JSON: { "text": "transcribed words" }
+
+    The upload is spooled to disk and transcribed on a bounded worker pool
+    (see app/transcription.py). By default the request waits for the result.
+    With `Prefer: respond-async, wait=N` it waits at most N seconds, then
+    answers 202 { job_id, status } to be polled at /api/transcribe/<job_id>.
     """
     client = get_dedalus_client()
     if client is None:
@@ -183,42 +232,49 @@ def transcribe_audio():
     if 'audio' not in request.files:
         return jsonify({'error': 'No audio file provided'}), 400
 
-    audio_file = request.files['audio']
-
     try:
-        audio_bytes = audio_file.read()
-        if len(audio_bytes) == 0:
-            return jsonify({'error': 'Empty audio file'}), 400
-
-        print(f"[transcribe] Audio size: {len(audio_bytes)} bytes, content_type: {audio_file.content_type}")
-
-        # Pass as a named tuple so the SDK sends the correct filename/MIME type
-        # The upstream API needs the file extension to detect the format
-        file_tuple = ("recording.webm", audio_bytes, audio_file.content_type or "audio/webm")
-
-        transcription = client.audio.transcriptions.create(
-            file=file_tuple,
-            model=TRANSCRIPTION_MODEL,
-            language="en",
-            response_format="json",
-        )
-
-        print(f"[transcribe] SDK response type: {type(transcription)}")
-        print(f"[transcribe] SDK response: {transcription}")
-
-        # Handle different possible response shapes
-        if hasattr(transcription, 'text'):
-            text = transcription.text
-        elif isinstance(transcription, dict):
-            text = transcription.get('text', '')
-        elif isinstance(transcription, str):
-            text = transcription
-        else:
-            text = str(transcription)
-
-        return jsonify({'text': text or ''}), 200
-
-    except Exception as e:
-        print(f"[transcribe] ERROR: {e}")
-        traceback.print_exc()
-        return jsonify({'error': f'Transcription failed: {str(e)}'}), 500
+        job = transcriber.submit(client, request.files['audio'])
+    except EmptyAudio as e:
+        return jsonify({'error': str(e)}), 400
+    except TranscriptionBusy:
+        response = jsonify({'error': 'Voice search is busy, try again shortly'})
+        response.headers['Retry-After'] = '2'
+        return response, 503
+
+    job.wait(_prefer_wait())
+    return _job_response(job)
+
+
+@bp.route('/api/transcribe/<job_id>', methods=['GET'])
+def transcription_status(job_id):
+    """Poll a transcription started with `Prefer: respond-async`."""
+    job = transcriber.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown or expired transcription job'}), 404
+    return _job_response(job)
+
+
+def _prefer_wait():
+    """Seconds to block the request: the full timeout, or the RFC 7240
+    `wait` preference when the client accepts an async response."""
+    prefs = [p.strip().lower() for p in request.headers.get('Prefer', '').split(',')]
+    if 'respond-async' not in prefs:
+        return None  # until the job finishes (each chunk is bounded by TRANSCRIBE_TIMEOUT)
+    for pref in prefs:
+        if pref.startswith('wait='):
+            try:
+                return max(0.0, float(pref[len('wait='):]))
+            except ValueError:
+                break
+    return 0.0
+
+
+def _job_response(job):
+    if not job.finished:
+        response = jsonify(job.to_dict())
+        response.headers['Location'] = f'/api/transcribe/{job.id}'
+        response.headers['Retry-After'] = '1'
+        return response, 202
+    if job.status == 'error':
+        return jsonify(job.to_dict()), 500
+    return jsonify(job.to_dict()), 200
@@ -0,0 +1,105 @@
+import gzip
+import os
+
+from flask import Blueprint, Response, abort, current_app, redirect, request, send_file
+from werkzeug.security import safe_join
+
+from ..pmtiles import COMPRESSION_GZIP, archive_store
+
+bp = Blueprint('tiles', __name__)
+
+# Where .pmtiles archives live. If a file isn't there (or is only a
+# git-lfs pointer), requests are redirected to PMTILES_REMOTE_BASE; set it
+# empty on offline deployments to get a 404 instead.
+PMTILES_DIR = os.environ.get('PMTILES_DIR')
+PMTILES_REMOTE_BASE = os.environ.get(
+    'PMTILES_REMOTE_BASE', 'https://ypuczzdtz97dm7t1.public.blob.vercel-storage.com')
+# Archive behind /tiles/{z}/{x}/{y}
+PMTILES_ARCHIVE = os.environ.get('PMTILES_ARCHIVE', 'pittsburgh-pa.pmtiles')
+TILE_MAX_AGE = 24 * 60 * 60
+
+
+def _archive_path(filename):
+    folder = PMTILES_DIR or os.path.join(current_app.root_path, 'static', 'maps')
+    path = safe_join(folder, filename)
+    if path is None:
+        abort(404)
+    return path
+
+
+def _range_response(archive):
+    """206 for a single satisfiable byte range, 416 for an unsatisfiable
+    one, None when the whole file should be sent."""
+    byte_range = request.range
+    if byte_range is None:
+        return None
+    if_range = request.if_range
+    if (if_range.etag or if_range.date) and if_range.etag != archive.etag:
+        return None  # the client's copy is stale; send the full current file
+
+    bounds = byte_range.range_for_length(archive.size)
+    if bounds is None:
+        if len(byte_range.ranges) > 1:
+            return None  # multipart ranges aren't worth supporting here
+        response = Response(status=416)
+        response.headers['Content-Range'] = f'bytes */{archive.size}'
+        return response
+
+    start, stop = bounds
+    response = Response(archive.read(start, stop), status=206,
+                        mimetype='application/vnd.pmtiles', direct_passthrough=True)
+    response.headers['Content-Range'] = f'bytes {start}-{stop - 1}/{archive.size}'
+    response.content_length = stop - start
+    return response
+
+
+@bp.route('/static/maps/<path:filename>')
+def serve_pmtiles(filename):
+    """Byte-range access to a local .pmtiles archive."""
+    path = _archive_path(filename)
+    archive = archive_store.get(path)
+    if archive is None:
+        if PMTILES_REMOTE_BASE:
+            return redirect(f"{PMTILES_REMOTE_BASE.rstrip('/')}/{filename}")
+        abort(404)
+
+    response = _range_response(archive)
+    if response is None:
+        response = send_file(path, mimetype='application/vnd.pmtiles', conditional=True,
+                             etag=archive.etag, max_age=TILE_MAX_AGE)
+    else:
+        response.set_etag(archive.etag)
+        response.cache_control.public = True
+        response.cache_control.max_age = TILE_MAX_AGE
+    response.accept_ranges = 'bytes'
+    return response
+
+
+@bp.route('/tiles/<int:z>/<int:x>/<int:y>')
+@bp.route('/tiles/<int:z>/<int:x>/<int:y>.<ext>')
+def get_tile(z, x, y, ext=None):
+    """One tile from the local archive, for clients that can't read PMTiles."""
+    archive = archive_store.get(_archive_path(PMTILES_ARCHIVE))
+    if archive is None:
+        abort(404)
+    try:
+        data = archive.tile(z, x, y)
+    except ValueError:
+        abort(404)
+    if data is None:
+        return Response(status=204)  # no data here; the map leaves it blank
+
+    response = Response(mimetype=archive.header.mimetype)
+    etag = f"{archive.etag}-{z}-{x}-{y}"
+    if archive.header.tile_compression == COMPRESSION_GZIP:
+        if request.accept_encodings['gzip']:
+            response.headers['Content-Encoding'] = 'gzip'
+            etag += '-gz'
+        else:
+            data = gzip.decompress(data)
+    response.set_data(data)
+    response.vary.add('Accept-Encoding')
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = TILE_MAX_AGE
+    return response.make_conditional(request)
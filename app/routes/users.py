@@ -2,6 +2,8 @@ from flask import Blueprint, render_template, request, redirect, url_for, flash,
 from flask_login import current_user, login_user, logout_user, login_required
 from ..extensions import db
 from ..models import User
+from .. import inventory, uploads
+from ..images import picture_files
 
 bp = Blueprint('users', __name__)
 
@@ -98,6 +100,10 @@ def update_profile():
         
         else:
             return jsonify({'error': 'Invalid field'}), 400
+
+        # Owner name / phone are part of every item payload in the feed
+        if field in ('username', 'phone_number'):
+            inventory.mark_changed(*current_user.items)
         
         db.session.commit()
         return jsonify({'message': 'Profile updated successfully'}), 200
@@ -143,8 +149,14 @@ def delete_account():
         
         # Delete user (cascade will handle related items and saved locations)
         user = User.query.get(user_id)
+        released = []
+        for item in user.items:
+            released.extend(uploads.release(*picture_files(item)))
+        inventory.mark_deleted(item.id for item in user.items)
         db.session.delete(user)
         db.session.commit()
+        uploads.purge(released)
+        inventory.inventory_changed()
         
         # Log out the user
         logout_user()
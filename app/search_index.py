@@ -0,0 +1,252 @@
+"""
+Process-level embedding index for semantic search.
+
+Holds a pre-normalized float32 matrix of item vectors alongside an id
+array so a query is scored with a single matrix-vector product instead of
+decoding and comparing every row on each request. The index is built
+lazily from the database on first use and kept in sync by the item
+create/update/delete routes.
+"""
+
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+from .embeddings import EMBEDDING_MODEL, unpack_vector
+
+# Rebuild from the database after this many seconds so writes made by
+# other processes (other workers, `flask embed-pending`) show up.
+MAX_AGE = float(os.environ.get('SEARCH_INDEX_MAX_AGE', 300))
+
+
+def _normalize(vec):
+    """Return a float32 unit vector, or None for empty / zero vectors."""
+    if vec is None:
+        return None
+    arr = np.asarray(vec, dtype=np.float32).ravel()
+    if arr.size == 0:
+        return None
+    norm = float(np.linalg.norm(arr))
+    if norm == 0.0:
+        return None
+    return arr / norm
+
+
+def _decode(blob, dtype, legacy_json):
+    """Decode a stored embedding (packed bytes, or legacy JSON text)."""
+    if blob:
+        return unpack_vector(blob, dtype)
+    if not legacy_json:
+        return None
+    try:
+        return json.loads(legacy_json)
+    except (json.JSONDecodeError, TypeError):
+        return None
+
+
+def _is_current_model(model):
+    # Rows without a recorded model predate binary storage and were
+    # embedded with the default model.
+    return model is None or model == EMBEDDING_MODEL
+
+
+class EmbeddingIndex:
+    """In-memory matrix of unit-length item embeddings keyed by item id.
+
+    Only available items with a valid embedding are indexed. Readers take
+    one reference to an `(ids, categories, matrix)` snapshot. Writers
+    publish a new snapshot under a lock, so a search never sees a
+    half-applied update.
+
+    The arrays have spare capacity, doubled when full, so adding an item
+    costs O(d) amortized: the new row goes past the end of every published
+    snapshot. Replacing or removing an item copies the whole matrix
+    (O(N·d)), because readers may still hold the old rows. Bulk changes
+    should call `invalidate()` instead.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._built = False
+        self._built_at = 0.0
+        self._snapshot = (np.empty(0, dtype=np.int64), np.empty(0, dtype=object), None)
+        self._buffers = self._snapshot  # same arrays with spare rows past _size
+        self._size = 0
+        self._positions = {}
+
+    @property
+    def built(self):
+        return self._built
+
+    def __len__(self):
+        return len(self._snapshot[0])
+
+    def _publish(self, ids, categories, matrix, size):
+        """Adopt new buffers and expose their first `size` rows. Lock held."""
+        self._buffers = (ids, categories, matrix)
+        self._size = size
+        self._snapshot = (ids[:size], categories[:size], matrix[:size] if size else None)
+
+    def _copy_buffers(self, capacity, dim):
+        """Fresh buffers of `capacity` rows holding the current rows. Lock held."""
+        ids, categories, matrix = self._buffers
+        size = self._size
+        new_ids = np.empty(capacity, dtype=np.int64)
+        new_categories = np.empty(capacity, dtype=object)
+        new_matrix = np.empty((capacity, dim), dtype=np.float32)
+        new_ids[:size] = ids[:size]
+        new_categories[:size] = categories[:size]
+        if size:
+            new_matrix[:size] = matrix[:size]
+        return new_ids, new_categories, new_matrix
+
+    # --- building ---
+
+    def build(self):
+        """(Re)load every available, embedded item from the database."""
+        from .extensions import db
+        from .models import Item, Category
+
+        rows = db.session.query(
+            Item.id, Item.embedding, Item.embedding_dtype, Item.embedding_model,
+            Item.embedding_json, Category.name,
+        ).outerjoin(Category, Item.category_id == Category.id) \
+            .filter(Item.is_available == True,
+                    (Item.embedding != None) | (Item.embedding_json != None)) \
+            .all()
+
+        ids, categories, vectors = [], [], []
+        dim = None
+        for item_id, blob, dtype, model, legacy_json, category_name in rows:
+            if not _is_current_model(model):
+                continue
+            vec = _normalize(_decode(blob, dtype, legacy_json))
+            if vec is None:
+                continue
+            if dim is None:
+                dim = vec.size
+            elif vec.size != dim:
+                # Mixed models / dimensions can't share one matrix
+                continue
+            ids.append(item_id)
+            categories.append(category_name or '')
+            vectors.append(vec)
+
+        with self._lock:
+            self._publish(np.asarray(ids, dtype=np.int64), np.asarray(categories, dtype=object),
+                          np.vstack(vectors) if vectors else None, len(ids))
+            self._positions = {item_id: i for i, item_id in enumerate(ids)}
+            self._built = True
+            self._built_at = time.monotonic()
+
+    def ensure_built(self):
+        if not self._built or time.monotonic() - self._built_at > MAX_AGE:
+            self.build()
+
+    def invalidate(self):
+        """Drop the index; the next search rebuilds it from the database.
+        Used after bulk changes (cascading deletes, batch re-embedding)."""
+        with self._lock:
+            self._built = False
+
+    # --- incremental updates ---
+
+    def upsert(self, item):
+        """Add, replace or drop a single item according to its current state."""
+        if not self._built:
+            return
+        vec = None
+        if item.is_available and _is_current_model(item.embedding_model):
+            vec = _normalize(item.get_embedding())
+        if vec is None:
+            self.remove(item.id)
+            return
+
+        category_name = item.category.name if item.category else ''
+        with self._lock:
+            matrix = self._buffers[2]
+            size = self._size
+            if size and vec.size != matrix.shape[1]:
+                self._remove_locked(item.id)
+                return
+            pos = self._positions.get(item.id)
+            if pos is not None:
+                # Copy on write: published snapshots still include this row
+                ids, categories, matrix = self._copy_buffers(len(self._buffers[0]), vec.size)
+                categories[pos] = category_name
+                matrix[pos] = vec
+                self._publish(ids, categories, matrix, size)
+                return
+
+            ids, categories, matrix = self._buffers
+            if not size or matrix is None or matrix.shape[1] != vec.size:
+                ids, categories, matrix = self._copy_buffers(16, vec.size)
+            elif size == len(ids):
+                ids, categories, matrix = self._copy_buffers(2 * size, vec.size)
+            # Row `size` lies beyond every published snapshot, so it can be
+            # written in place
+            ids[size] = item.id
+            categories[size] = category_name
+            matrix[size] = vec
+            self._positions[item.id] = size
+            self._publish(ids, categories, matrix, size + 1)
+
+    def remove(self, item_id):
+        if not self._built:
+            return
+        with self._lock:
+            self._remove_locked(item_id)
+
+    def _remove_locked(self, item_id):
+        pos = self._positions.pop(item_id, None)
+        if pos is None:
+            return
+        ids, categories, matrix = self._snapshot
+        keep = np.ones(len(ids), dtype=bool)
+        keep[pos] = False
+        ids = ids[keep]  # boolean indexing copies
+        self._publish(ids, categories[keep], matrix[keep] if ids.size else None, ids.size)
+        self._positions = {int(item_id): i for i, item_id in enumerate(ids)}
+
+    # --- querying ---
+
+    def search(self, query_vec, k=50, categories=None, item_ids=None):
+        """Return up to k (item_id, score) pairs ordered by cosine similarity.
+
+        `categories` is an optional list of category names to restrict to;
+        `item_ids` an optional collection of candidate ids (e.g. the items
+        inside a search radius). Only the surviving rows are scored.
+        """
+        ids, cats, matrix = self._snapshot
+        if matrix is None or k <= 0:
+            return []
+        q = _normalize(query_vec)
+        if q is None or q.size != matrix.shape[1]:
+            return []
+
+        mask = None
+        if categories:
+            mask = np.isin(cats, list(categories))
+        if item_ids is not None:
+            id_mask = np.isin(ids, np.asarray(list(item_ids), dtype=np.int64))
+            mask = id_mask if mask is None else mask & id_mask
+        if mask is not None:
+            ids, matrix = ids[mask], matrix[mask]
+            if ids.size == 0:
+                return []
+
+        scores = matrix @ q
+
+        if ids.size > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(ids.size)
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [(int(ids[i]), float(scores[i])) for i in top]
+
+
+# Shared per-process instance, mirroring `db` / `login_manager` in extensions
+embedding_index = EmbeddingIndex()
@@ -0,0 +1,82 @@
+"""
+Per-request SQL statement counting with query budgets.
+
+Every statement executed while handling a request is counted through a
+SQLAlchemy engine event. When a route goes over its budget — the
+SQL_QUERY_BUDGET default, or a per-view `@query_budget(n)` — a warning is
+logged; with SQL_BUDGET_STRICT enabled (e.g. under tests) the request
+fails instead, so N+1 regressions are caught automatically.
+
+In debug / testing mode the count is also returned in an X-SQL-Queries
+response header.
+
+Statements run while a streamed body is generated (app/streaming.py)
+happen after the check and aren't counted against the budget.
+"""
+
+import logging
+import os
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+DEFAULT_BUDGET = int(os.environ.get('SQL_QUERY_BUDGET', 25))
+
+log = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(RuntimeError):
+    pass
+
+
+def query_budget(max_queries):
+    """Decorator setting the SQL statement budget for a single view."""
+    def decorator(view):
+        view._sql_query_budget = max_queries
+        return view
+    return decorator
+
+
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context():
+        g._sql_queries = g.get('_sql_queries', 0) + 1
+
+
+class SQLQueryCounter:
+    """Counts statements per request and enforces budgets."""
+
+    def __init__(self):
+        self._listening = False
+
+    def init_app(self, app):
+        app.config.setdefault('SQL_QUERY_BUDGET', DEFAULT_BUDGET)
+        app.config.setdefault('SQL_BUDGET_STRICT', os.environ.get('SQL_BUDGET_STRICT') == '1')
+
+        if not self._listening:
+            event.listen(Engine, 'before_cursor_execute', _count_statement)
+            self._listening = True
+        app.after_request(self._check_budget)
+
+    @staticmethod
+    def count():
+        """Statements executed so far in the current request."""
+        return g.get('_sql_queries', 0) if has_request_context() else 0
+
+    def _check_budget(self, response):
+        count = self.count()
+        view = current_app.view_functions.get(request.endpoint)
+        budget = getattr(view, '_sql_query_budget', current_app.config['SQL_QUERY_BUDGET'])
+
+        if current_app.debug or current_app.testing:
+            response.headers['X-SQL-Queries'] = str(count)
+
+        if count > budget:
+            message = f"{request.method} {request.path} ran {count} SQL statements (budget {budget})"
+            if current_app.config['SQL_BUDGET_STRICT']:
+                raise QueryBudgetExceeded(message)
+            log.warning(message, extra={'sql_statements': count, 'sql_budget': budget})
+        return response
+
+
+sql_counter = SQLQueryCounter()
@@ -23,10 +23,17 @@ L.control.zoom({
     position: 'bottomright'
 }).addTo(map);
 
-// Save map position on every move/zoom
+// Save map position on every move/zoom, and load items once the view
+// leaves the area we already fetched (or crosses the cluster zoom level)
 map.on('moveend', function() {
     const c = map.getCenter();
     localStorage.setItem('emberMapView', JSON.stringify({ lat: c.lat, lng: c.lng, zoom: map.getZoom() }));
+
+    if (_loadedBounds && (!_loadedBounds.contains(map.getBounds()) || _loadedClusterZoom !== clusterZoom())) {
+        loadMapItems();
+    }
+    // Without a GPS fix the sidebar measures distances from the map center
+    if (userLat === null) loadNearbyItems();
 });
 
 const layer = protomapsL.leafletLayer({
@@ -144,12 +151,18 @@ const campfireEmptyIcon = L.divIcon({
     tooltipAnchor: [0, -34]
 });
 
+const CLUSTER_MAX_ZOOM = 14; // at this zoom and below, pins are drawn as /api/items/clusters bubbles
+
 let userMarker = null;
 let userLat = null;
 let userLng = null;
-let allItems = [];
+let allItems = []; // items within the sidebar's radius (not just the map view)
 let markersByKey = {}; // lookup markers by "lat,lng" key
 let _highlightedMarkerKey = null; // track currently highlighted marker
+let _loadedBounds = null; // area covered by the last pin or cluster fetch
+let _loadedClusterZoom = null; // zoom of the clusters on the map, null when showing pins
+let _nearbyBounds = undefined; // area covered by allItems; null = everywhere, undefined = not loaded
+let _nearbyRequest = 0;
 
 function setUserLocation(lat, lng) {
     userLat = lat;
@@ -165,6 +178,7 @@ function setUserLocation(lat, lng) {
 
     // Refresh nearby items sidebar if not viewing a specific location
     if (typeof _viewingLocation !== 'undefined' && !_viewingLocation && typeof showNearbyItems === 'function') showNearbyItems();
+    loadNearbyItems();
 }
 
 function requestUserLocation() {
@@ -204,6 +218,106 @@ function highlightMarker(lat, lng) {
     }
 }
 
+// Read a streamed NDJSON response, calling onRow for each object as soon
+// as its line arrives. Plain JSON arrays (e.g. an older cached copy) are
+// handled too, just not incrementally.
+async function readJSONRows(response, onRow) {
+    const type = response.headers.get('Content-Type') || '';
+    if (!response.body || !type.includes('ndjson')) {
+        const rows = await response.json();
+        rows.forEach(onRow);
+        return;
+    }
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffered = '';
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffered += decoder.decode(value, { stream: true });
+        const lines = buffered.split('\n');
+        buffered = lines.pop();
+        lines.forEach(line => { if (line.trim()) onRow(JSON.parse(line)); });
+    }
+    buffered += decoder.decode();
+    if (buffered.trim()) onRow(JSON.parse(buffered));
+}
+
+function locationTooltip(loc) {
+    const previewNames = loc.items.slice(0, 3).map(i => i.name).join(', ');
+    const extra = loc.items.length > 3 ? ` +${loc.items.length - 3} more` : '';
+    return `<strong>${loc.location_name}</strong><br>${loc.address || ''}<br><em>${previewNames}${extra}</em>`;
+}
+
+// The zoom to request clusters at, or null when the map shows pins
+function clusterZoom() {
+    return map.getZoom() <= CLUSTER_MAX_ZOOM ? map.getZoom() : null;
+}
+
+function clusterIcon(count) {
+    const size = count < 10 ? 30 : count < 100 ? 38 : 46;
+    return L.divIcon({
+        className: 'ember-cluster',
+        html: `<div>${count}</div>`,
+        iconSize: [size, size]
+    });
+}
+
+// Draw one counted bubble per grid cell instead of every pin. Returns
+// false if the server refused the viewport (too many tiles at this zoom).
+async function loadClusters(zoom) {
+    const bounds = map.getBounds();
+    const response = await fetch(`/api/items/clusters?zoom=${zoom}&bbox=${bounds.toBBoxString()}`);
+    if (!response.ok) return false;
+    const data = await response.json();
+
+    data.clusters.forEach(cluster => {
+        const marker = L.marker([cluster.latitude, cluster.longitude], { icon: clusterIcon(cluster.count) }).addTo(map);
+        markersByKey[`${cluster.latitude},${cluster.longitude}`] = marker;
+        marker.bindTooltip(Object.entries(cluster.categories).map(([name, n]) => `${name}: ${n}`).join('<br>'));
+        marker.on('click', () => map.setView([cluster.latitude, cluster.longitude], CLUSTER_MAX_ZOOM + 1));
+    });
+    _loadedBounds = bounds;
+    _loadedClusterZoom = zoom;
+    return true;
+}
+
+// Bounds of the circle of `miles` around a point, or null if it covers the world
+function radiusBounds(lat, lng, miles) {
+    const dLat = miles / 69;
+    if (dLat >= 90) return null;
+    const dLng = Math.min(180, miles / (69 * Math.cos(lat * Math.PI / 180)));
+    return L.latLngBounds([lat - dLat, lng - dLng], [lat + dLat, lng + dLng]);
+}
+
+// Load the items the sidebar and offline search filter: everything within
+// the selected radius of the user (or the map center), wherever the map is
+// looking. Refetches only when the radius leaves the area already loaded.
+async function loadNearbyItems() {
+    const lat = userLat !== null ? userLat : map.getCenter().lat;
+    const lng = userLng !== null ? userLng : map.getCenter().lng;
+    const radius = typeof selectedRadius !== 'undefined' ? selectedRadius : 1;
+    const wanted = radiusBounds(lat, lng, radius);
+    if (_nearbyBounds === null || (_nearbyBounds && wanted && _nearbyBounds.contains(wanted))) return;
+
+    // Padded so moving the reference point a little doesn't refetch
+    const bounds = wanted && wanted.pad(0.5);
+    const request = ++_nearbyRequest;
+    const items = [];
+    try {
+        const response = await fetch('/api/items?format=ndjson' + (bounds ? '&bbox=' + bounds.toBBoxString() : ''));
+        await readJSONRows(response, item => items.push(item));
+    } catch (err) {
+        console.log("Nearby items offline - keeping the last list");
+        return;
+    }
+    if (request !== _nearbyRequest) return; // a newer radius or position has been requested
+    allItems = items;
+    _nearbyBounds = bounds;
+
+    if (typeof _viewingLocation !== 'undefined' && !_viewingLocation && typeof showNearbyItems === 'function') showNearbyItems();
+}
+
 // Fetch items and locations from your Flask API
 async function loadMapItems() {
     try {
@@ -212,35 +326,38 @@ async function loadMapItems() {
         markersByKey = {};
         _highlightedMarkerKey = null;
 
-        const response = await fetch('/api/items');
-        const items = await response.json();
-        allItems = items;
+        const zoom = clusterZoom();
+        if (zoom !== null && await loadClusters(zoom)) return;
+
+        // Only fetch items around the current viewport (padded so small pans
+        // don't trigger a refetch)
+        const bounds = map.getBounds().pad(0.5);
+        const response = await fetch('/api/items?format=ndjson&bbox=' + bounds.toBBoxString());
 
-        // Group items by location coordinates
+        // Group items by location coordinates, adding one marker per location
+        // as soon as its first item streams in
         const locations = {};
-        items.forEach(item => {
-            if (item.latitude && item.longitude) {
-                const key = `${item.latitude},${item.longitude}`;
-                if (!locations[key]) {
-                    locations[key] = { lat: item.latitude, lng: item.longitude, location_name: item.location_name, address: item.address, items: [] };
-                }
-                locations[key].items.push(item);
+        await readJSONRows(response, item => {
+            if (!item.latitude || !item.longitude) return;
+
+            const key = `${item.latitude},${item.longitude}`;
+            let loc = locations[key];
+            if (!loc) {
+                loc = locations[key] = { lat: item.latitude, lng: item.longitude, location_name: item.location_name, address: item.address, items: [] };
+                const marker = L.marker([loc.lat, loc.lng], { icon: campfireIcon }).addTo(map);
+                markersByKey[key] = marker;
+                marker.on('click', () => {
+                    if (typeof showLocationItems === 'function') showLocationItems(loc);
+                });
             }
-        });
+            loc.items.push(item);
 
-        // Create one marker per location with tooltip and click handler
-        Object.values(locations).forEach(loc => {
-            const marker = L.marker([loc.lat, loc.lng], { icon: campfireIcon }).addTo(map);
-            const key = `${loc.lat},${loc.lng}`;
-            markersByKey[key] = marker;
-            const previewNames = loc.items.slice(0, 3).map(i => i.name).join(', ');
-            const extra = loc.items.length > 3 ? ` +${loc.items.length - 3} more` : '';
-            const tooltipHtml = `<strong>${loc.location_name}</strong><br>${loc.address || ''}<br><em>${previewNames}${extra}</em>`;
-            marker.bindTooltip(tooltipHtml);
-            marker.on('click', () => {
-                if (typeof showLocationItems === 'function') showLocationItems(loc);
-            });
+            const marker = markersByKey[key];
+            if (marker.getTooltip()) marker.setTooltipContent(locationTooltip(loc));
+            else marker.bindTooltip(locationTooltip(loc));
         });
+        _loadedBounds = bounds;
+        _loadedClusterZoom = null;
 
         // Also load standalone locations from Location table (no items yet)
         const locResponse = await fetch('/api/locations');
@@ -281,9 +398,6 @@ async function loadMapItems() {
         } catch (e) {
             // User not logged in — skip saved locations
         }
-
-        // Populate sidebar with nearby items (only if not viewing a specific location)
-        if (typeof _viewingLocation !== 'undefined' && !_viewingLocation && typeof showNearbyItems === 'function') showNearbyItems();
     } catch (err) {
         console.log("Map loading offline mode - showing cached data");
     }
@@ -322,6 +436,7 @@ async function precacheMapData() {
 // Call this as soon as the page loads
 precacheMapData();
 loadMapItems();
+loadNearbyItems();
 requestUserLocation();
 
 function toggleMapInteractions() {
@@ -18,7 +18,7 @@ if (workbox) {
     // 1. Pre-cache the App Shell (static assets only — NOT pages with auth-dependent HTML)
     workbox.precaching.precacheAndRoute([
         { url: '/static/css/main.css', revision: '3' },
-        { url: '/static/js/map.js', revision: '3' }
+        { url: '/static/js/map.js', revision: '5' }
     ]);
 
     // Homepage contains Jinja-rendered auth state, so always fetch from server first
@@ -121,9 +121,28 @@ if (workbox) {
     //   })
     // );
 
-    // 4. Strategy C: Static Images (User uploads)
+    // 4. Strategy C: User uploads
+    // Content-addressed names (<hash>.<ext>) never change, so once cached
+    // they are never fetched again. Only the entry count is capped.
     workbox.routing.registerRoute(
-        ({url}) => url.pathname.startsWith('/static/uploads/'),
+        ({url}) => /^\/uploads\/[0-9a-f]{32}\.[a-z0-9]+$/.test(url.pathname),
+        new workbox.strategies.CacheFirst({
+            cacheName: 'uploads-immutable-v1',
+            plugins: [
+                new workbox.cacheableResponse.CacheableResponsePlugin({
+                    statuses: [200]
+                }),
+                new workbox.expiration.ExpirationPlugin({
+                    maxEntries: 500,
+                    purgeOnQuotaError: true,
+                }),
+            ],
+        })
+    );
+
+    // Older uploads named after the original file can still change in place
+    workbox.routing.registerRoute(
+        ({url}) => url.pathname.startsWith('/uploads/') || url.pathname.startsWith('/static/uploads/'),
             new workbox.strategies.StaleWhileRevalidate({
             cacheName: 'image-cache-v2',
         })
@@ -0,0 +1,116 @@
+"""
+Streaming JSON list responses.
+
+Large lists (the map feed, all locations) are written to the client while
+the query is still being read instead of being built and `jsonify`-ed in
+memory first. Rows are fetched `STREAM_BATCH_SIZE` at a time with
+`yield_per` (a server-side cursor on Postgres), so worker memory stays
+flat as the inventory grows and the first pins arrive after one batch.
+
+Two framings are supported:
+
+- a JSON array (the default, so existing clients keep working), and
+- NDJSON, one object per line, for `Accept: application/x-ndjson` or
+  `?format=ndjson`. Clients can parse each line as it arrives.
+
+Bodies are gzip-compressed (or brotli, if the optional `brotli` package is
+installed) as they stream when the client accepts it. Each batch is
+flushed so compression doesn't hold back the first bytes.
+STREAM_COMPRESSION=0 turns this off for hosts whose proxy compresses
+already.
+"""
+
+import os
+import zlib
+
+from flask import Response, request, stream_with_context
+
+STREAM_BATCH_SIZE = int(os.environ.get('STREAM_BATCH_SIZE', 500))
+COMPRESSION = os.environ.get('STREAM_COMPRESSION', '1') == '1'
+GZIP_LEVEL = 5  # past ~5 the CPU cost outgrows the savings on JSON
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+
+def wants_ndjson():
+    if request.args.get('format') == 'ndjson':
+        return True
+    return request.accept_mimetypes.best_match(['application/json', NDJSON_MIMETYPE]) == NDJSON_MIMETYPE
+
+
+def _brotli():
+    try:
+        import brotli
+        return brotli
+    except ImportError:
+        return None
+
+
+def negotiated_encoding():
+    """'br', 'gzip' or None, from Accept-Encoding and what's installed."""
+    if not COMPRESSION:
+        return None
+    accepted = request.accept_encodings
+    if accepted['br'] and _brotli() is not None:
+        return 'br'
+    if accepted['gzip']:
+        return 'gzip'
+    return None
+
+
+def row_batches(statement, session):
+    """Execute `statement` with a server-side cursor, yielding lists of rows."""
+    result = session.execute(statement.execution_options(yield_per=STREAM_BATCH_SIZE))
+    yield from result.partitions()
+
+
+def _framed(fragment_batches, ndjson):
+    """Wrap batches of encoded JSON objects as one array or as NDJSON lines."""
+    if ndjson:
+        for fragments in fragment_batches:
+            if fragments:
+                yield b'\n'.join(fragments) + b'\n'
+        return
+
+    yield b'['
+    first = True
+    for fragments in fragment_batches:
+        if not fragments:
+            continue
+        yield (b'' if first else b',') + b','.join(fragments)
+        first = False
+    yield b']'
+
+
+def _compressed(chunks, encoding):
+    if encoding == 'br':
+        compressor = _brotli().Compressor(quality=4)
+        for chunk in chunks:
+            yield compressor.process(chunk) + compressor.flush()
+        yield compressor.finish()
+        return
+
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)  # gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def stream_list(fragment_batches, ndjson=None, encoding=None):
+    """Streaming Response for an iterable of lists of encoded JSON objects.
+
+    `encoding` is the result of `negotiated_encoding()`, decided by the
+    caller so it can be folded into the ETag.
+    """
+    ndjson = wants_ndjson() if ndjson is None else ndjson
+    body = _framed(fragment_batches, ndjson)
+    if encoding:
+        body = _compressed(body, encoding)
+
+    response = Response(stream_with_context(body),
+                        mimetype=NDJSON_MIMETYPE if ndjson else 'application/json')
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.update(('Accept', 'Accept-Encoding'))
+    return response
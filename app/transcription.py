@@ -0,0 +1,234 @@
+"""
+Voice transcription jobs for /api/transcribe.
+
+Uploads are handed to a bounded thread pool as open files, never read
+into memory. Werkzeug already spools large uploads to a temp file, and
+the job reads that file directly; only small uploads it kept in memory
+are copied to one. The SDK reads the file directly, so the request
+thread only waits as long as the client asked it to:
+
+- TRANSCRIBE_WORKERS      concurrent provider calls (default 2)
+- TRANSCRIBE_QUEUE_LIMIT  jobs allowed to wait for a worker (default 8);
+                          beyond that new uploads get a 503
+- TRANSCRIBE_TIMEOUT      seconds per provider call (default 30)
+- TRANSCRIBE_CHUNK_BYTES  long recordings are split into pieces of about
+                          this size (default 4MB) and transcribed in order
+
+Only WAV (re-framed with the `wave` module) and MP3 (frame-synchronized,
+so byte ranges decode fine) can be split without a demuxer; other
+containers are sent whole.
+
+Jobs live in memory for JOB_TTL seconds after finishing. Polling by job
+id therefore needs the same process, so serverless clients should use a
+`wait` long enough for the usual recording (see the route).
+"""
+
+import io
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+import wave
+from concurrent.futures import ThreadPoolExecutor
+
+from .metrics import metrics
+
+TRANSCRIPTION_MODEL = "groq/whisper-large-v3-turbo"
+WORKERS = int(os.environ.get('TRANSCRIBE_WORKERS', 2))
+QUEUE_LIMIT = int(os.environ.get('TRANSCRIBE_QUEUE_LIMIT', 8))
+TIMEOUT = float(os.environ.get('TRANSCRIBE_TIMEOUT', 30))
+CHUNK_BYTES = int(os.environ.get('TRANSCRIBE_CHUNK_BYTES', 4 * 1024 * 1024))
+JOB_TTL = 300  # seconds a finished job stays pollable
+
+WAV_TYPES = {'audio/wav', 'audio/x-wav', 'audio/wave'}
+MP3_TYPES = {'audio/mpeg', 'audio/mp3'}
+
+log = logging.getLogger(__name__)
+
+
+class TranscriptionBusy(RuntimeError):
+    """Every worker is busy and the wait queue is full."""
+
+
+class EmptyAudio(ValueError):
+    pass
+
+
+class TranscriptionJob:
+    def __init__(self, filename, content_type):
+        self.id = uuid.uuid4().hex
+        self.filename = filename
+        self.content_type = content_type
+        self.status = 'pending'  # pending -> running -> done | error
+        self.text = None
+        self.error = None
+        self.chunks = 0
+        self.finished_at = None
+        self._done = threading.Event()
+
+    @property
+    def finished(self):
+        return self._done.is_set()
+
+    def wait(self, timeout):
+        return self._done.wait(timeout)
+
+    def to_dict(self):
+        payload = {'job_id': self.id, 'status': self.status}
+        if self.status == 'done':
+            payload['text'] = self.text
+        elif self.status == 'error':
+            payload['error'] = self.error
+        return payload
+
+
+def _open_upload(upload):
+    """A private, readable file holding `upload`. When werkzeug spooled the
+    upload to disk, that file is reopened through a duplicate descriptor,
+    which keeps it alive after the request closes its own. Otherwise the
+    upload is copied to a new temp file."""
+    stream = upload.stream
+    stream = getattr(stream, '_file', stream)  # a SpooledTemporaryFile's current backing file
+    try:
+        fd = os.dup(stream.fileno())
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        pass  # in memory
+    else:
+        return os.fdopen(fd, 'rb')
+
+    spool = tempfile.TemporaryFile(prefix='ember-audio-')
+    try:
+        shutil.copyfileobj(upload.stream, spool)  # 16KB at a time
+        spool.flush()
+    except BaseException:
+        spool.close()
+        raise
+    return spool
+
+
+def _chunks(f, content_type):
+    """Yield (filename, fileobj) pieces of the recording in `f`, each about
+    CHUNK_BYTES, or the whole file when it's small or can't be split."""
+    size = os.fstat(f.fileno()).st_size
+    content_type = (content_type or '').split(';')[0].strip()
+    f.seek(0)
+
+    if size > CHUNK_BYTES and content_type in WAV_TYPES:
+        with wave.open(f, 'rb') as reader:
+            params = reader.getparams()
+            frames_per_chunk = max(1, CHUNK_BYTES // (params.sampwidth * params.nchannels))
+            while True:
+                frames = reader.readframes(frames_per_chunk)
+                if not frames:
+                    return
+                piece = io.BytesIO()
+                with wave.open(piece, 'wb') as writer:
+                    writer.setparams(params)
+                    writer.writeframes(frames)
+                piece.seek(0)
+                yield 'recording.wav', piece
+        return
+
+    if size > CHUNK_BYTES and content_type in MP3_TYPES:
+        while True:
+            data = f.read(CHUNK_BYTES)
+            if not data:
+                return
+            yield 'recording.mp3', io.BytesIO(data)
+    else:
+        yield None, f
+
+
+def _response_text(transcription):
+    # Handle different possible response shapes
+    if hasattr(transcription, 'text'):
+        return transcription.text or ''
+    if isinstance(transcription, dict):
+        return transcription.get('text', '') or ''
+    if isinstance(transcription, str):
+        return transcription
+    return str(transcription)
+
+
+class Transcriber:
+    """Bounded executor + in-memory job registry."""
+
+    def __init__(self, workers=WORKERS, queue_limit=QUEUE_LIMIT):
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._executor = None
+        self._workers = workers
+        self._slots = threading.BoundedSemaphore(workers + queue_limit)
+
+    def submit(self, client, upload):
+        """Queue a werkzeug FileStorage for transcription. Raises
+        TranscriptionBusy when the queue is full, EmptyAudio for empty uploads."""
+        if not self._slots.acquire(blocking=False):
+            raise TranscriptionBusy('too many transcriptions in progress')
+        audio = None
+        try:
+            audio = _open_upload(upload)
+            if os.fstat(audio.fileno()).st_size == 0:
+                raise EmptyAudio('Empty audio file')
+
+            job = TranscriptionJob(upload.filename or 'recording.webm',
+                                   upload.content_type or 'audio/webm')
+            with self._lock:
+                self._evict_locked()
+                self._jobs[job.id] = job
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self._workers,
+                                                        thread_name_prefix='transcribe')
+            self._executor.submit(self._run, job, client, audio)
+            return job
+        except BaseException:
+            self._slots.release()
+            if audio:
+                audio.close()
+            raise
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _evict_locked(self):
+        cutoff = time.monotonic() - JOB_TTL
+        for job_id in [j.id for j in self._jobs.values() if j.finished_at and j.finished_at < cutoff]:
+            del self._jobs[job_id]
+
+    def _run(self, job, client, audio):
+        job.status = 'running'
+        try:
+            texts = []
+            for filename, fileobj in _chunks(audio, job.content_type):
+                # The SDK needs the file extension to detect the format
+                with metrics.provider_call('transcribe'):
+                    transcription = client.audio.transcriptions.create(
+                        file=(filename or job.filename, fileobj, job.content_type),
+                        model=TRANSCRIPTION_MODEL,
+                        language="en",
+                        response_format="json",
+                        timeout=TIMEOUT,
+                    )
+                texts.append(_response_text(transcription).strip())
+                job.chunks += 1
+            job.text = ' '.join(t for t in texts if t)
+            job.status = 'done'
+            log.info("transcribed job %s", job.id, extra={
+                'job_id': job.id, 'audio_bytes': os.fstat(audio.fileno()).st_size,
+                'chunks': job.chunks, 'chars': len(job.text)})
+        except Exception as e:
+            log.exception("transcription job %s failed", job.id, extra={'job_id': job.id})
+            job.error = f'Transcription failed: {e}'
+            job.status = 'error'
+        finally:
+            audio.close()
+            job.finished_at = time.monotonic()
+            job._done.set()
+            self._slots.release()
+
+
+transcriber = Transcriber()
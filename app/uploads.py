@@ -0,0 +1,182 @@
+"""
+Content-addressed storage for uploaded pictures.
+
+Every file written to UPLOAD_FOLDER — raw uploads and the renditions made
+from them (app/images.py) — is named after its own bytes:
+`<first 32 hex chars of sha256>.<ext>`. So
+
+- the same image uploaded twice is stored once, and two listings can
+  share a file without one overwriting the other, and
+- a name always refers to the same bytes. `/uploads/<name>` is therefore
+  served with `Cache-Control: public, max-age=1y, immutable` and the hash
+  as ETag, and the service worker caches these files cache-first forever.
+
+Because files are shared, `StoredFile.refcount` counts the item pictures
+that point at each one. Writers `acquire` names in the same transaction
+that stores them on an item and `release` the names they drop. After the
+commit, `purge` deletes files nobody references any more. Files from
+before content addressing (`7_photo.jpg`) have no row. They belong to a
+single item and are deleted as soon as it lets go of them.
+"""
+
+import hashlib
+import os
+import re
+import tempfile
+
+from flask import current_app, send_from_directory
+from sqlalchemy import delete, select, update
+from sqlalchemy.exc import IntegrityError
+
+HASH_CHARS = 32  # 128 bits of sha256 is plenty to never collide
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+LEGACY_MAX_AGE = 60 * 60  # legacy names can be overwritten in place
+_CHUNK = 64 * 1024
+
+_CONTENT_NAME = re.compile(rf'^[0-9a-f]{{{HASH_CHARS}}}\.[a-z0-9]+$')
+
+
+def is_content_addressed(name):
+    return bool(name) and _CONTENT_NAME.match(name) is not None
+
+
+def _folder(upload_folder=None):
+    upload_folder = upload_folder or current_app.config['UPLOAD_FOLDER']
+    os.makedirs(upload_folder, exist_ok=True)
+    return upload_folder
+
+
+def _commit_file(tmp_path, digest, ext, upload_folder):
+    """Move a finished temp file to its content name, unless an identical
+    file is already there."""
+    name = f"{digest[:HASH_CHARS]}.{ext.lower()}"
+    path = os.path.join(upload_folder, name)
+    if os.path.exists(path):
+        os.remove(tmp_path)
+    else:
+        os.replace(tmp_path, path)
+    return name
+
+
+def store_stream(stream, ext, upload_folder=None):
+    """Copy a binary stream into UPLOAD_FOLDER, hashing as it goes.
+    Returns the content name. The caller still has to `acquire` it."""
+    upload_folder = _folder(upload_folder)
+    sha = hashlib.sha256()
+    # Same directory, so the final rename is atomic
+    fd, tmp_path = tempfile.mkstemp(prefix='.upload-', suffix='.tmp', dir=upload_folder)
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            while True:
+                chunk = stream.read(_CHUNK)
+                if not chunk:
+                    break
+                sha.update(chunk)
+                out.write(chunk)
+        return _commit_file(tmp_path, sha.hexdigest(), ext, upload_folder)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def store_bytes(data, ext, upload_folder=None):
+    """Like `store_stream` for bytes already in memory (renditions)."""
+    upload_folder = _folder(upload_folder)
+    fd, tmp_path = tempfile.mkstemp(prefix='.upload-', suffix='.tmp', dir=upload_folder)
+    with os.fdopen(fd, 'wb') as out:
+        out.write(data)
+    return _commit_file(tmp_path, hashlib.sha256(data).hexdigest(), ext, upload_folder)
+
+
+def save_upload(file_storage, upload_folder=None):
+    """Store a werkzeug FileStorage and take a reference to it.
+    Returns the content name to put on the item."""
+    ext = file_storage.filename.rsplit('.', 1)[1]
+    name = store_stream(file_storage.stream, ext, upload_folder)
+    acquire(name, upload_folder=upload_folder)
+    return name
+
+
+def acquire(*names, upload_folder=None):
+    """Count one more reference to each content-addressed name, in the
+    current transaction."""
+    from .extensions import db
+    from .models import StoredFile
+
+    for name in names:
+        if not is_content_addressed(name):
+            continue
+        bumped = db.session.execute(
+            update(StoredFile).where(StoredFile.name == name)
+            .values(refcount=StoredFile.refcount + 1)
+        ).rowcount
+        if bumped:
+            continue
+        size = os.path.getsize(os.path.join(_folder(upload_folder), name))
+        try:
+            with db.session.begin_nested():
+                db.session.add(StoredFile(name=name, size=size, refcount=1))
+        except IntegrityError:
+            # Someone else inserted it first
+            db.session.execute(
+                update(StoredFile).where(StoredFile.name == name)
+                .values(refcount=StoredFile.refcount + 1)
+            )
+
+
+def release(*names):
+    """Drop one reference to each name, in the current transaction.
+    Returns the names to hand to `purge` once the transaction commits."""
+    from .extensions import db
+    from .models import StoredFile
+
+    names = [name for name in names if name]
+    for name in names:
+        if is_content_addressed(name):
+            db.session.execute(
+                update(StoredFile)
+                .where(StoredFile.name == name, StoredFile.refcount > 0)
+                .values(refcount=StoredFile.refcount - 1)
+            )
+    return names
+
+
+def purge(names, upload_folder=None):
+    """Delete the files among `names` that no item references any more.
+    Call after the transaction that released them has committed."""
+    from .extensions import db
+    from .models import StoredFile
+
+    names = [name for name in names if name]
+    if not names:
+        return
+    upload_folder = upload_folder or current_app.config.get('UPLOAD_FOLDER')
+    if not upload_folder:
+        return
+
+    db.session.execute(
+        delete(StoredFile).where(StoredFile.name.in_(names), StoredFile.refcount <= 0)
+    )
+    db.session.commit()
+    still_used = set(db.session.scalars(
+        select(StoredFile.name).where(StoredFile.name.in_(names))
+    ))
+    for name in names:
+        path = os.path.join(upload_folder, name)
+        if name not in still_used and os.path.exists(path):
+            os.remove(path)
+
+
+def send_upload(name):
+    """Serve a file from UPLOAD_FOLDER with Range and conditional-GET
+    support. Content-addressed names never change, so they're cached for a
+    year with the hash as ETag."""
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    if not is_content_addressed(name):
+        return send_from_directory(upload_folder, name, max_age=LEGACY_MAX_AGE)
+
+    response = send_from_directory(upload_folder, name, max_age=IMMUTABLE_MAX_AGE,
+                                   etag=name.split('.', 1)[0])
+    response.cache_control.immutable = True
+    return response
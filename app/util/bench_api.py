@@ -0,0 +1,349 @@
+"""
+Load benchmark for the API endpoints, against a synthetic inventory.
+
+Usage:
+    cd /path/to/ember
+    python -m app.util.bench_api [--items 10000] [--requests 200] [--concurrency 1]
+                                 [--dim 1536] [--provider-ms 0] [--only search,items_feed]
+                                 [--out bench.json] [--compare previous.json]
+
+Seeds a throwaway SQLite database with `seed_synthetic` (app/util/init_db.py):
+random embeddings, so no provider is needed. Then each scenario below is
+driven through the Flask test client. Search gets a stub Dedalus client that
+returns deterministic vectors after `--provider-ms` of simulated latency.
+
+For every scenario it reports p50/p95/p99 latency, throughput, SQL
+statements per request and the process's peak RSS so far. Latency runs
+until the whole body has been read, so streamed feeds are timed completely.
+Statements are counted on the engine, which includes the ones that run
+while a response streams. The first request of each scenario (index
+builds, cold caches) is reported on its own as `cold_ms`.
+
+Results are written as JSON with the git commit they were measured at.
+`--compare` prints the change against an earlier run. Run one scale per
+process (1k / 10k / 100k), because peak RSS covers the whole process.
+Absolute numbers on Postgres behind gunicorn will differ. Use this to
+compare commits on the same machine.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from types import SimpleNamespace
+
+# Ensure project root is on sys.path
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, ROOT)
+
+SEARCH_QUERIES = ['water', 'drinking water', 'generator', 'need power for phone', 'first aid',
+                  'blankets', 'baby formula', 'canned food', 'shovel', 'tarp for roof',
+                  'lantern', 'bandages', 'rice', 'chainsaw', 'water filter']
+
+
+class _StubEmbeddings:
+    def __init__(self, dim, latency):
+        self.dim, self.latency = dim, latency
+
+    def create(self, input, model):
+        import numpy as np
+
+        if self.latency:
+            time.sleep(self.latency)
+        texts = input if isinstance(input, list) else [input]
+        data = []
+        for index, text in enumerate(texts):
+            seed = int.from_bytes(hashlib.sha256(text.encode('utf-8')).digest()[:8], 'little')
+            vector = np.random.default_rng(seed).standard_normal(self.dim)
+            data.append(SimpleNamespace(index=index, embedding=(vector / np.linalg.norm(vector)).tolist()))
+        return SimpleNamespace(data=data)
+
+
+class StubDedalus:
+    """Stands in for the Dedalus client: same text, same vector."""
+
+    def __init__(self, dim, latency=0.0):
+        self.embeddings = _StubEmbeddings(dim, latency)
+
+
+class StatementCounter:
+    """Per-thread count of statements sent to the database."""
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def __call__(self, *args):
+        self._local.count = getattr(self._local, 'count', 0) + 1
+
+    def take(self):
+        count = getattr(self._local, 'count', 0)
+        self._local.count = 0
+        return count
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process, or None where unsupported."""
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def git_commit():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=ROOT,
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return commit + ('-dirty' if dirty else '')
+
+
+def percentiles(timings):
+    if len(timings) < 2:
+        value = timings[0] if timings else 0.0
+        return value, value, value
+    cuts = statistics.quantiles(timings, n=100, method='inclusive')
+    return cuts[49], cuts[94], cuts[98]
+
+
+# --- scenarios: rng, context -> (method, path, client kwargs) ---
+
+def _viewport(rng, ctx):
+    from app.util.init_db import SYNTHETIC_CENTER, SYNTHETIC_SPREAD
+
+    # Roughly a neighbourhood at street zoom, ~1% of the seeded area
+    lat = SYNTHETIC_CENTER[0] + rng.uniform(-SYNTHETIC_SPREAD, SYNTHETIC_SPREAD) * 0.9
+    lng = SYNTHETIC_CENTER[1] + rng.uniform(-SYNTHETIC_SPREAD, SYNTHETIC_SPREAD) * 0.9
+    half = SYNTHETIC_SPREAD * 0.1
+    return 'GET', f'/api/items?bbox={lng - half},{lat - half},{lng + half},{lat + half}', {}
+
+
+def _search(rng, ctx):
+    return 'POST', '/api/search', {'json': {'query': rng.choice(SEARCH_QUERIES)}}
+
+
+def _create(rng, ctx):
+    from app.util.init_db import SYNTHETIC_CENTER, SYNTHETIC_ITEMS, SYNTHETIC_SPREAD
+
+    category = rng.choice(list(SYNTHETIC_ITEMS))
+    return 'POST', '/api/items', {'data': {
+        'item_name': rng.choice(SYNTHETIC_ITEMS[category]),
+        'item_desc': 'Benchmark listing.',
+        'category': category,
+        'quantity': str(rng.randint(1, 10)),
+        'address': 'Benchmark Ave',
+        'latitude': str(round(SYNTHETIC_CENTER[0] + rng.uniform(-SYNTHETIC_SPREAD, SYNTHETIC_SPREAD), 6)),
+        'longitude': str(round(SYNTHETIC_CENTER[1] + rng.uniform(-SYNTHETIC_SPREAD, SYNTHETIC_SPREAD), 6)),
+    }}
+
+
+def _update(rng, ctx):
+    return 'PUT', f"/api/items/{rng.choice(ctx['own_item_ids'])}", {'data': {
+        'item_desc': f'Updated by the benchmark ({rng.randint(1, 10**6)}).',
+        'quantity': str(rng.randint(1, 10)),
+    }}
+
+
+# Reads first, so the write scenarios don't change what they measure
+SCENARIOS = {
+    'locations': lambda rng, ctx: ('GET', '/api/locations', {}),
+    'items_feed': lambda rng, ctx: ('GET', '/api/items', {}),
+    'items_viewport': _viewport,
+    'my_items': lambda rng, ctx: ('GET', '/api/my-items', {}),
+    'search': _search,
+    'item_create': _create,
+    'item_update': _update,
+}
+
+
+def _client(app, user_id):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['_fresh'] = True
+    return client
+
+
+def run_scenario(app, name, ctx, n_requests, concurrency, counter, seed):
+    build = SCENARIOS[name]
+    local = threading.local()
+
+    def one(index):
+        if not hasattr(local, 'client'):
+            local.client = _client(app, ctx['user_id'])
+        method, path, kwargs = build(random.Random(f'{seed}-{name}-{index}'), ctx)
+        counter.take()
+        started = time.perf_counter()
+        response = local.client.open(path, method=method, **kwargs)
+        response.get_data()  # drain streamed bodies
+        elapsed = (time.perf_counter() - started) * 1000
+        response.close()
+        return elapsed, counter.take(), response.status_code
+
+    cold_ms, _, _ = one(-1)
+    started = time.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(concurrency) as pool:
+            results = list(pool.map(one, range(n_requests)))
+    else:
+        results = [one(i) for i in range(n_requests)]
+    wall = time.perf_counter() - started
+
+    timings = [r[0] for r in results]
+    statements = [r[1] for r in results]
+    p50, p95, p99 = percentiles(timings)
+    return {
+        'requests': n_requests,
+        'errors': sum(1 for r in results if r[2] >= 400),
+        'cold_ms': round(cold_ms, 2),
+        'mean_ms': round(statistics.mean(timings), 2),
+        'p50_ms': round(p50, 2),
+        'p95_ms': round(p95, 2),
+        'p99_ms': round(p99, 2),
+        'throughput_rps': round(n_requests / wall, 1) if wall else None,
+        'sql_mean': round(statistics.mean(statements), 2),
+        'sql_max': max(statements),
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def run(n_items, n_requests, concurrency, dim, provider_ms, only, seed):
+    """Seed a fresh database and time every scenario. Must be called before
+    anything else imports the app: the database URL is set from here."""
+    fd, path = tempfile.mkstemp(suffix='.db', prefix='ember-bench-')
+    os.close(fd)
+    os.environ['DATABASE_URL'] = 'sqlite:///' + path
+    os.environ['EMBEDDING_WORKER'] = 'off'  # created/updated items just queue jobs
+    os.environ['IMAGE_PIPELINE'] = 'off'
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+    try:
+        from sqlalchemy import event, select
+
+        from app import extensions
+        from app.extensions import db
+        from app.models import Item, User
+        from app.util.init_db import BENCH_USERNAME, app, seed_synthetic
+
+        with app.app_context():
+            db.create_all()  # no migration stamp: alembic's logging setup would replace ours
+        seeded = time.perf_counter()
+        seed_synthetic(n_items, dim=dim, seed=seed)
+        seed_seconds = time.perf_counter() - seeded
+        extensions._dedalus_client = StubDedalus(dim, provider_ms / 1000)
+
+        with app.app_context():
+            user_id = db.session.execute(select(User.id).where(User.username == BENCH_USERNAME)).scalar_one()
+            own = db.session.execute(select(Item.id).where(Item.user_id == user_id)).scalars().all()
+            counter = StatementCounter()
+            event.listen(db.engine, 'before_cursor_execute', counter)
+
+        ctx = {'user_id': user_id, 'own_item_ids': own}
+        scenarios = {}
+        for name in SCENARIOS:
+            if only and name not in only:
+                continue
+            print(f"{name}...", file=sys.stderr)
+            scenarios[name] = run_scenario(app, name, ctx, n_requests, concurrency, counter, seed)
+
+        return {
+            'commit': git_commit(),
+            'recorded_at': datetime.utcnow().isoformat() + 'Z',
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'database': 'sqlite',
+            'items': n_items,
+            'dim': dim,
+            'seed': seed,
+            'requests': n_requests,
+            'concurrency': concurrency,
+            'provider_ms': provider_ms,
+            'seed_seconds': round(seed_seconds, 2),
+            'peak_rss_mb': peak_rss_mb(),
+            'scenarios': scenarios,
+        }
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def print_results(results, previous=None):
+    print(f"\n{results['items']} items, {results['requests']} requests x {results['concurrency']} "
+          f"thread(s) at {results['commit'] or 'unknown commit'}; peak RSS {results['peak_rss_mb']} MB")
+    header = f"{'scenario':<16}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>10}{'sql':>8}{'cold ms':>10}{'errors':>8}"
+    print(header)
+    for name, stats in results['scenarios'].items():
+        print(f"{name:<16}{stats['p50_ms']:>10.2f}{stats['p95_ms']:>10.2f}{stats['p99_ms']:>10.2f}"
+              f"{stats['throughput_rps'] or 0:>10.1f}{stats['sql_mean']:>8.1f}{stats['cold_ms']:>10.2f}"
+              f"{stats['errors']:>8}")
+
+    if previous is None:
+        return
+    if (previous.get('items'), previous.get('dim')) != (results['items'], results['dim']):
+        print(f"\nwarning: comparing against a run with {previous.get('items')} items / "
+              f"dim {previous.get('dim')}")
+    print(f"\nchange vs {previous.get('commit') or 'previous run'} (negative is faster / fewer)")
+    print(f"{'scenario':<16}{'p50':>10}{'p95':>10}{'p99':>10}{'req/s':>10}{'sql':>8}")
+    for name, stats in results['scenarios'].items():
+        before = previous.get('scenarios', {}).get(name)
+        if before is None:
+            print(f"{name:<16}{'(new)':>10}")
+            continue
+        cells = []
+        for key in ('p50_ms', 'p95_ms', 'p99_ms', 'throughput_rps'):
+            old, new = before.get(key) or 0, stats.get(key) or 0
+            cells.append(f"{(new - old) / old * 100:>+9.1f}%" if old else f"{'n/a':>10}")
+        cells.append(f"{stats['sql_mean'] - before.get('sql_mean', 0):>+8.1f}")
+        print(f"{name:<16}" + ''.join(cells))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('--items', type=int, default=10_000, help='synthetic items to seed (default 10000)')
+    parser.add_argument('--requests', type=int, default=200, help='timed requests per scenario (default 200)')
+    parser.add_argument('--concurrency', type=int, default=1, help='client threads (default 1)')
+    parser.add_argument('--dim', type=int, default=1536, help='embedding dimensions (default 1536)')
+    parser.add_argument('--provider-ms', type=float, default=0.0,
+                        help='simulated Dedalus latency per call (default 0)')
+    parser.add_argument('--only', default='', help=f"comma-separated subset of: {', '.join(SCENARIOS)}")
+    parser.add_argument('--seed', type=int, default=7, help='data and request seed (default 7)')
+    parser.add_argument('--out', help='write the results to this JSON file')
+    parser.add_argument('--compare', help='JSON file from an earlier run to compare against')
+    args = parser.parse_args()
+
+    only = {name for name in args.only.split(',') if name}
+    unknown = only - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenario(s): {', '.join(sorted(unknown))}")
+
+    results = run(args.items, args.requests, max(1, args.concurrency), args.dim, args.provider_ms, only, args.seed)
+
+    previous = None
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+    print_results(results, previous)
+
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nresults written to {args.out}")
+
+
+if __name__ == '__main__':
+    main()
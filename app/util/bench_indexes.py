@@ -0,0 +1,193 @@
+"""
+Before/after benchmark for the hot-path indexes (migration c52e7f19a4b8).
+
+Usage:
+    cd /path/to/ember
+    python -m app.util.bench_indexes [--items 100000] [--runs 200]
+
+Builds two throwaway SQLite databases with the same synthetic dataset
+(100k items by default) — one with the schema as it was before the index
+migration, one with the current models — and times the lookups the routes
+run on every request. Prints one row per query with the mean latency in
+each schema, then the same numbers as JSON.
+
+Your real database is never touched. Absolute numbers on Postgres will
+differ, but the plans (full scan vs. index seek) are the same.
+"""
+
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+# Ensure project root is on sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from sqlalchemy import MetaData, create_engine, text
+
+from app.extensions import db
+from app import models  # noqa: F401 -- registers the tables on db.metadata
+
+# Indexes / constraints added by the hot-path migration
+NEW_INDEXES = {'ix_item_user_id', 'ix_item_location_id', 'ix_item_available_location',
+               'ix_saved_location_user_point'}
+NEW_CONSTRAINTS = {'uq_location_lat_lng'}
+
+CATEGORIES = ['Water', 'Food', 'Power', 'Tools', 'Medical']
+CENTER = (40.44, -79.99)  # Pittsburgh
+SPREAD = 0.25  # degrees either side of CENTER
+
+QUERIES = {
+    # create_item / update_item / delete_saved_location
+    'location_by_point': (
+        "SELECT id FROM location WHERE latitude = :lat AND longitude = :lng LIMIT 1"
+    ),
+    # /api/my-items
+    'items_by_owner': (
+        "SELECT id, version FROM item WHERE user_id = :user_id"
+    ),
+    # /api/items?bbox= (~1% of the area)
+    'viewport_feed': (
+        "SELECT item.id, item.version FROM item JOIN location ON item.location_id = location.id "
+        "WHERE item.is_available = 1 "
+        "AND location.latitude BETWEEN :min_lat AND :max_lat "
+        "AND location.longitude BETWEEN :min_lng AND :max_lng"
+    ),
+    # location cascade delete / items at a pin
+    'items_at_location': (
+        "SELECT id FROM item WHERE location_id = :location_id"
+    ),
+    # User.add_saved_location
+    'saved_location_by_point': (
+        "SELECT id FROM saved_location WHERE user_id = :user_id "
+        "AND latitude = :lat AND longitude = :lng LIMIT 1"
+    ),
+}
+
+
+def _metadata(with_new_indexes):
+    metadata = MetaData()
+    for table in db.metadata.sorted_tables:
+        table.to_metadata(metadata)
+    if not with_new_indexes:
+        for table in metadata.tables.values():
+            for index in [i for i in table.indexes if i.name in NEW_INDEXES]:
+                table.indexes.discard(index)
+            for constraint in [c for c in table.constraints if c.name in NEW_CONSTRAINTS]:
+                table.constraints.discard(constraint)
+    return metadata
+
+
+def _dataset(n_items, seed=7):
+    rng = random.Random(seed)
+    n_users = max(1, n_items // 50)
+    n_locations = max(1, n_items // 5)
+
+    users = [{'id': i + 1, 'username': f'user{i + 1}', 'password_hash': 'x'} for i in range(n_users)]
+    categories = [{'id': i + 1, 'name': name} for i, name in enumerate(CATEGORIES)]
+
+    points = set()
+    while len(points) < n_locations:
+        points.add((round(CENTER[0] + rng.uniform(-SPREAD, SPREAD), 6),
+                    round(CENTER[1] + rng.uniform(-SPREAD, SPREAD), 6)))
+    locations = [{'id': i + 1, 'name': None, 'address': f'{i + 1} Main St', 'latitude': lat, 'longitude': lng}
+                 for i, (lat, lng) in enumerate(sorted(points))]
+
+    items = [{
+        'id': i + 1,
+        'user_id': rng.randint(1, n_users),
+        'item_name': f'item {i + 1}',
+        'category_id': rng.randint(1, len(CATEGORIES)),
+        'location_id': rng.randint(1, n_locations),
+        'is_available': rng.random() < 0.7,
+        'version': i + 1,
+        'created_version': i + 1,
+    } for i in range(n_items)]
+
+    saved = []
+    for i in range(n_users * 2):
+        loc = locations[rng.randrange(n_locations)]
+        saved.append({'id': i + 1, 'user_id': rng.randint(1, n_users), 'name': 'Home', 'address': loc['address'],
+                      'latitude': loc['latitude'], 'longitude': loc['longitude']})
+
+    return {'user': users, 'category': categories, 'location': locations, 'item': items, 'saved_location': saved}
+
+
+def _params(name, data, rng):
+    if name in ('location_by_point',):
+        loc = rng.choice(data['location'])
+        return {'lat': loc['latitude'], 'lng': loc['longitude']}
+    if name == 'items_by_owner':
+        return {'user_id': rng.choice(data['user'])['id']}
+    if name == 'viewport_feed':
+        lat = CENTER[0] + rng.uniform(-SPREAD, SPREAD) * 0.9
+        lng = CENTER[1] + rng.uniform(-SPREAD, SPREAD) * 0.9
+        half = SPREAD * 0.1
+        return {'min_lat': lat - half, 'max_lat': lat + half, 'min_lng': lng - half, 'max_lng': lng + half}
+    if name == 'items_at_location':
+        return {'location_id': rng.choice(data['location'])['id']}
+    if name == 'saved_location_by_point':
+        saved = rng.choice(data['saved_location'])
+        return {'user_id': saved['user_id'], 'lat': saved['latitude'], 'lng': saved['longitude']}
+    raise KeyError(name)
+
+
+def run_schema(with_new_indexes, data, runs):
+    """Time every query against a fresh database. Returns {query: mean_ms}."""
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    try:
+        engine = create_engine('sqlite:///' + path)
+        metadata = _metadata(with_new_indexes)
+        metadata.create_all(engine)
+        with engine.begin() as conn:
+            for table in metadata.sorted_tables:
+                if data.get(table.name):
+                    conn.execute(table.insert(), data[table.name])
+            conn.execute(text('ANALYZE'))
+
+        results = {}
+        with engine.connect() as conn:
+            for name, sql in QUERIES.items():
+                rng = random.Random(name)
+                statement = text(sql)
+                timings = []
+                for _ in range(runs):
+                    params = _params(name, data, rng)
+                    start = time.perf_counter()
+                    conn.execute(statement, params).fetchall()
+                    timings.append((time.perf_counter() - start) * 1000)
+                results[name] = round(statistics.mean(timings), 3)
+        engine.dispose()
+        return results
+    finally:
+        os.remove(path)
+
+
+def main():
+    n_items = 100_000
+    runs = 200
+    if '--items' in sys.argv:
+        n_items = int(sys.argv[sys.argv.index('--items') + 1])
+    if '--runs' in sys.argv:
+        runs = int(sys.argv[sys.argv.index('--runs') + 1])
+
+    print(f"Generating {n_items} synthetic items...")
+    data = _dataset(n_items)
+
+    before = run_schema(False, data, runs)
+    after = run_schema(True, data, runs)
+
+    print(f"\n{'query':<26}{'before ms':>12}{'after ms':>12}{'speedup':>10}")
+    for name in QUERIES:
+        speedup = before[name] / after[name] if after[name] else float('inf')
+        print(f"{name:<26}{before[name]:>12.3f}{after[name]:>12.3f}{speedup:>9.1f}x")
+
+    print(json.dumps({'items': n_items, 'runs': runs, 'before_ms': before, 'after_ms': after}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -4,10 +4,20 @@ Batch-embed all existing items using Dedalus Labs embeddings API.
 Usage:
     cd /path/to/ember
     python -m app.util.embed_items
+    python -m app.util.embed_items --migrate [--dtype float16]
 
 This will compute and store an embedding vector for every Item that
 doesn't already have one. Safe to re-run — it skips items that
-already have embeddings unless --force is passed.
+already have embeddings. --force also re-embeds items whose embedded
+text (name, category, description) or model changed since their vector
+was computed; unchanged items are never sent to the API.
+
+--migrate converts vectors stored in the legacy JSON-text `embedding`
+column into packed binary (see app/embeddings.py), adding the new columns
+first if the table predates them. Rows already packed with a different
+dtype are re-packed. No API calls are made. The app itself maps the new
+columns on every item query, so run `flask db upgrade` before deploying;
+this command only converts the data.
 """
 
 import json
@@ -20,33 +30,97 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..',
 from dotenv import load_dotenv
 load_dotenv()
 
+from sqlalchemy import inspect, text, update
+
 from app import app
+from app.embeddings import (
+    EMBEDDING_MODEL, DEFAULT_DTYPE, SUPPORTED_DTYPES,
+    embed_texts, item_text, needs_embedding, pack_vector, text_hash, unpack_vector,
+)
 from app.extensions import db, get_dedalus_client
 from app.models import Item
 
-EMBEDDING_MODEL = "openai/text-embedding-3-small"
 BATCH_SIZE = 64  # Dedalus supports up to 2048 inputs per request
+MIGRATE_CHUNK_SIZE = 500  # rows converted per UPDATE batch / commit
+
+# Columns added alongside the legacy `embedding` text column
+BINARY_COLUMNS = {
+    'embedding_vec': 'BLOB',
+    'embedding_dim': 'INTEGER',
+    'embedding_dtype': 'VARCHAR(8)',
+    'embedding_model': 'VARCHAR(100)',
+    'embedding_text_hash': 'VARCHAR(64)',
+}
+
+
+def ensure_binary_columns():
+    """Add the binary embedding columns to an existing `item` table."""
+    existing = {col['name'] for col in inspect(db.engine).get_columns('item')}
+    blob_type = 'BYTEA' if db.engine.dialect.name == 'postgresql' else 'BLOB'
 
+    with db.engine.begin() as conn:
+        for name, col_type in BINARY_COLUMNS.items():
+            if name not in existing:
+                col_type = blob_type if col_type == 'BLOB' else col_type
+                conn.execute(text(f'ALTER TABLE item ADD COLUMN {name} {col_type}'))
+                print(f"  Added column item.{name}")
 
-def item_text(item):
-    """Build the text string that gets embedded for an item."""
-    parts = [item.item_name or ""]
-    if item.category:
-        parts.append(item.category.name)
-    if item.item_desc:
-        parts.append(item.item_desc)
-    return " — ".join(parts)
 
+def migrate(dtype=DEFAULT_DTYPE):
+    """Convert JSON-text and differently-packed embeddings to `dtype` bytes."""
+    with app.app_context():
+        ensure_binary_columns()
+
+        converted = 0
+        last_id = 0
+        while True:
+            # Keyset pagination keeps each chunk's fetch bounded
+            rows = db.session.query(
+                Item.id, Item.embedding, Item.embedding_dtype, Item.embedding_model,
+                Item.embedding_json,
+            ).filter(
+                Item.id > last_id,
+                (Item.embedding_json != None) |
+                ((Item.embedding != None) &
+                 ((Item.embedding_dtype != dtype) | Item.embedding_dtype.is_(None))),
+            ).order_by(Item.id).limit(MIGRATE_CHUNK_SIZE).all()
+
+            if not rows:
+                break
+
+            updates = []
+            for item_id, blob, blob_dtype, model, legacy_json in rows:
+                if blob:
+                    vec = unpack_vector(blob, blob_dtype)
+                else:
+                    try:
+                        vec = json.loads(legacy_json)
+                    except (json.JSONDecodeError, TypeError):
+                        vec = None
+
+                if vec is None or len(vec) == 0:
+                    updates.append({'id': item_id, 'embedding_json': None})
+                    continue
+
+                packed, dim, packed_dtype = pack_vector(vec, dtype)
+                updates.append({
+                    'id': item_id,
+                    'embedding': packed,
+                    'embedding_dim': dim,
+                    'embedding_dtype': packed_dtype,
+                    'embedding_model': model or EMBEDDING_MODEL,
+                    'embedding_json': None,
+                })
+
+            # Bulk UPDATE by primary key (executemany)
+            db.session.execute(update(Item), updates)
+            db.session.commit()
+
+            converted += len(updates)
+            last_id = rows[-1][0]
+            print(f"  Converted {converted} rows")
 
-def embed_texts(client, texts):
-    """Call Dedalus embeddings API for a batch of texts. Returns list of vectors."""
-    response = client.embeddings.create(
-        input=texts,
-        model=EMBEDDING_MODEL,
-    )
-    # Sort by index to preserve order
-    sorted_data = sorted(response.data, key=lambda d: d.index)
-    return [d.embedding for d in sorted_data]
+        print(f"Done! {converted} embeddings stored as {dtype}.")
 
 
 def main(force=False):
@@ -57,14 +131,16 @@ def main(force=False):
 
     with app.app_context():
         if force:
-            items = Item.query.all()
+            # Re-embed only items whose text (or model) changed since their
+            # vector was computed
+            items = [it for it in Item.query.all() if needs_embedding(it)]
         else:
             items = Item.query.filter(
-                (Item.embedding == None) | (Item.embedding == '')
+                (Item.embedding == None) & (Item.embedding_json == None)
             ).all()
 
         if not items:
-            print("All items already have embeddings. Use --force to re-embed.")
+            print("All items already have up-to-date embeddings.")
             return
 
         print(f"Embedding {len(items)} items...")
@@ -74,8 +150,8 @@ def main(force=False):
             texts = [item_text(it) for it in batch]
             vectors = embed_texts(client, texts)
 
-            for item, vec in zip(batch, vectors):
-                item.embedding = json.dumps(vec)
+            for item, text, vec in zip(batch, texts, vectors):
+                item.set_embedding(vec, EMBEDDING_MODEL, text_hash(text))
 
             db.session.commit()
             print(f"  Batch {i // BATCH_SIZE + 1}: embedded {len(batch)} items")
@@ -84,5 +160,14 @@ def main(force=False):
 
 
 if __name__ == "__main__":
-    force = "--force" in sys.argv
-    main(force=force)
+    if "--migrate" in sys.argv:
+        dtype = DEFAULT_DTYPE
+        if "--dtype" in sys.argv:
+            dtype = sys.argv[sys.argv.index("--dtype") + 1]
+        if dtype not in SUPPORTED_DTYPES:
+            print(f"ERROR: --dtype must be one of {', '.join(SUPPORTED_DTYPES)}")
+            sys.exit(1)
+        migrate(dtype=dtype)
+    else:
+        force = "--force" in sys.argv
+        main(force=force)
@@ -0,0 +1,333 @@
+"""
+Bulk import of item listings from CSV or JSON, e.g. a relief agency's
+spreadsheet of donations.
+
+Usage:
+    cd /path/to/ember
+    flask import-items FILE --owner USERNAME [--chunk-size 1000] [--format csv|json|jsonl]
+    python -m app.util.import_items [same arguments]
+
+Each record (a CSV row with a header line, or a JSON object, as an array
+or one per line) needs `item_name`, `address`, `latitude` and
+`longitude`. It may also have `category` (default "Other"), `item_desc`,
+`quantity`, `is_borrow`, `pickup_instructions` and `location_name`. All
+items are listed under the --owner account. Invalid records are
+reported and skipped.
+
+The input is streamed and written in chunks. Each chunk is one transaction:
+locations are de-duplicated by coordinate (rounded to 6 decimals) against
+the database and the rest of the file, then items and their embedding jobs
+are bulk-inserted. Embeddings are not computed here. The jobs are picked up
+in batches by the embedding worker or `flask embed-pending`.
+
+Imports are restartable. Progress is stored per input file (keyed by
+its content hash) in the same transaction as each chunk, so running the
+command again after a failure continues from the last committed chunk.
+Running it on a finished file does nothing. An edited file counts as a
+new import.
+"""
+
+import csv
+import hashlib
+import json
+import os
+import re
+from contextlib import nullcontext
+from datetime import datetime
+
+import click
+from flask import has_app_context
+
+DEFAULT_CHUNK_SIZE = 1000
+DEFAULT_CATEGORY = 'Other'
+COORDINATE_DECIMALS = 6  # ~0.1m; points closer than this share a Location
+
+_TRUE = {'1', 'true', 'yes', 'y', 't'}
+_WHITESPACE = re.compile(r'[\s,]*')
+
+
+class InvalidRecord(ValueError):
+    pass
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _csv_records(f):
+    yield from csv.DictReader(f)
+
+
+def _jsonl_records(f):
+    for line in f:
+        if line.strip():
+            yield json.loads(line)
+
+
+def _json_array_records(f, read_size=64 * 1024):
+    """Objects from a top-level JSON array, without loading the whole file."""
+    decoder = json.JSONDecoder()
+    buffer = f.read(read_size).lstrip()
+    if not buffer.startswith('['):
+        raise click.ClickException('JSON input must be an array of objects (use .jsonl for one per line)')
+    pos, eof = 1, False
+    while True:
+        pos = _WHITESPACE.match(buffer, pos).end()
+        if buffer.startswith(']', pos):
+            return
+        try:
+            record, pos = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise click.ClickException('malformed JSON input')
+            more = f.read(read_size)
+            eof = not more
+            buffer = buffer[pos:] + more
+            pos = 0
+            continue
+        yield record
+
+
+def read_records(path, fmt):
+    """Stream the records in `path` as dicts."""
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        if fmt == 'csv':
+            yield from _csv_records(f)
+        elif fmt == 'jsonl':
+            yield from _jsonl_records(f)
+        else:
+            yield from _json_array_records(f)
+
+
+def parse_record(record):
+    """Normalize one input record. Raises InvalidRecord."""
+    if not isinstance(record, dict):
+        raise InvalidRecord('not an object')
+
+    def text(key, limit=None):
+        value = record.get(key)
+        value = str(value).strip() if value is not None else ''
+        if limit and len(value) > limit:
+            raise InvalidRecord(f'{key} is longer than {limit} characters')
+        return value or None
+
+    item_name = text('item_name', 100)
+    address = text('address', 100)
+    if not item_name or not address:
+        raise InvalidRecord('item_name and address are required')
+    try:
+        latitude = round(float(record.get('latitude')), COORDINATE_DECIMALS)
+        longitude = round(float(record.get('longitude')), COORDINATE_DECIMALS)
+    except (TypeError, ValueError):
+        raise InvalidRecord('latitude and longitude must be numbers')
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        raise InvalidRecord('coordinates out of range')
+    try:
+        quantity = int(record.get('quantity') or 1)
+    except (TypeError, ValueError):
+        raise InvalidRecord('quantity must be an integer')
+
+    return {
+        'item_name': item_name,
+        'item_desc': text('item_desc'),
+        'category': text('category', 50) or DEFAULT_CATEGORY,
+        'quantity': quantity,
+        'is_borrow': str(record.get('is_borrow', '')).strip().lower() in _TRUE,
+        'pickup_instructions': text('pickup_instructions'),
+        'location_name': text('location_name', 100),
+        'address': address,
+        'latitude': latitude,
+        'longitude': longitude,
+    }
+
+
+class Importer:
+    """Writes parsed records chunk by chunk. Category and location ids are
+    remembered across chunks, so each point is looked up once."""
+
+    def __init__(self, owner_id):
+        from sqlalchemy import select
+        from ..extensions import db
+        from ..models import Category
+
+        self.owner_id = owner_id
+        self.categories = dict(db.session.execute(select(Category.name, Category.id)).all())
+        self.locations = {}  # (lat, lng) -> id
+
+    def _category_ids(self, names):
+        from sqlalchemy import insert, select
+        from ..extensions import db
+        from ..models import Category
+
+        missing = sorted(set(names) - set(self.categories))
+        if missing:
+            db.session.execute(insert(Category), [{'name': name} for name in missing])
+            self.categories.update(db.session.execute(
+                select(Category.name, Category.id).where(Category.name.in_(missing))).all())
+
+    def _location_ids(self, records):
+        from sqlalchemy import insert, select, tuple_
+        from ..extensions import db
+        from ..models import Location
+
+        wanted = {}
+        for record in records:
+            point = (record['latitude'], record['longitude'])
+            if point not in self.locations:
+                wanted.setdefault(point, record)
+        if not wanted:
+            return
+
+        def lookup(points):
+            self.locations.update(
+                ((lat, lng), location_id) for location_id, lat, lng in db.session.execute(
+                    select(Location.id, Location.latitude, Location.longitude)
+                    .where(tuple_(Location.latitude, Location.longitude).in_(points))))
+
+        lookup(list(wanted))
+        new = [point for point in wanted if point not in self.locations]
+        if new:
+            db.session.execute(insert(Location), [{
+                'name': wanted[point]['location_name'],
+                'address': wanted[point]['address'],
+                'latitude': point[0],
+                'longitude': point[1],
+            } for point in new])
+            lookup(new)
+
+    def write(self, records):
+        """Insert one chunk of parsed records plus their embedding jobs.
+        Does not commit. Returns the new item ids."""
+        from sqlalchemy import insert
+        from .. import inventory
+        from ..extensions import db
+        from ..models import EmbeddingJob, Item
+        from ..routes.items import get_category_icon
+
+        if not records:
+            return []
+        self._category_ids(record['category'] for record in records)
+        self._location_ids(records)
+
+        version = inventory.next_version()
+        item_ids = db.session.execute(insert(Item).returning(Item.id), [{
+            'user_id': self.owner_id,
+            'item_name': record['item_name'],
+            'item_desc': record['item_desc'],
+            'is_borrow': record['is_borrow'],
+            'quantity': record['quantity'],
+            'category_id': self.categories[record['category']],
+            'location_id': self.locations[(record['latitude'], record['longitude'])],
+            'pickup_instructions': record['pickup_instructions'],
+            'picture': get_category_icon(record['category']),
+            'is_available': True,
+            'version': version,
+            'created_version': version,
+        } for record in records]).scalars().all()
+
+        # One queued job per item; the embedding worker drains them in batches
+        now = datetime.utcnow()
+        db.session.execute(insert(EmbeddingJob), [
+            {'item_id': item_id, 'enqueued_at': now, 'attempts': 0} for item_id in item_ids])
+        return item_ids
+
+
+def import_file(path, owner, fmt=None, chunk_size=DEFAULT_CHUNK_SIZE, echo=click.echo):
+    """Import `path` as items owned by the username `owner`. Must run
+    inside an app context. Returns the ImportProgress row."""
+    from ..extensions import db
+    from ..models import ImportProgress, User
+    from .. import inventory
+
+    fmt = fmt or _format_for(path)
+    owner_user = User.query.filter_by(username=owner).first()
+    if owner_user is None:
+        raise click.ClickException(f'no user named {owner!r}')
+
+    source = file_sha256(path)
+    progress = db.session.get(ImportProgress, source)
+    if progress is not None and progress.finished_at is not None:
+        echo(f'{path} was already imported on {progress.finished_at:%Y-%m-%d %H:%M} '
+             f'({progress.items_created} items)')
+        return progress
+    if progress is None:
+        progress = ImportProgress(source=source, filename=os.path.basename(path)[:255],
+                                  rows_done=0, items_created=0)
+        db.session.add(progress)
+        db.session.commit()
+    elif progress.rows_done:
+        echo(f'resuming after record {progress.rows_done}')
+
+    importer = Importer(owner_user.id)
+    skipped = 0
+    chunk, row = [], 0
+
+    def flush():
+        item_ids = importer.write(chunk)
+        progress.rows_done = row
+        progress.items_created += len(item_ids)
+        progress.updated_at = datetime.utcnow()
+        db.session.commit()
+        chunk.clear()
+        echo(f'{progress.rows_done} records read, {progress.items_created} items created')
+
+    try:
+        for row, record in enumerate(read_records(path, fmt), start=1):
+            if row <= progress.rows_done:
+                continue
+            try:
+                chunk.append(parse_record(record))
+            except InvalidRecord as e:
+                skipped += 1
+                echo(f'record {row}: skipped, {e}', err=True)
+            if len(chunk) >= chunk_size:
+                flush()
+        flush()
+    except Exception:
+        db.session.rollback()
+        raise
+    finally:
+        # Whatever was committed is visible now; drop this process's caches
+        inventory.inventory_changed()
+
+    progress.finished_at = datetime.utcnow()
+    db.session.commit()
+    echo(f'done: {progress.items_created} items from {progress.rows_done} records'
+         + (f', {skipped} skipped' if skipped else '')
+         + '. Embeddings are queued; run `flask embed-pending` or let the worker pick them up.')
+    return progress
+
+
+def _format_for(path):
+    ext = os.path.splitext(path)[1].lower()
+    if ext in ('.jsonl', '.ndjson'):
+        return 'jsonl'
+    if ext == '.json':
+        return 'json'
+    return 'csv'
+
+
+@click.command('import-items')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--owner', required=True, help='Username the items are listed under.')
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'json', 'jsonl']), default=None,
+              help='Input format (default: from the file extension).')
+@click.option('--chunk-size', default=DEFAULT_CHUNK_SIZE, show_default=True,
+              help='Records per transaction.')
+def import_items_command(path, owner, fmt, chunk_size):
+    """Bulk-import item listings from a CSV or JSON file."""
+    if has_app_context():
+        context = nullcontext()
+    else:  # python -m app.util.import_items
+        from app import app
+        context = app.app_context()
+    with context:
+        import_file(path, owner, fmt=fmt, chunk_size=max(1, chunk_size))
+
+
+if __name__ == '__main__':
+    import_items_command()
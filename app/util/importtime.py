@@ -0,0 +1,81 @@
+"""
+Import-time profile of the serverless entry point.
+
+Usage:
+    cd /path/to/ember
+    flask importtime [--module api.index] [--top 25] [--budget-ms 800] [--json]
+    python -m app.util.importtime [same options]
+
+Imports the module in a fresh interpreter under `python -X importtime`
+(the same work a cold start does), then prints the total and the
+slowest imports by cumulative time. With --budget-ms the command exits
+non-zero when the total goes over budget, so CI can track the cold-start
+cost.
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+import click
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+
+def profile_imports(module):
+    """Import `module` in a new interpreter. Returns (total_us, rows) where
+    rows are (self_us, cumulative_us, depth, name) in import order."""
+    env = dict(os.environ, EMBEDDING_WORKER='off')  # don't start threads while profiling
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=ROOT, env=env, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise click.ClickException(f"importing {module} failed:\n{proc.stderr[-2000:]}")
+
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((int(self_us), int(cumulative_us), depth, name.strip()))
+
+    # Top-level imports (depth 0 after the leading space) add up to the total
+    top_level = min((depth for _, _, depth, _ in rows), default=0)
+    total = sum(cumulative for _, cumulative, depth, _ in rows if depth == top_level)
+    return total, rows
+
+
+@click.command('importtime')
+@click.option('--module', default='api.index', show_default=True, help='Module to import.')
+@click.option('--top', default=25, show_default=True, help='Number of slowest imports to list.')
+@click.option('--budget-ms', type=float, default=None, help='Fail when the total exceeds this.')
+@click.option('--json', 'as_json', is_flag=True, help='Print the report as JSON.')
+def importtime_command(module, top, budget_ms, as_json):
+    """Profile the import time of the serverless entry point."""
+    total_us, rows = profile_imports(module)
+    slowest = sorted(rows, key=lambda row: row[1], reverse=True)[:top]
+
+    if as_json:
+        click.echo(json.dumps({
+            'module': module,
+            'total_ms': round(total_us / 1000, 1),
+            'budget_ms': budget_ms,
+            'slowest': [{'module': name, 'cumulative_ms': round(cumulative / 1000, 1),
+                         'self_ms': round(self_us / 1000, 1)}
+                        for self_us, cumulative, _, name in slowest],
+        }, indent=2))
+    else:
+        click.echo(f"import {module}: {total_us / 1000:.1f} ms total")
+        click.echo(f"{'cumulative ms':>14}{'self ms':>10}  module")
+        for self_us, cumulative, _, name in slowest:
+            click.echo(f"{cumulative / 1000:>14.1f}{self_us / 1000:>10.1f}  {name}")
+
+    if budget_ms is not None and total_us / 1000 > budget_ms:
+        raise click.ClickException(f"import time {total_us / 1000:.1f} ms is over the {budget_ms:.0f} ms budget")
+
+
+if __name__ == '__main__':
+    importtime_command()
@@ -1,7 +1,28 @@
+import random
+import sys
+from types import SimpleNamespace
+
+from flask_migrate import stamp
+from sqlalchemy import insert, select
+from werkzeug.security import generate_password_hash
+
 from app import app
-from ..extensions import db
+from ..extensions import db, init_migrate
 from ..models import User, Item, Location, Category
 
+# Synthetic data (seed_synthetic), also used by app/util/bench_api.py
+SYNTHETIC_CENTER = (40.44, -79.99)  # Pittsburgh
+SYNTHETIC_SPREAD = 0.25  # degrees either side of the center
+SYNTHETIC_ITEMS = {
+    'Water': ['Bottled Water', 'Water Filter', 'Water Jug', 'Purification Tablets'],
+    'Food': ['Canned Goods', 'Baby Formula', 'Rice', 'Granola Bars'],
+    'Power': ['Portable Generator', 'Solar Charger', 'Lantern', 'Extension Cord'],
+    'Tools': ['Snow Shovel', 'Crowbar', 'Chainsaw', 'Tarp'],
+    'Medical': ['First Aid Kit', 'Thermal Blankets', 'Bandages', 'Pain Relievers'],
+}
+BENCH_USERNAME = 'bench'
+BENCH_PASSWORD = 'bench'
+
 
 def create_db():
     with app.app_context():
@@ -9,13 +30,22 @@ def create_db():
         # nullable=False and field length changes!
         db.drop_all() 
         db.create_all()
+        # create_all() already built the current schema; record that so
+        # `flask db upgrade` only applies migrations added after today
+        init_migrate(app)
+        stamp()
         print('database initialized in site.db')
 
 
 def seed_all():
+    """Seed the demo user, categories, locations and items. Safe to run
+    again: rows that already exist are reused instead of re-created."""
+    from .. import embedding_queue, inventory
+
     with app.app_context():
         # 1. seed admin user
-        if not User.query.filter_by(username='pete').first():
+        admin = User.query.filter_by(username='pete').first()
+        if not admin:
             admin = User(username='pete', phone_number='800-123-4567')
             admin.set_password('boilerup')
 
@@ -27,7 +57,8 @@ def seed_all():
         cat_objs = {}
 
         for name in categories:
-            if not Category.query.filter_by(name=name).first():
+            cat = Category.query.filter_by(name=name).first()
+            if not cat:
                 cat = Category(name=name)
                 db.session.add(cat)
 
@@ -46,10 +77,7 @@ def seed_all():
         loc_objs = []
 
         for loc in loc_data:
-            if not Location.query.filter_by(address=loc['address']).first():
-                location = Location(name=loc['name'], address=loc['address'], latitude=loc['lat'], longitude=loc['lon'])
-                db.session.add(location)
-
+            location = Location.get_or_create(loc['lat'], loc['lon'], loc['address'], name=loc['name'])
             loc_objs.append(location)
 
         db.session.commit()
@@ -70,7 +98,10 @@ def seed_all():
             ('Thermal Blankets', 'Medical', loc_objs[3], 5)
         ]
 
+        new_items = []
         for name, cat_name, loc_obj, qty in item_list:
+            if Item.query.filter_by(item_name=name, location_id=loc_obj.id, user_id=admin.id).first():
+                continue
             item = Item(
                 item_name=name,
                 item_desc=f'Essential {cat_name} gear for neighbors.',
@@ -80,12 +111,120 @@ def seed_all():
                 location_id=loc_obj.id,
                 pickup_instructions='Available on the front porch. Text via app before arriving.'
             )
-            db.session.add(item)
-        
+            new_items.append(item)
+
+        db.session.add_all(new_items)
+        db.session.flush()  # ids for the embedding jobs
+        inventory.mark_changed(*new_items)
+        for item in new_items:
+            embedding_queue.enqueue(item)
         db.session.commit()
-        print('database seeded with default values')
+        inventory.inventory_changed()
+        print(f'database seeded with default values ({len(new_items)} new items)')
+
+
+def seed_synthetic(n_items, dim=1536, seed=7, chunk_size=2000):
+    """Fill an empty database with `n_items` synthetic listings around
+    Pittsburgh, each with a random unit-length embedding so search works
+    without a provider. One user per 50 items (the first is
+    BENCH_USERNAME / BENCH_PASSWORD) and one location per 5 items.
+
+    Rows go in with bulk inserts, committed every `chunk_size` items. The
+    same `seed` always produces the same data. Returns the row counts."""
+    import numpy as np
+    from .. import inventory
+    from ..embeddings import EMBEDDING_MODEL, item_text, pack_vector, text_hash
+    from ..routes.items import get_category_icon
+
+    rng = random.Random(seed)
+    vectors = np.random.default_rng(seed)
+    n_users = max(1, n_items // 50)
+    n_locations = max(1, n_items // 5)
+
+    with app.app_context():
+        if db.session.execute(select(Item.id).limit(1)).first() is not None:
+            raise RuntimeError('seed_synthetic needs an empty item table; run create_db() first')
+
+        # Hashing is deliberately slow, so every synthetic user shares one
+        password_hash = generate_password_hash(BENCH_PASSWORD)
+        first_user = (db.session.execute(select(db.func.max(User.id))).scalar() or 0) + 1
+        db.session.execute(insert(User), [
+            {'username': BENCH_USERNAME if i == 0 else f'neighbor{first_user + i}',
+             'password_hash': password_hash}
+            for i in range(n_users)
+        ])
+        user_ids = db.session.execute(select(User.id).where(User.id >= first_user)).scalars().all()
+
+        existing = set(db.session.execute(select(Category.name)).scalars())
+        missing = [{'name': name} for name in SYNTHETIC_ITEMS if name not in existing]
+        if missing:
+            db.session.execute(insert(Category), missing)
+        category_ids = dict(db.session.execute(
+            select(Category.name, Category.id).where(Category.name.in_(list(SYNTHETIC_ITEMS)))).all())
+
+        # Location points are unique (uq_location_lat_lng)
+        taken = set(db.session.execute(select(Location.latitude, Location.longitude)).all())
+        points = []
+        while len(points) < n_locations:
+            point = (round(SYNTHETIC_CENTER[0] + rng.uniform(-SYNTHETIC_SPREAD, SYNTHETIC_SPREAD), 6),
+                     round(SYNTHETIC_CENTER[1] + rng.uniform(-SYNTHETIC_SPREAD, SYNTHETIC_SPREAD), 6))
+            if point not in taken:
+                taken.add(point)
+                points.append(point)
+        first_location = (db.session.execute(select(db.func.max(Location.id))).scalar() or 0) + 1
+        db.session.execute(insert(Location), [
+            {'name': None, 'address': f'{i + 1} Synthetic St', 'latitude': lat, 'longitude': lng}
+            for i, (lat, lng) in enumerate(points)
+        ])
+        location_ids = db.session.execute(
+            select(Location.id).where(Location.id >= first_location)).scalars().all()
+
+        version = inventory.next_version()
+        db.session.commit()
+
+        for start in range(0, n_items, chunk_size):
+            count = min(chunk_size, n_items - start)
+            batch = vectors.standard_normal((count, dim), dtype=np.float32)
+            batch /= np.linalg.norm(batch, axis=1, keepdims=True)
+            rows = []
+            for vector in batch:
+                category = rng.choice(list(SYNTHETIC_ITEMS))
+                name = rng.choice(SYNTHETIC_ITEMS[category])
+                desc = f'{rng.randint(1, 20)} x {name.lower()}, {rng.choice(["new", "used", "unopened"])}.'
+                text = item_text(SimpleNamespace(item_name=name, category=SimpleNamespace(name=category),
+                                                 item_desc=desc))
+                blob, vector_dim, vector_dtype = pack_vector(vector)
+                rows.append({
+                    'user_id': rng.choice(user_ids),
+                    'item_name': name,
+                    'item_desc': desc,
+                    'quantity': rng.randint(1, 10),
+                    'category_id': category_ids[category],
+                    'is_available': rng.random() < 0.9,
+                    'location_id': rng.choice(location_ids),
+                    'pickup_instructions': 'Text via app before arriving.',
+                    'picture': get_category_icon(category),
+                    'version': version,
+                    'created_version': version,
+                    'embedding': blob,
+                    'embedding_dim': vector_dim,
+                    'embedding_dtype': vector_dtype,
+                    'embedding_model': EMBEDDING_MODEL,
+                    'embedding_text_hash': text_hash(text),
+                })
+            db.session.execute(insert(Item), rows)
+            db.session.commit()
+
+        inventory.inventory_changed()
+        print(f'database seeded with {n_items} synthetic items, {n_users} users, {n_locations} locations')
+        return {'items': n_items, 'users': n_users, 'locations': n_locations}
 
 
 if __name__ == '__main__':
+    # python -m app.util.init_db [--synthetic N_ITEMS [--dim 1536]]
     create_db()
-    seed_all()
\ No newline at end of file
+    if '--synthetic' in sys.argv:
+        dim = int(sys.argv[sys.argv.index('--dim') + 1]) if '--dim' in sys.argv else 1536
+        seed_synthetic(int(sys.argv[sys.argv.index('--synthetic') + 1]), dim=dim)
+    else:
+        seed_all()
\ No newline at end of file
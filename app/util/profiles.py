@@ -0,0 +1,125 @@
+"""
+Summarize request profiles written by app/profiling.py.
+
+Usage:
+    cd /path/to/ember
+    flask profiles --list
+    flask profiles [PROFILE] [--top 25] [--sort cumulative|self] [--json]
+    python -m app.util.profiles [same options]
+
+PROFILE is a name from --list (or the X-Ember-Profile-Id header), a path,
+or omitted for the newest one. cProfile runs are read with pstats. For
+sampled runs, a function's cumulative time is the request's duration
+times the share of samples with it anywhere on the stack. Its self time
+uses the share with it on top.
+"""
+
+import json
+import os
+import pstats
+
+import click
+
+
+def _directory():
+    from app.profiling import PROFILE_DIR
+    return PROFILE_DIR
+
+
+def _stems(directory):
+    if not os.path.isdir(directory):
+        return []
+    return sorted({n[:-len('.json')] for n in os.listdir(directory) if n.endswith('.json')})
+
+
+def _resolve(profile, directory):
+    """Path of the profile's .json file, without the extension."""
+    if profile is None:
+        stems = _stems(directory)
+        if not stems:
+            raise click.ClickException(f"no profiles in {directory}")
+        return os.path.join(directory, stems[-1])
+    stem = profile[:-len('.json')] if profile.endswith('.json') else profile
+    stem = stem[:-len('.prof')] if stem.endswith('.prof') else stem
+    for candidate in (stem, os.path.join(directory, stem)):
+        if os.path.exists(candidate + '.json'):
+            return candidate
+    raise click.ClickException(f"profile {profile!r} not found")
+
+
+def summarize_cprofile(path, top, sort):
+    """[(function, calls, self_s, cumulative_s)] from a .prof file."""
+    stats = pstats.Stats(path)
+    rows = []
+    for (filename, line, name), (_, calls, tottime, cumtime, _) in stats.stats.items():
+        rows.append((f"{name} ({os.path.basename(filename)}:{line})", calls, tottime, cumtime))
+    index = 3 if sort == 'cumulative' else 2
+    return sorted(rows, key=lambda row: row[index], reverse=True)[:top]
+
+
+def summarize_samples(samples, duration_ms, top, sort):
+    """[(function, samples, self_s, cumulative_s)] from collapsed stacks.
+    Samples are scaled to the request's duration: the sampler can't always
+    keep to its interval while the request thread holds the GIL."""
+    cumulative, own = {}, {}
+    for stack, count in samples.items():
+        frames = stack.split(';')
+        own[frames[-1]] = own.get(frames[-1], 0) + count
+        for frame in set(frames):  # recursion counts once
+            cumulative[frame] = cumulative.get(frame, 0) + count
+    seconds = duration_ms / 1000 / max(sum(samples.values()), 1)
+    rows = [(frame, count, own.get(frame, 0) * seconds, count * seconds)
+            for frame, count in cumulative.items()]
+    index = 3 if sort == 'cumulative' else 2
+    return sorted(rows, key=lambda row: row[index], reverse=True)[:top]
+
+
+@click.command('profiles')
+@click.argument('profile', required=False)
+@click.option('--list', 'list_only', is_flag=True, help='List saved profiles, newest last.')
+@click.option('--top', default=25, show_default=True, help='Number of functions to show.')
+@click.option('--sort', type=click.Choice(['cumulative', 'self']), default='cumulative', show_default=True)
+@click.option('--dir', 'directory', default=None, help='Profile directory (default PROFILE_DIR).')
+@click.option('--json', 'as_json', is_flag=True, help='Print the summary as JSON.')
+def profiles_command(profile, list_only, top, sort, directory, as_json):
+    """Summarize saved request profiles."""
+    directory = directory or _directory()
+
+    if list_only:
+        for stem in _stems(directory):
+            with open(os.path.join(directory, stem + '.json')) as f:
+                meta = json.load(f)
+            click.echo(f"{stem}  {meta['kind']:<8} {meta['duration_ms']:>9.1f} ms  "
+                       f"{meta['method']} {meta['path']}")
+        return
+
+    stem = _resolve(profile, directory)
+    with open(stem + '.json') as f:
+        meta = json.load(f)
+    if meta['kind'] == 'cprofile':
+        rows = summarize_cprofile(stem + '.prof', top, sort)
+        count_label = 'calls'
+    else:
+        rows = summarize_samples(meta['samples'], meta['duration_ms'], top, sort)
+        count_label = 'samples'
+
+    if as_json:
+        click.echo(json.dumps({
+            **{k: v for k, v in meta.items() if k != 'samples'},
+            'functions': [{'function': name, count_label: count,
+                           'self_ms': round(own * 1000, 2), 'cumulative_ms': round(cum * 1000, 2)}
+                          for name, count, own, cum in rows],
+        }, indent=2))
+        return
+
+    click.echo(f"{meta['method']} {meta['path']} -> {meta['status']} in {meta['duration_ms']:.1f} ms "
+               f"({meta['kind']}, {os.path.basename(stem)})")
+    if meta.get('args'):
+        click.echo(f"args: {meta['args']}")
+    click.echo(f"{'cumulative ms':>14}{'self ms':>10}{count_label:>10}  function")
+    for name, count, own, cum in rows:
+        click.echo(f"{cum * 1000:>14.1f}{own * 1000:>10.1f}{count:>10}  {name}")
+
+
+if __name__ == '__main__':
+    profiles_command()
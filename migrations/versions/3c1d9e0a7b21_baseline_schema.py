@@ -0,0 +1,84 @@
+"""baseline schema
+
+The tables as originally created by `db.create_all()` (app/util/init_db.py).
+Databases created that way should be marked as already at this revision
+with `flask db stamp 3c1d9e0a7b21` before running `flask db upgrade`.
+
+Revision ID: 3c1d9e0a7b21
+Revises:
+Create Date: 2026-10-18 09:12:40.118203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c1d9e0a7b21'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('user',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('username', sa.String(length=50), nullable=False),
+        sa.Column('password_hash', sa.String(length=256), nullable=False),
+        sa.Column('phone_number', sa.String(length=20), nullable=True),
+        sa.Column('phone_public', sa.Boolean(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('username')
+    )
+    op.create_table('category',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=50), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('name')
+    )
+    op.create_table('location',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=100), nullable=True),
+        sa.Column('address', sa.String(length=100), nullable=False),
+        sa.Column('latitude', sa.Float(), nullable=False),
+        sa.Column('longitude', sa.Float(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('item',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('item_name', sa.String(length=100), nullable=False),
+        sa.Column('is_borrow', sa.Boolean(), nullable=True),
+        sa.Column('item_desc', sa.Text(), nullable=True),
+        sa.Column('quantity', sa.Integer(), nullable=True),
+        sa.Column('category_id', sa.Integer(), nullable=False),
+        sa.Column('is_available', sa.Boolean(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('location_id', sa.Integer(), nullable=False),
+        sa.Column('pickup_instructions', sa.Text(), nullable=True),
+        sa.Column('picture', sa.String(length=100), nullable=True),
+        sa.Column('embedding', sa.Text(), nullable=True),
+        sa.ForeignKeyConstraint(['category_id'], ['category.id'], ),
+        sa.ForeignKeyConstraint(['location_id'], ['location.id'], ),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('saved_location',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=100), nullable=False),
+        sa.Column('address', sa.String(length=200), nullable=False),
+        sa.Column('latitude', sa.Float(), nullable=False),
+        sa.Column('longitude', sa.Float(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade():
+    op.drop_table('saved_location')
+    op.drop_table('item')
+    op.drop_table('location')
+    op.drop_table('category')
+    op.drop_table('user')
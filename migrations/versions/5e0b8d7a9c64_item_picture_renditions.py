@@ -0,0 +1,26 @@
+"""item picture renditions
+
+Revision ID: 5e0b8d7a9c64
+Revises: c52e7f19a4b8
+Create Date: 2026-10-18 13:02:11.734520
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e0b8d7a9c64'
+down_revision = 'c52e7f19a4b8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('item', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('picture_renditions', sa.Text(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('item', schema=None) as batch_op:
+        batch_op.drop_column('picture_renditions')
@@ -0,0 +1,85 @@
+"""embeddings and inventory versions
+
+Binary embedding columns, per-item inventory versions, and the tables
+behind delta sync, the embedding queue and the query-embedding cache.
+Columns that `embed_items --migrate` may already have added are skipped.
+
+Revision ID: 8f4a2b6c0d13
+Revises: 3c1d9e0a7b21
+Create Date: 2026-10-18 09:14:02.551930
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8f4a2b6c0d13'
+down_revision = '3c1d9e0a7b21'
+branch_labels = None
+depends_on = None
+
+
+ITEM_COLUMNS = [
+    ('embedding_vec', sa.LargeBinary(), True, None),
+    ('embedding_dim', sa.Integer(), True, None),
+    ('embedding_dtype', sa.String(length=8), True, None),
+    ('embedding_model', sa.String(length=100), True, None),
+    ('embedding_text_hash', sa.String(length=64), True, None),
+    ('version', sa.Integer(), False, '0'),
+    ('created_version', sa.Integer(), False, '0'),
+]
+
+
+def upgrade():
+    existing = {column['name'] for column in sa.inspect(op.get_bind()).get_columns('item')}
+    with op.batch_alter_table('item', schema=None) as batch_op:
+        for name, type_, nullable, default in ITEM_COLUMNS:
+            if name not in existing:
+                batch_op.add_column(sa.Column(name, type_, nullable=nullable, server_default=default))
+        batch_op.create_index(batch_op.f('ix_item_version'), ['version'], unique=False)
+
+    op.create_table('inventory_state',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('item_tombstone',
+        sa.Column('item_id', sa.Integer(), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.Column('deleted_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('item_id')
+    )
+    with op.batch_alter_table('item_tombstone', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_item_tombstone_version'), ['version'], unique=False)
+
+    op.create_table('embedding_job',
+        sa.Column('item_id', sa.Integer(), nullable=False),
+        sa.Column('enqueued_at', sa.DateTime(), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.PrimaryKeyConstraint('item_id')
+    )
+    op.create_table('query_embedding',
+        sa.Column('key', sa.String(length=64), nullable=False),
+        sa.Column('query_text', sa.String(length=500), nullable=False),
+        sa.Column('model', sa.String(length=100), nullable=False),
+        sa.Column('embedding', sa.LargeBinary(), nullable=False),
+        sa.Column('embedding_dtype', sa.String(length=8), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('key')
+    )
+
+
+def downgrade():
+    op.drop_table('query_embedding')
+    op.drop_table('embedding_job')
+    with op.batch_alter_table('item_tombstone', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_item_tombstone_version'))
+    op.drop_table('item_tombstone')
+    op.drop_table('inventory_state')
+
+    with op.batch_alter_table('item', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_item_version'))
+        for name, _, _, _ in reversed(ITEM_COLUMNS):
+            batch_op.drop_column(name)
@@ -0,0 +1,33 @@
+"""stored files
+
+Reference counts for content-addressed uploads (app/uploads.py). Existing
+uploads keep their old names and don't need rows.
+
+Revision ID: a7d3c9e1f250
+Revises: 5e0b8d7a9c64
+Create Date: 2026-10-18 14:21:40.118306
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7d3c9e1f250'
+down_revision = '5e0b8d7a9c64'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('stored_file',
+        sa.Column('name', sa.String(length=64), nullable=False),
+        sa.Column('size', sa.Integer(), nullable=False),
+        sa.Column('refcount', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade():
+    op.drop_table('stored_file')
@@ -0,0 +1,68 @@
+"""hot path indexes
+
+- unique (latitude, longitude) on location, after merging duplicate points
+  (items are re-pointed at the lowest location id for the coordinate)
+- item.user_id and item.location_id
+- partial (location_id, category_id) index over available items
+- saved_location (user_id, latitude, longitude)
+
+Category.name is already unique, so it already has an index.
+
+Revision ID: c52e7f19a4b8
+Revises: 8f4a2b6c0d13
+Create Date: 2026-10-18 09:31:57.004417
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c52e7f19a4b8'
+down_revision = '8f4a2b6c0d13'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Earlier create_item races could insert the same point twice
+    op.execute("""
+        UPDATE item SET location_id = (
+            SELECT MIN(l2.id) FROM location l1
+            JOIN location l2 ON l2.latitude = l1.latitude AND l2.longitude = l1.longitude
+            WHERE l1.id = item.location_id
+        )
+        WHERE location_id NOT IN (SELECT MIN(id) FROM location GROUP BY latitude, longitude)
+    """)
+    op.execute("DELETE FROM location WHERE id NOT IN (SELECT MIN(id) FROM location GROUP BY latitude, longitude)")
+
+    # Created by db.create_all() on databases that predate migrations; the
+    # unique constraint's index replaces it.
+    existing = {index['name'] for index in sa.inspect(op.get_bind()).get_indexes('location')}
+    with op.batch_alter_table('location', schema=None) as batch_op:
+        if 'ix_location_lat_lng' in existing:
+            batch_op.drop_index('ix_location_lat_lng')
+        batch_op.create_unique_constraint('uq_location_lat_lng', ['latitude', 'longitude'])
+
+    with op.batch_alter_table('item', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_item_user_id'), ['user_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_item_location_id'), ['location_id'], unique=False)
+        batch_op.create_index('ix_item_available_location', ['location_id', 'category_id'], unique=False,
+                              postgresql_where=sa.text('is_available'),
+                              sqlite_where=sa.text('is_available = 1'))
+
+    with op.batch_alter_table('saved_location', schema=None) as batch_op:
+        batch_op.create_index('ix_saved_location_user_point', ['user_id', 'latitude', 'longitude'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('saved_location', schema=None) as batch_op:
+        batch_op.drop_index('ix_saved_location_user_point')
+
+    with op.batch_alter_table('item', schema=None) as batch_op:
+        batch_op.drop_index('ix_item_available_location')
+        batch_op.drop_index(batch_op.f('ix_item_location_id'))
+        batch_op.drop_index(batch_op.f('ix_item_user_id'))
+
+    with op.batch_alter_table('location', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_location_lat_lng', type_='unique')
@@ -0,0 +1,35 @@
+"""import progress
+
+Checkpoints for bulk item imports (app/util/import_items.py).
+
+Revision ID: d4e8a1b7c392
+Revises: a7d3c9e1f250
+Create Date: 2026-10-18 16:02:11.530214
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4e8a1b7c392'
+down_revision = 'a7d3c9e1f250'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('import_progress',
+        sa.Column('source', sa.String(length=64), nullable=False),
+        sa.Column('filename', sa.String(length=255), nullable=False),
+        sa.Column('rows_done', sa.Integer(), nullable=False),
+        sa.Column('items_created', sa.Integer(), nullable=False),
+        sa.Column('started_at', sa.DateTime(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('source')
+    )
+
+
+def downgrade():
+    op.drop_table('import_progress')
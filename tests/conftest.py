@@ -0,0 +1,71 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# Must be set before the app modules are imported: they read the environment at import time
+_db_fd, _db_path = tempfile.mkstemp(suffix='.db', prefix='ember-test-')
+os.close(_db_fd)
+os.environ['DATABASE_URL'] = 'sqlite:///' + _db_path
+os.environ['EMBEDDING_WORKER'] = 'off'
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import create_app  # noqa: E402
+from app.extensions import db  # noqa: E402
+
+
+@pytest.fixture(scope='session')
+def app():
+    app = create_app()
+    app.config.update(TESTING=True, SQL_BUDGET_STRICT=True)
+    with app.app_context():
+        db.create_all()
+    yield app
+    with app.app_context():
+        db.engine.dispose()
+    os.remove(_db_path)
+
+
+@pytest.fixture(scope='session')
+def inventory(app):
+    """A few users, each with items spread over several categories and
+    locations: enough rows that a per-item query would blow any budget."""
+    from app import inventory as inventory_versions
+    from app.models import Category, Item, Location, User
+
+    with app.app_context():
+        users = []
+        for name in ('alice', 'bob', 'carol'):
+            user = User(username=name)
+            user.set_password('password')
+            users.append(user)
+        categories = [Category(name=name) for name in ('Water', 'Food', 'Power', 'Tools', 'Medical')]
+        locations = [Location(address=f'{i} Main St', latitude=40.44 + i / 1000, longitude=-79.99)
+                     for i in range(12)]
+        db.session.add_all(users + categories + locations)
+        db.session.flush()
+
+        items = [Item(user_id=users[i % len(users)].id, item_name=f'item {i}',
+                      category_id=categories[i % len(categories)].id,
+                      location_id=locations[i % len(locations)].id)
+                 for i in range(90)]
+        db.session.add_all(items)
+        db.session.flush()
+        inventory_versions.mark_changed(*items)
+        db.session.commit()
+        return {'user_id': users[0].id, 'item_id': items[0].id, 'items': len(items)}
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def logged_in(client, inventory):
+    with client.session_transaction() as session:
+        session['_user_id'] = str(inventory['user_id'])
+        session['_fresh'] = True
+    return client
@@ -0,0 +1,44 @@
+"""/api/items/clusters: cached tiles follow the inventory version."""
+
+from app.extensions import db
+
+BBOX = '-80.1,40.3,-79.9,40.5'
+
+
+def _clustered_count(client):
+    response = client.get(f'/api/items/clusters?zoom=13&bbox={BBOX}')
+    assert response.status_code == 200
+    return sum(cluster['count'] for cluster in response.get_json()['clusters'])
+
+
+def test_clusters_count_every_item(client, inventory):
+    assert _clustered_count(client) == inventory['items']
+
+
+def test_cached_clusters_are_recomputed_after_a_write(app, client, inventory):
+    from app import inventory as inventory_versions
+    from app.models import Item
+
+    before = _clustered_count(client)  # now cached
+    with app.app_context():
+        template = db.session.get(Item, inventory['item_id'])
+        item = Item(user_id=template.user_id, item_name='cot', category_id=template.category_id,
+                    location_id=template.location_id)
+        db.session.add(item)
+        db.session.flush()
+        inventory_versions.mark_changed(item)
+        db.session.commit()
+        item_id = item.id
+
+    try:
+        # No hook was called: the version bump alone retires the cached tiles
+        assert _clustered_count(client) == before + 1
+    finally:
+        with app.app_context():
+            Item.query.filter_by(id=item_id).delete()
+            db.session.commit()
+
+
+def test_oversized_viewport_is_refused(client, inventory):
+    response = client.get('/api/items/clusters?zoom=18&bbox=-81,40,-79,41')
+    assert response.status_code == 400
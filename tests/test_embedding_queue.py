@@ -0,0 +1,103 @@
+"""
+The embedding queue (app/embedding_queue.py) against a fake Dedalus client:
+one item the provider always rejects must not hold back the others, and
+must stop being retried after MAX_ATTEMPTS.
+"""
+
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from app import embedding_queue
+from app.extensions import db
+
+
+class FakeClient:
+    """Embeds any text with a fixed vector, except texts containing `reject`."""
+
+    def __init__(self, reject=None, down=False):
+        self.reject = reject
+        self.down = down
+        self.calls = []
+        self.embeddings = self
+
+    def create(self, input, model):
+        self.calls.append(list(input))
+        if self.down or any(self.reject and self.reject in text for text in input):
+            raise RuntimeError('provider rejected the request')
+        return SimpleNamespace(data=[SimpleNamespace(index=i, embedding=[1.0, 0.0, 0.0, 0.0])
+                                     for i in range(len(input))])
+
+
+@pytest.fixture
+def queued(app, inventory):
+    """Three new items with embedding jobs, the middle one named 'poison'."""
+    from app.models import EmbeddingJob, Item
+
+    with app.app_context():
+        template = db.session.get(Item, inventory['item_id'])
+        items = [Item(user_id=template.user_id, item_name=name, category_id=template.category_id,
+                      location_id=template.location_id)
+                 for name in ('blanket', 'poison', 'lantern')]
+        db.session.add_all(items)
+        db.session.flush()
+        start = datetime.utcnow()
+        db.session.add_all(EmbeddingJob(item_id=item.id, enqueued_at=start + timedelta(seconds=i))
+                           for i, item in enumerate(items))
+        db.session.commit()
+        ids = [item.id for item in items]
+
+    yield ids
+
+    with app.app_context():
+        EmbeddingJob.query.filter(EmbeddingJob.item_id.in_(ids)).delete()
+        Item.query.filter(Item.id.in_(ids)).delete()
+        db.session.commit()
+
+
+def _jobs(ids):
+    from app.models import EmbeddingJob
+    return {job.item_id: job for job in EmbeddingJob.query.filter(EmbeddingJob.item_id.in_(ids))}
+
+
+def test_failed_batch_is_retried_one_item_at_a_time(app, queued):
+    blanket, poison, lantern = queued
+    client = FakeClient(reject='poison')
+
+    with app.app_context():
+        assert embedding_queue.process_pending(client) == 2
+        jobs = _jobs(queued)
+        assert set(jobs) == {poison}
+        assert jobs[poison].attempts == 1
+        assert 'rejected' in jobs[poison].last_error
+
+
+def test_item_is_skipped_after_max_attempts(app, queued):
+    poison = queued[1]
+    client = FakeClient(reject='poison')
+
+    with app.app_context():
+        embedding_queue.process_pending(client)
+        for _ in range(embedding_queue.MAX_ATTEMPTS - 1):
+            embedding_queue.process_pending(client)
+        assert _jobs(queued)[poison].attempts == embedding_queue.MAX_ATTEMPTS
+        assert embedding_queue.failed_count() == 1
+
+        client.calls.clear()
+        assert embedding_queue.process_pending(client) == 0
+        assert client.calls == []
+
+        assert embedding_queue.requeue_failed() == 1
+        assert embedding_queue.pending_count() == 1
+
+
+def test_provider_outage_stops_the_pass(app, queued):
+    client = FakeClient(down=True)
+
+    with app.app_context():
+        assert embedding_queue.process_pending(client) == 0
+        # The batch call, then two single items before giving up
+        assert [len(call) for call in client.calls] == [3, 1, 1]
+        jobs = _jobs(queued)
+        assert sorted(job.attempts for job in jobs.values()) == [0, 1, 1]
@@ -0,0 +1,91 @@
+"""
+Restartable bulk import (app/util/import_items.py): a failed run resumes
+after its last committed chunk, and a finished file is not imported twice.
+"""
+
+import pytest
+
+from app.extensions import db
+from app.util import import_items
+
+CSV = """item_name,address,latitude,longitude,category,quantity
+Water jugs,1 Lake Rd,41.1,-78.1,Water,4
+Blankets,1 Lake Rd,41.1,-78.1,Bedding,
+Generator,2 Hill St,41.2,-78.2,Power,1
+,3 No Name Ave,41.3,-78.3,Tools,1
+Radio,4 Ridge Rd,41.4,-78.4,Tools,not a number
+First aid kit,5 Valley Rd,41.5,-78.5,Medical,2
+"""
+
+
+@pytest.fixture
+def csv_file(app, inventory, tmp_path):
+    from app.models import EmbeddingJob, ImportProgress, Item, Location
+
+    path = tmp_path / 'donations.csv'
+    path.write_text(CSV)
+    yield path
+
+    with app.app_context():
+        location_ids = [loc.id for loc in Location.query.filter(Location.latitude > 41)]
+        item_ids = [item.id for item in Item.query.filter(Item.location_id.in_(location_ids))]
+        EmbeddingJob.query.filter(EmbeddingJob.item_id.in_(item_ids)).delete()
+        Item.query.filter(Item.id.in_(item_ids)).delete()
+        Location.query.filter(Location.id.in_(location_ids)).delete()
+        ImportProgress.query.delete()
+        db.session.commit()
+
+
+def _imported_items():
+    from app.models import Item, Location
+    return Item.query.join(Location).filter(Location.latitude > 41).order_by(Item.id).all()
+
+
+def test_import_resumes_after_the_last_committed_chunk(app, csv_file, monkeypatch):
+    messages = []
+
+    def echo(message, err=False):
+        messages.append(message)
+
+    write = import_items.Importer.write
+    calls = []
+
+    def fail_second_chunk(self, records):
+        calls.append(len(records))
+        if len(calls) == 2:
+            raise RuntimeError('database went away')
+        return write(self, records)
+
+    with app.app_context():
+        monkeypatch.setattr(import_items.Importer, 'write', fail_second_chunk)
+        with pytest.raises(RuntimeError):
+            import_items.import_file(str(csv_file), 'alice', chunk_size=2, echo=echo)
+        assert [item.item_name for item in _imported_items()] == ['Water jugs', 'Blankets']
+
+        monkeypatch.setattr(import_items.Importer, 'write', write)
+        progress = import_items.import_file(str(csv_file), 'alice', chunk_size=2, echo=echo)
+        assert 'resuming after record 2' in messages
+        assert progress.finished_at is not None
+        assert (progress.rows_done, progress.items_created) == (6, 4)
+
+        items = _imported_items()
+        assert [item.item_name for item in items] == ['Water jugs', 'Blankets', 'Generator', 'First aid kit']
+        # The two records at the same point share one Location
+        assert items[0].location_id == items[1].location_id
+        assert items[1].quantity == 1 and items[1].category.name == 'Bedding'
+
+        messages.clear()
+        import_items.import_file(str(csv_file), 'alice', chunk_size=2, echo=echo)
+        assert 'already imported' in messages[0]
+        assert len(_imported_items()) == 4
+
+
+@pytest.mark.parametrize('record, error', [
+    ({'item_name': 'Tent', 'address': 'x', 'latitude': '91', 'longitude': '0'}, 'out of range'),
+    ({'item_name': 'Tent', 'address': 'x', 'latitude': 'north', 'longitude': '0'}, 'must be numbers'),
+    ({'item_name': 'Tent', 'latitude': '40', 'longitude': '-80'}, 'required'),
+    ('Tent', 'not an object'),
+])
+def test_invalid_records_are_rejected(record, error):
+    with pytest.raises(import_items.InvalidRecord, match=error):
+        import_items.parse_record(record)
@@ -0,0 +1,84 @@
+"""
+/api/items revalidation and delta sync (app/inventory.py versions):
+the ETag follows the inventory version, and ?since= reports exactly the
+writes made after a version.
+"""
+
+import pytest
+
+from app.extensions import db
+
+
+@pytest.fixture
+def make_item(app, inventory):
+    """Create items owned by the logged-in user, removed again afterwards."""
+    from app import inventory as inventory_versions
+    from app.models import Item, ItemTombstone
+
+    created = []
+
+    def make(name):
+        with app.app_context():
+            template = db.session.get(Item, inventory['item_id'])
+            item = Item(user_id=inventory['user_id'], item_name=name,
+                        category_id=template.category_id, location_id=template.location_id)
+            db.session.add(item)
+            db.session.flush()
+            inventory_versions.mark_changed(item)
+            db.session.commit()
+            created.append(item.id)
+            return item.id
+
+    yield make
+
+    with app.app_context():
+        Item.query.filter(Item.id.in_(created)).delete()
+        ItemTombstone.query.filter(ItemTombstone.item_id.in_(created)).delete()
+        db.session.commit()
+
+
+def _version(app):
+    from app import inventory as inventory_versions
+    with app.app_context():
+        return inventory_versions.current_version()
+
+
+def test_etag_revalidates_until_the_inventory_changes(logged_in, make_item):
+    first = logged_in.get('/api/items')
+    first.get_data()  # finish the stream
+    etag = first.headers['ETag']
+
+    assert logged_in.get('/api/items', headers={'If-None-Match': etag}).status_code == 304
+
+    make_item('tarp')
+    changed = logged_in.get('/api/items', headers={'If-None-Match': etag})
+    assert changed.status_code == 200
+    assert changed.headers['ETag'] != etag
+    changed.get_data()
+
+
+def test_delta_reports_changes_after_a_version(app, logged_in, make_item):
+    kept, edited, withdrawn, removed = (make_item(name) for name in ('kept', 'edited', 'withdrawn', 'removed'))
+    since = _version(app)
+
+    created = make_item('new')
+    assert logged_in.put(f'/api/items/{edited}', data={'quantity': '3'}).status_code == 200
+    assert logged_in.put(f'/api/items/{withdrawn}', data={'is_available': 'false'}).status_code == 200
+    assert logged_in.delete(f'/api/items/{removed}').status_code == 200
+
+    delta = logged_in.get(f'/api/items?since={since}').get_json()
+    assert delta['version'] == _version(app)
+    assert [item['id'] for item in delta['created']] == [created]
+    assert [item['id'] for item in delta['updated']] == [edited]
+    assert delta['updated'][0]['quantity'] == 3
+    assert sorted(delta['deleted']) == sorted([withdrawn, removed])
+    assert kept not in delta['deleted']
+
+    # Nothing after the latest version
+    latest = logged_in.get(f'/api/items?since={delta["version"]}').get_json()
+    assert (latest['created'], latest['updated'], latest['deleted']) == ([], [], [])
+
+
+@pytest.mark.parametrize('query', ['since=abc', 'since=0&bbox=-80.1,40.3,-79.9,40.5'])
+def test_bad_since_is_rejected(logged_in, query):
+    assert logged_in.get(f'/api/items?{query}').status_code == 400
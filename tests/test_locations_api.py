@@ -0,0 +1,18 @@
+"""POST /api/locations: one Location per coordinate pair."""
+
+
+def test_duplicate_coordinates_conflict_with_the_existing_location(logged_in):
+    point = {'latitude': 40.5012, 'longitude': -80.0034}
+
+    created = logged_in.post('/api/locations', json={**point, 'name': 'Shelter', 'address': '1 River Rd'})
+    assert created.status_code == 201
+    location_id = created.get_json()['id']
+
+    duplicate = logged_in.post('/api/locations', json={**point, 'name': 'Depot', 'address': '2 Hill St'})
+    assert duplicate.status_code == 409
+    assert duplicate.get_json()['id'] == location_id
+
+    # The first name and address are kept
+    listed = {loc['id']: loc for loc in logged_in.get('/api/locations').get_json()}
+    assert listed[location_id]['name'] == 'Shelter'
+    assert listed[location_id]['address'] == '1 River Rd'
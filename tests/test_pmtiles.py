@@ -0,0 +1,113 @@
+"""
+Local PMTiles serving (app/pmtiles.py, app/routes/tiles.py) against a
+small archive written by the test: Hilbert tile ids, byte ranges and
+single-tile lookups.
+"""
+
+import pytest
+
+from app import pmtiles
+from app.routes import tiles
+
+TILES = {(0, 0, 0): b'tile 0/0/0', (1, 1, 1): b'tile 1/1/1'}
+
+
+def _varint(value):
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def _write_archive(path, tiles):
+    """A PMTiles v3 file with an uncompressed root directory and PNG tiles."""
+    entries = sorted((pmtiles.zxy_to_tile_id(*zxy), data) for zxy, data in tiles.items())
+    tile_data, offsets = b'', []
+    for _, data in entries:
+        offsets.append(len(tile_data))
+        tile_data += data
+
+    directory = _varint(len(entries))
+    last = 0
+    for tile_id, _ in entries:
+        directory += _varint(tile_id - last)
+        last = tile_id
+    directory += b''.join(_varint(1) for _ in entries)  # run lengths
+    directory += b''.join(_varint(len(data)) for _, data in entries)
+    directory += b''.join(_varint(offset + 1) for offset in offsets)
+
+    root_offset = pmtiles.HEADER_LENGTH
+    data_offset = root_offset + len(directory)
+    header = pmtiles._HEADER.pack(
+        b'PMTiles', 3,
+        root_offset, len(directory), data_offset, 0, data_offset, 0, data_offset, len(tile_data),
+        len(entries), len(entries), len(entries),
+        1, pmtiles.COMPRESSION_NONE, pmtiles.COMPRESSION_NONE, 2, 0, 1,
+        0, 0, 0, 0, 0, 0, 0)
+    path.write_bytes(header + directory + tile_data)
+    return path.read_bytes()
+
+
+@pytest.fixture
+def archive(tmp_path, monkeypatch):
+    monkeypatch.setattr(tiles, 'PMTILES_DIR', str(tmp_path))
+    monkeypatch.setattr(tiles, 'PMTILES_ARCHIVE', 'test.pmtiles')
+    return _write_archive(tmp_path / 'test.pmtiles', TILES)
+
+
+@pytest.mark.parametrize('zxy, tile_id', [
+    ((0, 0, 0), 0),
+    ((1, 0, 0), 1),
+    ((1, 0, 1), 2),
+    ((1, 1, 1), 3),
+    ((1, 1, 0), 4),
+    ((2, 0, 0), 5),
+    ((3, 7, 0), 84),
+    ((20, 0, 0), 366503875925),
+])
+def test_zxy_to_tile_id(zxy, tile_id):
+    assert pmtiles.zxy_to_tile_id(*zxy) == tile_id
+
+
+@pytest.mark.parametrize('zxy', [(1, 2, 0), (1, 0, -1), (32, 0, 0)])
+def test_zxy_to_tile_id_rejects_tiles_outside_the_zoom(zxy):
+    with pytest.raises(ValueError):
+        pmtiles.zxy_to_tile_id(*zxy)
+
+
+def test_byte_range(client, archive):
+    response = client.get('/static/maps/test.pmtiles', headers={'Range': 'bytes=0-9'})
+    assert response.status_code == 206
+    assert response.headers['Content-Range'] == f'bytes 0-9/{len(archive)}'
+    assert response.get_data() == archive[:10]
+
+
+def test_suffix_range(client, archive):
+    response = client.get('/static/maps/test.pmtiles', headers={'Range': 'bytes=-6'})
+    assert response.status_code == 206
+    assert response.get_data() == archive[-6:]
+
+
+def test_unsatisfiable_range(client, archive):
+    response = client.get('/static/maps/test.pmtiles', headers={'Range': f'bytes={len(archive)}-'})
+    assert response.status_code == 416
+    assert response.headers['Content-Range'] == f'bytes */{len(archive)}'
+
+
+def test_stale_if_range_gets_the_whole_file(client, archive):
+    response = client.get('/static/maps/test.pmtiles',
+                          headers={'Range': 'bytes=0-9', 'If-Range': '"old-etag"'})
+    assert response.status_code == 200
+    assert response.get_data() == archive
+
+
+def test_tile_lookup(client, archive):
+    assert client.get('/tiles/1/1/1').get_data() == TILES[(1, 1, 1)]
+    assert client.get('/tiles/0/0/0.png').get_data() == TILES[(0, 0, 0)]
+    assert client.get('/tiles/1/0/0').status_code == 204  # inside the archive's zooms, no data
+    assert client.get('/tiles/1/5/0').status_code == 404  # not a tile at z1
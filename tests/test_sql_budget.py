@@ -0,0 +1,74 @@
+"""
+Hot routes must stay within their SQL statement budgets (app/sql_budget.py).
+
+The app runs with SQL_BUDGET_STRICT on, so going over budget fails the
+request. The X-SQL-Queries header is also checked. Statements that run
+while a response streams aren't in the header, so they are counted on the
+engine as well.
+"""
+
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event
+
+from app.extensions import db
+
+
+def _budget(app, endpoint):
+    view = app.view_functions[endpoint]
+    return getattr(view, '_sql_query_budget', app.config['SQL_QUERY_BUDGET'])
+
+
+@contextmanager
+def _count_statements(app):
+    counted = []
+
+    def count(*args):
+        counted.append(1)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', count)
+    try:
+        yield counted
+    finally:
+        event.remove(engine, 'before_cursor_execute', count)
+
+
+@pytest.mark.parametrize('path, endpoint', [
+    ('/api/items', 'items.get_items'),
+    ('/api/items?format=ndjson', 'items.get_items'),
+    ('/api/items?bbox=-80.1,40.3,-79.9,40.5', 'items.get_items'),
+    ('/api/items?since=0', 'items.get_items'),
+    ('/api/my-items', 'items.get_my_items'),
+    ('/api/items/{item_id}', 'items.get_item'),
+])
+def test_route_within_sql_budget(app, logged_in, inventory, path, endpoint):
+    budget = _budget(app, endpoint)
+
+    with _count_statements(app) as counted:
+        response = logged_in.get(path.format(item_id=inventory['item_id']))
+        response.get_data()  # run the streamed part too
+
+    assert response.status_code == 200
+    assert int(response.headers['X-SQL-Queries']) <= budget
+    assert len(counted) <= budget, f'{path} ran {len(counted)} statements including the streamed body'
+
+
+def test_feed_returns_every_item(logged_in, inventory):
+    # Guards the budget test against passing because the feed came back empty
+    response = logged_in.get('/api/items')
+    assert len(response.get_json()) == inventory['items']
+
+
+def test_strict_mode_fails_over_budget(app, logged_in, inventory):
+    from app.sql_budget import QueryBudgetExceeded
+
+    default = app.config['SQL_QUERY_BUDGET']
+    app.config['SQL_QUERY_BUDGET'] = 0
+    try:
+        with pytest.raises(QueryBudgetExceeded):
+            logged_in.get('/api/items?since=0')
+    finally:
+        app.config['SQL_QUERY_BUDGET'] = default
@@ -0,0 +1,78 @@
+"""
+Transcription jobs (app/transcription.py) against a fake provider. The
+job must still read the upload after the request has closed it, and an
+upload werkzeug already spooled to disk must not be copied again.
+"""
+
+import io
+import tempfile
+import threading
+import wave
+from types import SimpleNamespace
+
+import pytest
+from werkzeug.datastructures import FileStorage
+
+from app import transcription
+from app.transcription import EmptyAudio, Transcriber
+
+
+class FakeClient:
+    """Answers each transcription with the number of bytes it was sent.
+    Holds every call until `release` is set."""
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.audio = SimpleNamespace(transcriptions=self)
+
+    def create(self, file, **kwargs):
+        self.release.wait(5)
+        return {'text': str(len(file[1].read()))}
+
+
+def _upload(stream, content_type='audio/webm'):
+    stream.seek(0)
+    return FileStorage(stream=stream, filename='recording.webm', content_type=content_type)
+
+
+def _transcribe(upload, client=None):
+    client = client or FakeClient()
+    job = Transcriber(workers=1, queue_limit=1).submit(client, upload)
+    upload.stream.close()  # what the end of the request does
+    client.release.set()
+    assert job.wait(5)
+    return job
+
+
+def test_upload_spooled_to_disk_is_read_in_place(monkeypatch):
+    spooled = tempfile.SpooledTemporaryFile(max_size=1024)
+    spooled.write(b'x' * 4096)  # past max_size: werkzeug's spool is now a real file
+
+    def no_copy(*args, **kwargs):
+        raise AssertionError('the upload was copied')
+    monkeypatch.setattr(transcription.tempfile, 'TemporaryFile', no_copy)
+
+    job = _transcribe(_upload(spooled))
+    assert (job.status, job.text) == ('done', '4096')
+
+
+def test_upload_held_in_memory_is_copied():
+    job = _transcribe(_upload(io.BytesIO(b'x' * 100)))
+    assert (job.status, job.text) == ('done', '100')
+
+
+def test_long_wav_is_sent_in_chunks(monkeypatch):
+    monkeypatch.setattr(transcription, 'CHUNK_BYTES', 1000)
+    audio = io.BytesIO()
+    with wave.open(audio, 'wb') as writer:
+        writer.setparams((1, 2, 8000, 0, 'NONE', 'not compressed'))
+        writer.writeframes(b'\0\0' * 1500)  # 3000 bytes of samples
+
+    job = _transcribe(_upload(audio, content_type='audio/wav'))
+    assert job.status == 'done'
+    assert job.chunks == 3
+
+
+def test_empty_upload_is_rejected():
+    with pytest.raises(EmptyAudio):
+        Transcriber().submit(FakeClient(), _upload(io.BytesIO()))
@@ -0,0 +1,83 @@
+"""
+Content-addressed uploads (app/uploads.py): identical files are stored
+once, and a file is only deleted when the last picture referencing it
+lets go.
+"""
+
+import io
+
+import pytest
+
+from app import uploads
+from app.extensions import db
+
+
+@pytest.fixture
+def folder(app, tmp_path, monkeypatch):
+    monkeypatch.setitem(app.config, 'UPLOAD_FOLDER', str(tmp_path))
+    return tmp_path
+
+
+def _refcount(name):
+    from app.models import StoredFile
+    stored = db.session.get(StoredFile, name)
+    return stored.refcount if stored else None
+
+
+def test_identical_uploads_share_one_file(app, folder):
+    with app.app_context():
+        first = uploads.store_stream(io.BytesIO(b'same picture'), 'JPG')
+        second = uploads.store_stream(io.BytesIO(b'same picture'), 'jpg')
+
+    assert first == second
+    assert uploads.is_content_addressed(first)
+    assert [path.name for path in folder.iterdir()] == [first]
+
+
+def test_file_is_purged_with_its_last_reference(app, folder):
+    with app.app_context():
+        name = uploads.store_bytes(b'shared picture', 'webp')
+        uploads.acquire(name)
+        uploads.acquire(name)
+        db.session.commit()
+        assert _refcount(name) == 2
+
+        uploads.purge(uploads.release(name))
+        assert _refcount(name) == 1
+        assert (folder / name).exists()
+
+        uploads.purge(uploads.release(name))
+        assert _refcount(name) is None
+        assert not (folder / name).exists()
+
+
+def test_legacy_upload_is_deleted_when_released(app, folder):
+    (folder / '7_photo.jpg').write_bytes(b'old picture')
+    with app.app_context():
+        uploads.purge(uploads.release('7_photo.jpg'))
+    assert not (folder / '7_photo.jpg').exists()
+
+
+def test_deleting_an_item_keeps_a_picture_another_item_uses(app, logged_in, inventory, folder):
+    from app.models import Item
+
+    with app.app_context():
+        name = uploads.store_bytes(b'two listings, one photo', 'jpg')
+        template = db.session.get(Item, inventory['item_id'])
+        items = [Item(user_id=inventory['user_id'], item_name=f'copy {i}', picture=name,
+                      category_id=template.category_id, location_id=template.location_id)
+                 for i in range(2)]
+        db.session.add_all(items)
+        uploads.acquire(name, name)
+        db.session.commit()
+        first, second = (item.id for item in items)
+
+    assert logged_in.delete(f'/api/items/{first}').status_code == 200
+    assert (folder / name).exists()
+
+    response = logged_in.get(f'/uploads/{name}')
+    assert response.get_data() == b'two listings, one photo'
+    assert 'immutable' in response.headers['Cache-Control']
+
+    assert logged_in.delete(f'/api/items/{second}').status_code == 200
+    assert not (folder / name).exists()